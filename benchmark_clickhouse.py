@@ -0,0 +1,592 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos inserts e leituras do ClickhouseSync
+Compara insert_df_in_batches, _v3 e _v4 (linhas e columnar) e mede como o
+execute_query_to_df (linhas e columnar) escala com o número de linhas, sem
+precisar de um servidor ClickHouse.
+
+O ClickhouseSync recebe um `StandInClient` no lugar do Client do driver:
+- DESCRIBE TABLE devolve o schema da tabela de clientes
+- INSERT serializa os dados com o próprio clickhouse_driver (mesmos blocos
+  Native que seriam enviados ao servidor) e manda os bytes por um socket
+  local (socketpair) lido por outra thread
+- SELECT recebe pelo socket blocos Native gerados antes da medição e os
+  decodifica com o driver
+
+Cada execução separa o tempo em três fases:
+- coercao: tudo o que o método faz em Python fora do driver (conversão de
+  tipos e montagem de tuplas/colunas no insert, montagem do DataFrame no
+  select); tempo total - serialização - transporte
+- serializacao: escrita dos blocos Native (insert) / leitura dos blocos (select)
+- transporte: envio/recebimento dos bytes pelo socket local
+
+e reporta linhas/s, pico de RSS (amostrado em /proc/self/statm) e pico de
+alocações Python (tracemalloc, numa execução separada). Os resultados vão
+para um JSON, comparável entre versões com --comparar.
+
+Os DataFrames sintéticos têm as colunas de clientes_fake.csv, gerados com
+Faker (pt_BR) ou, sem Faker, sorteados das linhas de clientes_fake.csv.
+
+Exemplos:
+    python benchmark_clickhouse.py --tamanhos 10000,1000000
+    python benchmark_clickhouse.py --metodos v4,v4_columnar --comparar benchmark_a1b2c3d.json
+"""
+
+import argparse
+import contextlib
+import datetime as _dt
+import io
+import json
+import os
+import platform
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+import clickhouse_driver
+from clickhouse_driver import Client, defines
+from clickhouse_driver.block import ColumnOrientedBlock, RowOrientedBlock
+from clickhouse_driver.bufferedreader import BufferedSocketReader
+from clickhouse_driver.bufferedwriter import BufferedSocketWriter
+from clickhouse_driver.connection import ServerInfo
+from clickhouse_driver.context import Context
+from clickhouse_driver.result import QueryResult
+from clickhouse_driver.streams.native import BlockInputStream, BlockOutputStream
+from clickhouse_sync import ClickhouseSync
+
+DB_NAME = "benchmark"
+TABLE_NAME = "clientes"
+CSV_FILE = "clientes_fake.csv"
+
+# Schema da tabela de clientes (colunas de clientes_fake.csv)
+CLIENTES_SCHEMA = [
+    ("id_cliente", "UInt32"),
+    ("nome", "String"),
+    ("sexo", "LowCardinality(String)"),
+    ("cpf", "String"),
+    ("data_nascimento", "Date"),
+    ("email", "String"),
+    ("telefone", "String"),
+    ("cep", "String"),
+    ("logradouro", "String"),
+    ("numero", "String"),
+    ("complemento", "Nullable(String)"),
+    ("bairro", "String"),
+    ("cidade", "String"),
+    ("estado", "LowCardinality(String)"),
+    ("pais", "LowCardinality(String)"),
+    ("renda_mensal", "Float64"),
+    ("data_cadastro", "Nullable(DateTime)"),
+    ("ativo", "UInt8"),
+]
+
+# Blocos do SELECT com o tamanho padrão de bloco do servidor (max_block_size)
+SERVER_BLOCK_ROWS = 65_409
+
+# {nome: (método do ClickhouseSync, kwargs)}
+INSERT_BENCHMARKS = {
+    "v1": ("insert_df_in_batches", {}),
+    "v3": ("insert_df_in_batches_v3", {}),
+    "v4": ("insert_df_in_batches_v4", {}),
+    "v4_columnar": ("insert_df_in_batches_v4", {"columnar": True}),
+}
+READ_BENCHMARKS = {
+    "select": ("execute_query_to_df", {"use_cache": False}),
+    "select_columnar": ("execute_query_to_df", {"columnar": True, "use_cache": False}),
+}
+
+_Packet = namedtuple("_Packet", "block")
+
+
+# ---------- dados sintéticos ----------
+
+def _faker_pool(pool_size, seed):
+    """Valores de cada coluna texto gerados com Faker pt_BR."""
+    from faker import Faker
+
+    fake = Faker("pt_BR")
+    fake.seed_instance(seed)
+    rng = np.random.default_rng(seed)
+    complementos = ["Apto 101", "Apto 302", "Bloco B", "Casa 2", "Fundos", "Sala 5"]
+    return {
+        "nome": [fake.name() for _ in range(pool_size)],
+        "sexo": ["M", "F"],
+        "cpf": [fake.cpf() for _ in range(pool_size)],
+        "email": [fake.email() for _ in range(pool_size)],
+        "telefone": [fake.phone_number() for _ in range(pool_size)],
+        "cep": [fake.postcode() for _ in range(pool_size)],
+        "logradouro": [fake.street_name() for _ in range(pool_size)],
+        "numero": [fake.building_number() for _ in range(pool_size)],
+        # ~40% sem complemento, como no CSV de exemplo
+        "complemento": [
+            None if rng.random() < 0.4 else complementos[rng.integers(len(complementos))]
+            for _ in range(pool_size)
+        ],
+        "bairro": [fake.bairro() for _ in range(pool_size)],
+        "cidade": [fake.city() for _ in range(pool_size)],
+        "estado": [fake.estado_sigla() for _ in range(pool_size)],
+        "pais": ["Brasil"],
+    }
+
+
+def _csv_pool():
+    """Valores de cada coluna texto lidos de clientes_fake.csv."""
+    sample = pd.read_csv(CSV_FILE, sep=";", encoding="utf-8-sig", dtype=str, keep_default_na=False)
+    pool = {}
+    for col in ("nome", "sexo", "cpf", "email", "telefone", "cep", "logradouro", "numero",
+                "complemento", "bairro", "cidade", "estado", "pais"):
+        pool[col] = [v if v != "" else None for v in sample[col]]
+    return pool
+
+
+def gerar_clientes(n_rows: int, seed: int = 42, pool_size: int = 5000) -> pd.DataFrame:
+    """
+    DataFrame com as colunas de clientes_fake.csv e `n_rows` linhas.
+
+    O Faker gera `pool_size` valores por coluna e as linhas são sorteadas
+    desse conjunto com NumPy (gerar 10M linhas direto com Faker levaria horas).
+    """
+    try:
+        pool = _faker_pool(min(pool_size, max(n_rows, 1)), seed)
+    except ImportError:
+        print(f"Faker não instalado; usando as linhas de {CSV_FILE} como amostra.")
+        pool = _csv_pool()
+
+    rng = np.random.default_rng(seed)
+    data = {"id_cliente": np.arange(1, n_rows + 1, dtype=np.int64)}
+    for col, values in pool.items():
+        values = np.array(values, dtype=object)
+        data[col] = values[rng.integers(0, len(values), n_rows)]
+
+    nascimento = np.datetime64("1940-01-01") + rng.integers(0, 365 * 67, n_rows).astype("timedelta64[D]")
+    cadastro = np.datetime64("2020-01-01T00:00:00") + rng.integers(0, 86400 * 365 * 6, n_rows).astype("timedelta64[s]")
+    data["data_nascimento"] = nascimento.astype("datetime64[ns]")
+    data["data_cadastro"] = cadastro.astype("datetime64[ns]")
+    data["renda_mensal"] = np.round(rng.lognormal(8.0, 0.8, n_rows), 2)
+    data["ativo"] = rng.random(n_rows) < 0.7
+
+    df = pd.DataFrame(data)
+    # pandas lê o texto do CSV como str; o complemento vazio vira NaN
+    for col in pool:
+        df[col] = df[col].astype("str" if col != "complemento" else object)
+    return df[[name for name, _ in CLIENTES_SCHEMA]]
+
+
+def _frame_v1(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cópia para o insert_df_in_batches (v1), com nulos das colunas texto como ''.
+    O v1 faz `astype(str)`, que no pandas 3 mantém o NaN (o driver recusa:
+    'float' object has no attribute 'encode'); no pandas 2 o nulo virava o
+    texto 'nan'. Trocar por None não basta: o astype(str) volta a gerar NaN.
+    """
+    frame = df.copy()
+    for col in frame.columns:
+        if frame[col].dtype == object and frame[col].hasnans:
+            frame[col] = frame[col].where(frame[col].notna(), "")
+    return frame
+
+
+# ---------- stand-in do driver ----------
+
+class _MemorySocket:
+    """Socket falso para o BufferedSocketWriter/Reader do driver: bytes em memória."""
+
+    def __init__(self, data=b""):
+        self.out = bytearray()
+        self._data = memoryview(data)
+        self._pos = 0
+
+    def sendall(self, data):
+        self.out += data
+
+    def recv_into(self, buf):
+        n = min(len(buf), len(self._data) - self._pos)
+        buf[:n] = self._data[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def _socket_transfer(payload, keep: bool = False):
+    """
+    Envia `payload` por um socketpair local; outra thread recebe tudo.
+    Retorna os bytes recebidos quando `keep` (leituras), senão None.
+    """
+    sender, receiver = socket.socketpair()
+    received = bytearray(len(payload)) if keep else None
+
+    def _drain():
+        view = memoryview(received) if keep else memoryview(bytearray(1 << 20))
+        total = 0
+        while total < len(payload):
+            target = view[total:] if keep else view
+            n = receiver.recv_into(target)
+            if not n:
+                break
+            total += n
+
+    thread = threading.Thread(target=_drain, daemon=True)
+    thread.start()
+    try:
+        sender.sendall(payload)
+        thread.join()
+    finally:
+        sender.close()
+        receiver.close()
+    return received
+
+
+class StandInClient:
+    """
+    Substituto do `clickhouse_driver.Client` para benchmark: serializa/
+    desserializa com o driver, sem servidor. Acumula em `timers` os segundos
+    de serialização/transporte e em `bytes_sent`/`bytes_received` os volumes.
+    """
+
+    def __init__(self, schema, settings=None):
+        self.schema = list(schema)
+        self.types = dict(self.schema)
+        # Client sem conectar: só para ler os client_settings (use_numpy, insert_block_size...)
+        self.client_settings = Client("localhost", settings=dict(settings or {})).client_settings
+        self.context = Context()
+        self.context.server_info = ServerInfo(
+            "ClickHouse", 24, 8, 0, defines.CLIENT_REVISION, "UTC", "stand-in", defines.CLIENT_REVISION
+        )
+        self.context.settings = {}
+        self.context.client_settings = self.client_settings
+        self._result = b""
+        self._result_blocks = 0
+        self._result_columns = []
+        self.result_rows = 0
+        self.reset()
+
+    def reset(self):
+        self.timers = {"serializacao": 0.0, "transporte": 0.0}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.inserts = 0
+
+    def _write_blocks(self, blocks) -> bytes:
+        sock = _MemorySocket()
+        fout = BufferedSocketWriter(sock, defines.BUFFER_SIZE)
+        stream = BlockOutputStream(fout, self.context)
+        for block in blocks:
+            stream.write(block)
+        fout.flush()
+        return bytes(sock.out)
+
+    def load_result(self, df: pd.DataFrame, coerced: dict):
+        """Prepara (fora da medição) os blocos Native devolvidos pelo SELECT."""
+        columns_with_types = [(name, self.types[name]) for name in df.columns]
+        columns = [coerced[name] for name in df.columns]
+        blocks = [
+            ColumnOrientedBlock(columns_with_types, [c[i:i + SERVER_BLOCK_ROWS].tolist() for c in columns])
+            for i in range(0, len(df), SERVER_BLOCK_ROWS)
+        ]
+        self._result = self._write_blocks(blocks)
+        self._result_columns = columns_with_types
+        self._result_blocks = len(blocks)
+        self.result_rows = len(df)
+
+    def execute(self, query, params=None, with_column_types=False, columnar=False,
+                settings=None, types_check=False, **kwargs):
+        sql = query.strip()
+        head = sql.split(None, 1)[0].upper()
+        if head == "DESCRIBE":
+            return [(name, tp, "", "", "", "", "") for name, tp in self.schema]
+        if head == "INSERT":
+            return self._insert(sql, params, columnar, types_check)
+        if head in ("SELECT", "WITH"):
+            return self._select(with_column_types, columnar)
+        return []
+
+    def _insert(self, sql, data, columnar, types_check):
+        match = re.search(r"\((.*)\)\s*VALUES\s*$", sql, re.IGNORECASE | re.DOTALL)
+        names = [c.strip().strip("`") for c in match.group(1).split(",")]
+        columns_with_types = [(name, self.types[name]) for name in names]
+
+        t0 = time.perf_counter()
+        # mesmo fatiamento do Client.send_data (insert_block_size linhas por bloco)
+        block_rows = self.client_settings["insert_block_size"]
+        if columnar:
+            n_rows = len(data[0]) if data else 0
+            blocks = [
+                ColumnOrientedBlock(columns_with_types, [c[i:i + block_rows] for c in data], types_check=types_check)
+                for i in range(0, n_rows, block_rows)
+            ]
+        else:
+            n_rows = len(data)
+            blocks = [
+                RowOrientedBlock(columns_with_types, data[i:i + block_rows], types_check=types_check)
+                for i in range(0, n_rows, block_rows)
+            ]
+        payload = self._write_blocks(blocks)
+        t1 = time.perf_counter()
+        _socket_transfer(payload)
+        t2 = time.perf_counter()
+
+        self.timers["serializacao"] += t1 - t0
+        self.timers["transporte"] += t2 - t1
+        self.bytes_sent += len(payload)
+        self.inserts += 1
+        return n_rows
+
+    def _select(self, with_column_types, columnar):
+        t0 = time.perf_counter()
+        payload = _socket_transfer(self._result, keep=True)
+        t1 = time.perf_counter()
+        fin = BufferedSocketReader(_MemorySocket(payload), defines.BUFFER_SIZE)
+        stream = BlockInputStream(fin, self.context)
+        # o servidor manda primeiro um bloco vazio só com nomes e tipos
+        header = _Packet(ColumnOrientedBlock(self._result_columns, []))
+        packets = chain([header], (_Packet(stream.read()) for _ in range(self._result_blocks)))
+        result = QueryResult(packets, with_column_types=with_column_types, columnar=columnar).get_result()
+        t2 = time.perf_counter()
+
+        self.timers["transporte"] += t1 - t0
+        self.timers["serializacao"] += t2 - t1
+        self.bytes_received += len(payload)
+        return result
+
+
+# ---------- memória ----------
+
+class RssSampler:
+    """Pico de RSS do processo durante o bloco `with` (amostras a cada `interval` s)."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.baseline = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current() -> int:
+        try:
+            with open("/proc/self/statm") as fh:
+                return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError):
+            # sem /proc: ru_maxrss é o pico do processo inteiro (KB no Linux, bytes no macOS)
+            import resource
+
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def __enter__(self):
+        self.baseline = self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+        return False
+
+
+# ---------- execução ----------
+
+def _call(ch, method, kwargs, df, verbose):
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        if method == "execute_query_to_df":
+            return getattr(ch, method)(f"SELECT * FROM {DB_NAME}.{TABLE_NAME}", **kwargs)
+        return getattr(ch, method)(DB_NAME, TABLE_NAME, df, **kwargs)
+
+
+def run_benchmark(ch, client, name, method, kwargs, df, repeticoes, alloc, verbose):
+    """Executa um método `repeticoes` vezes; devolve o registro do JSON."""
+    n_rows = len(df)
+    record = {
+        "benchmark": name,
+        "metodo": method,
+        "kwargs": {k: v for k, v in kwargs.items() if k != "use_cache"},
+        "linhas": n_rows,
+    }
+    runs = []
+    try:
+        for _ in range(repeticoes):
+            # insert_df_in_batches altera o DataFrame recebido: cada execução usa uma cópia
+            frame = df.copy() if method != "execute_query_to_df" else None
+            client.reset()
+            with RssSampler() as rss:
+                t0 = time.perf_counter()
+                _call(ch, method, kwargs, frame, verbose)
+                elapsed = time.perf_counter() - t0
+            del frame
+            runs.append((elapsed, dict(client.timers), rss, client.bytes_sent + client.bytes_received, client.inserts))
+    except Exception as e:
+        print(f"   Erro em {name} ({n_rows} linhas): {e}")
+        record["erro"] = str(e)
+        return record
+
+    elapsed, timers, rss, nbytes, batches = min(runs, key=lambda r: r[0])
+    record.update(
+        segundos=round(elapsed, 4),
+        segundos_mediana=round(float(np.median([r[0] for r in runs])), 4),
+        linhas_por_s=round(n_rows / elapsed, 1) if elapsed else None,
+        fases={
+            "coercao": round(max(elapsed - timers["serializacao"] - timers["transporte"], 0.0), 4),
+            "serializacao": round(timers["serializacao"], 4),
+            "transporte": round(timers["transporte"], 4),
+        },
+        bytes_native=nbytes,
+        lotes=batches,
+        rss_pico_mb=round(max(r[2].peak for r in runs) / 1024**2, 1),
+        rss_delta_mb=round(max(r[2].peak - r[2].baseline for r in runs) / 1024**2, 1),
+        alloc_pico_mb=None,
+    )
+
+    if alloc:
+        # execução separada: o tracemalloc deixa o código várias vezes mais lento
+        frame = df.copy() if method != "execute_query_to_df" else None
+        tracemalloc.start()
+        try:
+            _call(ch, method, kwargs, frame, verbose)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        record["alloc_pico_mb"] = round(peak / 1024**2, 1)
+    return record
+
+
+def _git_version():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return "desconhecida"
+
+
+def comparar(atual: dict, anterior: dict):
+    """Imprime a razão de linhas/s entre dois JSONs de benchmark."""
+    antes = {(r["benchmark"], r["linhas"]): r for r in anterior.get("resultados", [])}
+    print(f"\nComparação com a versão {anterior.get('versao')}:")
+    for r in atual["resultados"]:
+        old = antes.get((r["benchmark"], r["linhas"]))
+        if not old or not old.get("linhas_por_s") or not r.get("linhas_por_s"):
+            continue
+        ratio = r["linhas_por_s"] / old["linhas_por_s"]
+        print(f" - {r['benchmark']:<16} {r['linhas']:>10} linhas: {ratio:.2f}x "
+              f"({old['linhas_por_s']:.0f} -> {r['linhas_por_s']:.0f} linhas/s)")
+
+
+def main():
+    """Roda o benchmark e grava o JSON de resultados."""
+    nomes = list(INSERT_BENCHMARKS) + list(READ_BENCHMARKS)
+    parser = argparse.ArgumentParser(description="Benchmark dos inserts e leituras do ClickhouseSync.")
+    parser.add_argument("--tamanhos", default="10000,1000000,10000000",
+                        help="Linhas por DataFrame, separadas por vírgula.")
+    parser.add_argument("--metodos", default=",".join(nomes), help=f"Subconjunto de {nomes}.")
+    parser.add_argument("--batch-size", type=int, default=200000)
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--use-numpy", action="store_true", help="Client com settings use_numpy.")
+    parser.add_argument("--alloc-max-linhas", type=int, default=1_000_000,
+                        help="Só mede alocações (tracemalloc) até este tamanho; 0 desliga.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--saida", help="Arquivo JSON (padrão: benchmark_<commit>.json).")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior.")
+    parser.add_argument("--verbose", action="store_true", help="Mostra os prints dos métodos.")
+    args = parser.parse_args()
+
+    tamanhos = [int(t) for t in args.tamanhos.split(",") if t.strip()]
+    escolhidos = [m.strip() for m in args.metodos.split(",") if m.strip()]
+    desconhecidos = sorted(set(escolhidos) - set(nomes))
+    if desconhecidos:
+        parser.error(f"métodos desconhecidos: {desconhecidos}")
+
+    versao = _git_version()
+    settings = {"use_numpy": True} if args.use_numpy else {}
+    print("=== BENCHMARK CLICKHOUSESYNC (stand-in local) ===")
+    print(f"Versão: {versao} | Tamanhos: {tamanhos} | Métodos: {escolhidos}")
+    print("-" * 50)
+
+    client = StandInClient(CLIENTES_SCHEMA, settings)
+    ch = ClickhouseSync("localhost", 9000, "default", "", DB_NAME, settings=settings)
+    ch.client = client
+
+    resultados = []
+    for n_rows in tamanhos:
+        print(f"\nGerando {n_rows} linhas...")
+        t0 = time.perf_counter()
+        df = gerar_clientes(n_rows, seed=args.seed)
+        print(f"✅ DataFrame gerado em {time.perf_counter() - t0:.1f}s "
+              f"({df.memory_usage(deep=True).sum() / 1024**2:.0f} MB)")
+        alloc = 0 < n_rows <= args.alloc_max_linhas
+
+        for name in escolhidos:
+            frame = df
+            if name in INSERT_BENCHMARKS:
+                method, kwargs = INSERT_BENCHMARKS[name]
+                kwargs = dict(kwargs, batch_size=args.batch_size)
+                if name == "v1":
+                    frame = _frame_v1(df)
+            else:
+                method, kwargs = READ_BENCHMARKS[name]
+                if client.result_rows != n_rows:
+                    coerced, _ = ch._coerce_frame_for_insert(df, list(df.columns), client.types)
+                    client.load_result(df, coerced)
+                    del coerced
+            record = run_benchmark(ch, client, name, method, kwargs, frame, args.repeticoes, alloc, args.verbose)
+            del frame
+            resultados.append(record)
+            if "erro" not in record:
+                fases = record["fases"]
+                print(
+                    f" - {name:<16} {record['segundos']:>8.2f}s {record['linhas_por_s']:>12.0f} linhas/s | "
+                    f"coerção {fases['coercao']:.2f}s, serialização {fases['serializacao']:.2f}s, "
+                    f"transporte {fases['transporte']:.2f}s | RSS pico {record['rss_pico_mb']:.0f} MB"
+                    + (f", alloc pico {record['alloc_pico_mb']:.0f} MB" if record["alloc_pico_mb"] is not None else "")
+                )
+        del df
+
+    saida = {
+        "versao": versao,
+        "data": _dt.datetime.now().isoformat(timespec="seconds"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "clickhouse_driver": clickhouse_driver.__version__,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "parametros": {
+            "tamanhos": tamanhos,
+            "batch_size": args.batch_size,
+            "repeticoes": args.repeticoes,
+            "use_numpy": args.use_numpy,
+            "seed": args.seed,
+        },
+        "resultados": resultados,
+    }
+    arquivo = args.saida or f"benchmark_{versao}.json"
+    with open(arquivo, "w", encoding="utf-8") as fh:
+        json.dump(saida, fh, ensure_ascii=False, indent=2)
+    print(f"\n✅ Resultados gravados em {arquivo}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as fh:
+            comparar(saida, json.load(fh))
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = main()
+    exit(exit_code)
@@ -0,0 +1,218 @@
+"""
+Variante asyncio do ClickhouseSync.
+
+O `clickhouse_driver.Client` é síncrono: chamar `execute` dentro de uma
+coroutine bloqueia o event loop. O `AsyncClickhouseSync` executa os métodos do
+ClickhouseSync em um ThreadPoolExecutor próprio, com:
+
+- limite de concorrência (`max_concurrency`), via asyncio.Semaphore
+- um pool de conexões do mesmo tamanho (cada query em voo usa sua conexão)
+- cancelamento: cancelar a task (ou `asyncio.wait_for` estourar) derruba a
+  conexão da query em andamento e o servidor aborta a execução
+
+Exemplo
+-------
+async with AsyncClickhouseSync(host, port, user, password, database) as ch:
+    dfs = await asyncio.gather(*(ch.execute_query_to_df(q) for q in queries))
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from clickhouse_sync import ClickhouseSync
+
+
+class AsyncClickhouseSync:
+    def __init__(
+        self, host, port, user, password, database, settings=None,
+        max_concurrency: int = 8, pool_max_size: int | None = None,
+        pool_min_size: int = 1, pool_max_idle_seconds: float = 300,
+        query_cache=None, http_port: int = 8123, instrumentation=None,
+    ):
+        """
+        Args
+        ----
+        max_concurrency : int
+            Máximo de chamadas executando ao mesmo tempo; as demais aguardam sem
+            bloquear o event loop.
+        pool_max_size : int | None
+            Tamanho máximo do pool de conexões (padrão: max_concurrency).
+        instrumentation : Instrumentation | None
+            Sinks de métricas/spans das chamadas (ver clickhouse_instrumentation);
+            cada chamada é medida na thread do executor que a executa.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency deve ser >= 1.")
+        self.max_concurrency = max_concurrency
+        self.sync = ClickhouseSync(
+            host, port, user, password, database, settings=settings,
+            pool_min_size=pool_min_size,
+            pool_max_size=pool_max_size or max_concurrency,
+            pool_max_idle_seconds=pool_max_idle_seconds,
+            query_cache=query_cache,
+            http_port=http_port,
+            instrumentation=instrumentation,
+        )
+        self._executor = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        if not self.sync.client:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        return False
+
+    @property
+    def client(self):
+        return self.sync.client
+
+    def _ensure_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="ch-async"
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _run(self, fn, *args, **kwargs):
+        """Executa `fn` numa thread do executor, respeitando o limite de concorrência."""
+        self._ensure_executor()
+        # estado da chamada, protegido por lock para o cancelamento não atingir
+        # outra chamada que reutilize a mesma thread
+        state = {"ident": None, "done": False, "cancelled": False}
+        lock = threading.Lock()
+
+        def _job():
+            with lock:
+                if state["cancelled"]:
+                    return None
+                state["ident"] = threading.get_ident()
+            client = self.sync.client
+            if client is not None and hasattr(client, "reset_cancel"):
+                client.reset_cancel(state["ident"])
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with lock:
+                    state["done"] = True
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._executor, _job)
+            except asyncio.CancelledError:
+                with lock:
+                    state["cancelled"] = True
+                    ident = None if state["done"] else state["ident"]
+                    client = self.sync.client
+                    if ident is not None and client is not None and hasattr(client, "cancel"):
+                        client.cancel(ident)
+                raise
+
+    # ---------- conexão ----------
+    async def connect(self):
+        self._ensure_executor()
+        await self._run(self.sync.connect)
+
+    async def close(self):
+        """Encerra o executor (as threads em andamento terminam antes) e depois fecha o pool."""
+        loop = asyncio.get_running_loop()
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await loop.run_in_executor(None, executor.shutdown)
+        # o fechamento desconecta os clientes (I/O bloqueante): fora do event loop
+        await loop.run_in_executor(None, self.sync.close)
+        self._semaphore = None
+
+    async def test_connection(self):
+        return await self._run(self.sync.test_connection)
+
+    # ---------- consultas ----------
+    async def execute_query_to_df(self, query, **kwargs):
+        return await self._run(self.sync.execute_query_to_df, query, **kwargs)
+
+    async def execute_many(self, queries):
+        """Executa várias queries em paralelo (até max_concurrency) e retorna os DataFrames na ordem."""
+        return await asyncio.gather(*(self.execute_query_to_df(q) for q in queries))
+
+    async def table_exists(self, db_name, table_name):
+        return await self._run(self.sync.table_exists, db_name, table_name)
+
+    async def get_row_count(self, db_name, table_name):
+        return await self._run(self.sync.get_row_count, db_name, table_name)
+
+    # ---------- escrita ----------
+    async def insert_df_in_batches_v4(self, db_name, table_name, df, **kwargs):
+        return await self._run(self.sync.insert_df_in_batches_v4, db_name, table_name, df, **kwargs)
+
+    async def insert_df_native(self, db_name, table_name, df, **kwargs):
+        return await self._run(self.sync.insert_df_native, db_name, table_name, df, **kwargs)
+
+    async def replace_data_atomic(self, db_name, table_name, df, **kwargs):
+        return await self._run(self.sync.replace_data_atomic, db_name, table_name, df, **kwargs)
+
+    async def upsert_df(self, db_name, table_name, df, key_columns, **kwargs):
+        return await self._run(self.sync.upsert_df, db_name, table_name, df, key_columns, **kwargs)
+
+    async def insert_changed_rows(self, db_name, table_name, df, key_columns, **kwargs):
+        return await self._run(self.sync.insert_changed_rows, db_name, table_name, df, key_columns, **kwargs)
+
+    async def plan_delete(self, db_name, table_name, where=None, params=None, **kwargs):
+        return await self._run(self.sync.plan_delete, db_name, table_name, where, params, **kwargs)
+
+    async def delete_where(self, db_name, table_name, where=None, params=None, wait=True, timeout=None, **kwargs):
+        """Envia a exclusão sem segurar uma thread do executor e espera a mutação com asyncio."""
+        handle = await self._run(
+            self.sync.delete_where, db_name, table_name, where, params, wait=False, **kwargs
+        )
+        return await self._await_handle(handle, wait, timeout)
+
+    async def _await_handle(self, handle, wait, timeout):
+        if wait and handle is not None:
+            await handle.wait_async(timeout)
+        return handle
+
+    async def pending_mutations(self, db_name, table_name):
+        return await self._run(self.sync.pending_mutations, db_name, table_name)
+
+    async def clean_table(self, db_name, table_name):
+        return await self._run(self.sync.clean_table, db_name, table_name)
+
+    async def optimize_table(self, db_name, table_name, wait=False, timeout=None):
+        handle = await self._run(self.sync.optimize_table, db_name, table_name)
+        return await self._await_handle(handle, wait, timeout)
+
+    async def delete_data_by_date(
+        self, db_name, table_name, date_column, comparator, date_value, wait=True, timeout=None,
+        allow_drop_partition=False,
+    ):
+        handle = await self._run(
+            self.sync.delete_data_by_date, db_name, table_name, date_column, comparator, date_value,
+            wait=False, allow_drop_partition=allow_drop_partition,
+        )
+        return await self._await_handle(handle, wait, timeout)
+
+    async def delete_data_by_date_and_value(
+        self, db_name, table_name, date_column, comparator, date_value, filter_column, filter_value,
+        wait=True, timeout=None, allow_drop_partition=False,
+    ):
+        handle = await self._run(
+            self.sync.delete_data_by_date_and_value,
+            db_name, table_name, date_column, comparator, date_value, filter_column, filter_value,
+            wait=False, allow_drop_partition=allow_drop_partition,
+        )
+        return await self._await_handle(handle, wait, timeout)
+
+    async def delete_by_value(
+        self, db_name, table_name, column_name, value=None, comparator="=", dry_run=False,
+        wait=True, timeout=None, allow_drop_partition=False,
+    ):
+        handle = await self._run(
+            self.sync.delete_by_value, db_name, table_name, column_name,
+            value=value, comparator=comparator, dry_run=dry_run, wait=False,
+            allow_drop_partition=allow_drop_partition,
+        )
+        return await self._await_handle(handle, wait, timeout)
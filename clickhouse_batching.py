@@ -0,0 +1,227 @@
+"""
+Tamanho de lote adaptativo para os inserts do ClickhouseSync.
+
+Um `batch_size` fixo em linhas é grande demais para tabelas largas (strings
+longas -> lotes de centenas de MB) e pequeno demais para tabelas estreitas.
+O `AdaptiveBatchSizer` escolhe o número de linhas de cada lote para atingir
+um tamanho em bytes e/ou uma latência alvo:
+
+- o tamanho de cada linha é estimado a partir dos valores já convertidos
+  (mesma conta do formato Native: largura fixa por tipo, strings pelo
+  comprimento + prefixo, 1 byte de máscara para Nullable)
+- cada lote enviado é medido (linhas, bytes, segundos); a vazão observada
+  (média móvel) ajusta o orçamento de bytes quando há latência alvo
+- só o crescimento entre lotes é limitado (`max_growth`); a redução é
+  imediata quando as linhas ficam mais largas. O resultado fica
+  sempre entre `min_rows` e `max_rows`
+
+Retries de lotes: `is_retryable` separa falhas transitórias (rede, timeout,
+sobrecarga) de erros de dados, e `batch_dedup_token` gera um
+`insert_deduplication_token` determinístico por lote, para que o servidor
+descarte um lote reenviado que já tinha sido gravado.
+"""
+import hashlib
+
+import numpy as _np
+import pandas as pd
+from clickhouse_driver.errors import NetworkError, SocketTimeoutError
+
+from clickhouse_coercion import NUMPY_INT_DTYPES
+
+# bytes por valor no formato Native, por família (ver clickhouse_coercion.column_family)
+_FIXED_WIDTH = {
+    "datetime": 4,   # DateTime; DateTime64 usa 8 (tratado abaixo)
+    "date": 2,
+    "float": 8,
+    "decimal": 16,
+    "uuid": 16,
+}
+_OTHER_WIDTH = 16  # Array/Map/Tuple/...: estimativa grosseira
+
+
+def _value_width(family: str, ch_type: str) -> int | None:
+    if family in NUMPY_INT_DTYPES:
+        return _np.dtype(NUMPY_INT_DTYPES[family]).itemsize
+    if family == "datetime" and "DateTime64" in ch_type:
+        return 8
+    if family == "date" and "Date32" in ch_type:
+        return 4
+    if family == "float" and "Float32" in ch_type:
+        return 4
+    return _FIXED_WIDTH.get(family)
+
+
+def estimate_row_bytes(coerced: dict, col_kinds: dict, column_types: dict) -> _np.ndarray:
+    """
+    Estima os bytes serializados de cada linha a partir das colunas convertidas
+    (`_coerce_frame_for_insert`). Retorna um array int64 com um valor por linha.
+    """
+    n_rows = len(next(iter(coerced.values()))) if coerced else 0
+    total = _np.zeros(n_rows, dtype=_np.int64)
+    fixed = 0
+    for col, values in coerced.items():
+        family = col_kinds[col]
+        if "Nullable(" in column_types[col]:
+            fixed += 1
+        width = _value_width(family, column_types[col])
+        if width is not None:
+            fixed += width
+        elif family == "string":
+            # comprimento + prefixo varint (1 byte até 127 caracteres)
+            total += _np.fromiter(
+                (len(v) + 1 if v is not None else 1 for v in values),
+                dtype=_np.int64, count=n_rows,
+            )
+        else:
+            fixed += _OTHER_WIDTH
+    return total + fixed
+
+
+class AdaptiveBatchSizer:
+    def __init__(
+        self,
+        target_bytes: int | None = 32 * 1024 * 1024,
+        target_seconds: float | None = None,
+        min_rows: int = 1000,
+        max_rows: int = 1_000_000,
+        initial_rows: int = 10000,
+        max_growth: float = 4.0,
+        smoothing: float = 0.5,
+    ):
+        """
+        Args
+        ----
+        target_bytes : int | None
+            Tamanho alvo (estimado) de cada lote em bytes.
+        target_seconds : float | None
+            Latência alvo por lote; usa a vazão medida nos lotes anteriores.
+            Com os dois alvos, vale o mais restritivo.
+        min_rows, max_rows : int
+            Limites do número de linhas por lote.
+        initial_rows : int
+            Linhas do primeiro lote quando só há alvo de latência.
+        max_growth : float
+            Fator máximo de crescimento entre um lote e o seguinte; a redução
+            não é limitada (o orçamento de bytes encolhe o lote na hora).
+        smoothing : float
+            Peso da última medição na média móvel da vazão (0..1].
+        """
+        if target_bytes is None and target_seconds is None:
+            raise ValueError("Informe target_bytes e/ou target_seconds.")
+        if min_rows < 1 or max_rows < min_rows:
+            raise ValueError("Limites inválidos: exige 1 <= min_rows <= max_rows.")
+        self.target_bytes = target_bytes
+        self.target_seconds = target_seconds
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.initial_rows = initial_rows
+        self.max_growth = max_growth
+        self.smoothing = smoothing
+
+        self.bytes_per_second = None
+        self.history = []  # (linhas, bytes, segundos) de cada lote enviado
+
+    def byte_budget(self) -> float | None:
+        """Bytes alvo do próximo lote (None = ainda sem base para latência)."""
+        budgets = []
+        if self.target_bytes is not None:
+            budgets.append(self.target_bytes)
+        if self.target_seconds is not None and self.bytes_per_second:
+            budgets.append(self.bytes_per_second * self.target_seconds)
+        return min(budgets) if budgets else None
+
+    def next_rows(self, cum_bytes: _np.ndarray, start: int) -> int:
+        """
+        Linhas do próximo lote a partir da linha `start`. `cum_bytes` é a soma
+        acumulada de `estimate_row_bytes` (cum_bytes[i] = bytes das linhas 0..i).
+        """
+        remaining = len(cum_bytes) - start
+        if remaining <= 0:
+            return 0
+        budget = self.byte_budget()
+        if budget is None:
+            rows = self.initial_rows
+        else:
+            base = cum_bytes[start - 1] if start > 0 else 0
+            rows = int(_np.searchsorted(cum_bytes, base + budget, side="right")) - start
+
+        if self.history:
+            prev = self.history[-1][0]
+            rows = min(rows, int(prev * self.max_growth))
+        rows = max(self.min_rows, min(self.max_rows, rows))
+        return max(1, min(rows, remaining))
+
+    def observe(self, rows: int, nbytes: int, seconds: float) -> None:
+        """Registra um lote enviado e atualiza a vazão média."""
+        self.history.append((rows, int(nbytes), seconds))
+        if seconds > 0:
+            rate = nbytes / seconds
+            if self.bytes_per_second is None:
+                self.bytes_per_second = rate
+            else:
+                a = self.smoothing
+                self.bytes_per_second = a * rate + (1 - a) * self.bytes_per_second
+
+    @property
+    def sizes(self) -> list[int]:
+        return [rows for rows, _, _ in self.history]
+
+    def summary(self) -> str:
+        if not self.history:
+            return "Nenhum lote enviado."
+        rows = self.sizes
+        total_bytes = sum(b for _, b, _ in self.history)
+        total_secs = sum(s for _, _, s in self.history)
+        return (
+            f"{len(rows)} lote(s) adaptativos: linhas min={min(rows)} max={max(rows)} "
+            f"média={sum(rows) // len(rows)}, ~{total_bytes / 1024**2:.1f} MB em {total_secs:.2f}s"
+        )
+
+
+
+# ---------- retries ----------
+# códigos do servidor que indicam falha transitória
+RETRYABLE_SERVER_CODES = {
+    159,  # TIMEOUT_EXCEEDED
+    202,  # TOO_MANY_SIMULTANEOUS_QUERIES
+    209,  # SOCKET_TIMEOUT
+    210,  # NETWORK_ERROR
+    241,  # MEMORY_LIMIT_EXCEEDED
+    242,  # TABLE_IS_READ_ONLY (réplica sem ZooKeeper/Keeper)
+    252,  # TOO_MANY_PARTS
+    319,  # UNKNOWN_STATUS_OF_INSERT
+    999,  # KEEPER_EXCEPTION
+}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True para erros de rede/timeout/sobrecarga, em que reenviar o lote faz sentido."""
+    if isinstance(exc, (NetworkError, SocketTimeoutError, ConnectionError, TimeoutError, EOFError)):
+        return True
+    return getattr(exc, "code", None) in RETRYABLE_SERVER_CODES
+
+
+def retry_delay(attempt: int, backoff: float, max_backoff: float) -> float:
+    """Espera antes da tentativa `attempt` (1, 2, ...): backoff exponencial com teto."""
+    return min(backoff * 2 ** (attempt - 1), max_backoff)
+
+
+def batch_dedup_token(df: pd.DataFrame, start: int, end: int, prefix: str | None = None) -> str:
+    """
+    `insert_deduplication_token` do lote df[start:end].
+
+    Com `prefix` (ex.: id da execução do DAG) o token é `prefix-start-end`;
+    sem, usa um hash do conteúdo do lote (pd.util.hash_pandas_object), o que
+    deduplica também uma nova execução com os mesmos dados e o mesmo batch_size.
+    """
+    if prefix is not None:
+        return f"{prefix}-{start}-{end}"
+    part = df.iloc[start:end]
+    try:
+        hashes = pd.util.hash_pandas_object(part, index=False)
+    except TypeError:
+        # listas/dicts (Array/Map) não são hasheáveis: usa o texto
+        hashes = pd.util.hash_pandas_object(part.astype(str), index=False)
+    digest = hashlib.sha1("\x1f".join(map(str, part.columns)).encode())
+    digest.update(hashes.to_numpy().tobytes())
+    return f"{start}-{end}-{digest.hexdigest()[:20]}"
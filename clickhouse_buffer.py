@@ -0,0 +1,239 @@
+"""
+Escrita bufferizada para o ClickhouseSync.
+
+Produtores que inserem poucas centenas de linhas por vez geram uma parte nova
+no MergeTree a cada insert ("too many parts"). O `BufferedWriter` junta os
+DataFrames em memória e grava um insert só quando o buffer atinge
+`max_rows` linhas, `max_bytes` bytes ou `max_delay` segundos desde o dado
+mais antigo. Uma thread em background faz os flushes:
+
+    with ch.buffered_writer("bi", "eventos", max_rows=100_000, max_delay=5) as writer:
+        for df in produtor():
+            writer.write(df)
+    # close() (no fim do with) grava o que sobrou
+
+- backpressure: com `max_pending_rows` linhas aguardando, `write` bloqueia
+  até o flush liberar espaço (ou `BufferFullError` após `put_timeout`)
+- `async_insert=True` manda os inserts com `async_insert=1` (o servidor ainda
+  agrupa inserts de vários produtores); `wait_for_async_insert` decide se o
+  flush espera a gravação
+- um flush que falha devolve os dados ao início do buffer; o erro é levantado
+  no próximo `write`/`flush`/`close`
+- `close()` é registrado no atexit: o buffer é gravado mesmo se o produtor
+  esquecer de fechar
+"""
+import atexit
+import threading
+import time
+
+import pandas as pd
+
+
+class BufferFullError(Exception):
+    """O buffer continuou cheio durante todo o `put_timeout`."""
+
+
+class BufferedWriter:
+    def __init__(
+        self,
+        sync,
+        db_name: str,
+        table_name: str,
+        max_rows: int = 100_000,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_delay: float = 5.0,
+        max_pending_rows: int | None = None,
+        put_timeout: float | None = None,
+        async_insert: bool = False,
+        wait_for_async_insert: bool = True,
+        insert_method: str = "v4",
+        **insert_kwargs,
+    ):
+        """
+        Args
+        ----
+        sync : ClickhouseSync
+            Instância conectada usada nos inserts.
+        max_rows, max_bytes, max_delay
+            Limites que disparam o flush (linhas, bytes em memória, segundos
+            desde o primeiro dado do buffer).
+        max_pending_rows : int | None
+            Linhas em memória a partir das quais `write` bloqueia (padrão:
+            4 * max_rows).
+        put_timeout : float | None
+            Espera máxima de `write` com o buffer cheio (None = indefinida).
+        async_insert, wait_for_async_insert : bool
+            Settings `async_insert`/`wait_for_async_insert` do servidor.
+        insert_method : str
+            "v4" (insert_df_in_batches_v4) ou "native" (insert_df_native).
+        **insert_kwargs
+            Repassados ao método de insert (retries, columnar, ...).
+        """
+        if max_rows < 1 or max_bytes < 1 or max_delay <= 0:
+            raise ValueError("max_rows, max_bytes e max_delay devem ser positivos.")
+        inserters = {"v4": sync.insert_df_in_batches_v4, "native": sync.insert_df_native}
+        if insert_method not in inserters:
+            raise ValueError(f"insert_method deve ser um de {sorted(inserters)}.")
+        self.sync = sync
+        self.db_name = db_name
+        self.table_name = table_name
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.max_pending_rows = max_pending_rows or 4 * max_rows
+        self.put_timeout = put_timeout
+        self._insert = inserters[insert_method]
+        self.insert_kwargs = dict(insert_kwargs)
+        if async_insert:
+            settings = dict(self.insert_kwargs.get("settings") or {})
+            settings.update(
+                async_insert=1, wait_for_async_insert=1 if wait_for_async_insert else 0
+            )
+            self.insert_kwargs["settings"] = settings
+        self.insert_kwargs.setdefault("batch_size", max(max_rows, self.max_pending_rows))
+
+        self._frames = []
+        self._rows = 0
+        self._bytes = 0
+        self._oldest = None            # time.monotonic() do dado mais antigo
+        self._error = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+
+        # estatísticas
+        self.rows_written = 0
+        self.flushes = 0
+        self.flush_seconds = 0.0
+
+        self._thread = threading.Thread(
+            target=self._run, name=f"ch-buffer-{table_name}", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @property
+    def pending_rows(self) -> int:
+        return self._rows
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _due(self) -> bool:
+        if not self._rows:
+            return False
+        if self._rows >= self.max_rows or self._bytes >= self.max_bytes:
+            return True
+        return time.monotonic() - self._oldest >= self.max_delay
+
+    def write(self, df: pd.DataFrame) -> None:
+        """Acrescenta `df` ao buffer (bloqueia enquanto o buffer estiver cheio)."""
+        if df is None or df.empty:
+            return
+        nbytes = int(df.memory_usage(deep=True, index=False).sum())
+        deadline = None if self.put_timeout is None else time.monotonic() + self.put_timeout
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BufferedWriter fechado.")
+            self._raise_error()
+            while self._rows and self._rows + len(df) > self.max_pending_rows:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise BufferFullError(
+                        f"Buffer de {self.db_name}.{self.table_name} cheio "
+                        f"({self._rows} linhas) por {self.put_timeout}s."
+                    )
+                self._cond.notify_all()
+                self._cond.wait(remaining)
+                self._raise_error()
+            self._frames.append(df)
+            self._rows += len(df)
+            self._bytes += nbytes
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            # acorda a thread de flush: limite atingido ou novo prazo de max_delay
+            self._cond.notify_all()
+
+    def _take(self):
+        with self._cond:
+            frames, rows, nbytes, oldest = self._frames, self._rows, self._bytes, self._oldest
+            self._frames, self._rows, self._bytes, self._oldest = [], 0, 0, None
+        return frames, rows, nbytes, oldest
+
+    def _flush_once(self) -> int:
+        """Grava tudo que está no buffer agora; devolve as linhas gravadas."""
+        with self._flush_lock:
+            frames, rows, nbytes, oldest = self._take()
+            if not frames:
+                return 0
+            t0 = time.perf_counter()
+            try:
+                df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+                self._insert(self.db_name, self.table_name, df, **self.insert_kwargs)
+            except Exception as e:
+                # devolve os dados ao início do buffer para a próxima tentativa
+                with self._cond:
+                    self._frames = frames + self._frames
+                    self._rows += rows
+                    self._bytes += nbytes
+                    self._oldest = oldest if self._oldest is None else min(oldest, self._oldest)
+                    self._error = e
+                    self._cond.notify_all()
+                print(f"Erro no flush do buffer de {self.db_name}.{self.table_name}: {e}")
+                return 0
+            elapsed = time.perf_counter() - t0
+            with self._cond:
+                # os dados de um flush anterior que falhou também foram gravados
+                self._error = None
+                self.rows_written += rows
+                self.flushes += 1
+                self.flush_seconds += elapsed
+                self._cond.notify_all()
+            print(
+                f"Buffer de {self.db_name}.{self.table_name}: {rows} linha(s) "
+                f"gravada(s) em {elapsed:.2f}s ({len(frames)} escrita(s) agrupadas)."
+            )
+            return rows
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._due():
+                    timeout = None
+                    if self._rows:
+                        timeout = max(self.max_delay - (time.monotonic() - self._oldest), 0.01)
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+            if not self._flush_once() and self._error is not None:
+                # após uma falha, espera max_delay antes de tentar de novo
+                with self._cond:
+                    if not self._closed:
+                        self._cond.wait(self.max_delay)
+
+    def flush(self) -> int:
+        """Grava o buffer agora, na thread atual; levanta o erro de um flush anterior."""
+        rows = self._flush_once()
+        with self._cond:
+            self._raise_error()
+        return rows
+
+    def close(self) -> None:
+        """Para a thread de flush e grava o que restou (idempotente)."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        atexit.unregister(self.close)
+        self._thread.join()
+        self.flush()
@@ -0,0 +1,349 @@
+"""
+Caches do ClickhouseSync: resultados de queries e metadados de schema.
+
+Relatórios e dashboards rodam as mesmas agregações repetidamente. O
+`QueryResultCache` guarda o DataFrame de cada query, com:
+
+- chave = SQL normalizado (espaços/`;` final) + parâmetros + modo de leitura
+- TTL por entrada
+- limite de memória (bytes do DataFrame) com descarte LRU
+- camada opcional em disco (Parquet, exige pyarrow) que sobrevive entre
+  execuções do processo
+- invalidação por tabela: o ClickhouseSync chama `invalidate_table` após
+  inserts/deletes/drops feitos pela própria classe
+
+Queries em views não são invalidadas pelas escritas nas tabelas de origem;
+para elas vale apenas o TTL.
+
+O `SchemaCache` guarda, por instância, o DESCRIBE TABLE já decomposto
+(`ColumnSpec`) e o resultado de EXISTS TABLE, invalidados pelos métodos de
+DDL da classe.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from clickhouse_coercion import parse_column
+
+_TABLE_REF_RE = re.compile(
+    r"\b(?:FROM|JOIN|INTO|TABLE|UPDATE)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?"
+    r"((?:`[^`]+`|[\w]+)(?:\.(?:`[^`]+`|[\w]+))?)",
+    re.IGNORECASE,
+)
+_READ_ONLY_RE = re.compile(r"^\s*(SELECT|WITH|SHOW|DESCRIBE|DESC|EXISTS|EXPLAIN)\b", re.IGNORECASE)
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_sql(query: str) -> str:
+    """Colapsa espaços e remove `;` final (não altera literais)."""
+    return _WS_RE.sub(" ", query).strip().rstrip(";").strip()
+
+
+def referenced_tables(query: str, default_db: str | None = None) -> frozenset:
+    """Tabelas citadas após FROM/JOIN/INTO/TABLE/UPDATE, como 'db.tabela' (grafia original)."""
+    tables = set()
+    for ref in _TABLE_REF_RE.findall(query):
+        parts = [p.strip("`") for p in ref.split(".")]
+        if len(parts) == 1:
+            if not default_db:
+                continue
+            parts = [default_db] + parts
+        tables.add(".".join(parts))
+    return frozenset(tables)
+
+
+def is_read_only(query: str) -> bool:
+    return bool(_READ_ONLY_RE.match(query))
+
+
+class QueryResultCache:
+    def __init__(
+        self,
+        ttl_seconds: float = 300.0,
+        max_bytes: int = 256 * 1024 * 1024,
+        disk_dir: str | None = None,
+    ):
+        """
+        Args
+        ----
+        ttl_seconds : float
+            Validade de cada resultado (memória e disco).
+        max_bytes : int
+            Memória máxima ocupada pelos DataFrames; acima disso descarta os
+            menos usados recentemente (LRU). Resultados maiores que o limite
+            não ficam em memória (só no disco, se houver).
+        disk_dir : str | None
+            Diretório para a camada Parquet. None desativa o disco.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()  # key -> (df, expires_at, nbytes, tables)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # ---------- chave ----------
+    @staticmethod
+    def make_key(query: str, params=None, **options) -> str:
+        raw = json.dumps(
+            [normalize_sql(query), repr(params), sorted(options.items())], default=repr
+        )
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    # ---------- leitura / escrita ----------
+    def get(self, key: str):
+        """Retorna uma cópia do DataFrame em cache, ou None (miss/expirado)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                df, expires_at, _, _ = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return df.copy()
+                self._pop_locked(key)
+
+        df, tables, expires_at = self._disk_get(key, now)
+        with self._lock:
+            if df is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._mem_put(key, df, tables, expires_at)
+        return df.copy()
+
+    def put(self, key: str, df, tables=frozenset()) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        # comparação sem diferenciar maiúsculas: invalida a mais, nunca a menos
+        tables = frozenset(t.lower() for t in tables)
+        df = df.copy()
+        self._mem_put(key, df, tables, expires_at)
+        self._disk_put(key, df, tables, expires_at)
+
+    # ---------- invalidação ----------
+    def invalidate_table(self, db_name: str, table_name: str) -> int:
+        """Remove as entradas que leem `db_name.table_name`. Retorna quantas."""
+        name = f"{db_name}.{table_name}".replace("`", "").lower()
+        removed = 0
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if name in e[3]]:
+                self._pop_locked(key)
+                removed += 1
+        for key, tables in self._disk_index():
+            if name in tables:
+                self._disk_remove(key)
+                removed += 1
+        return removed
+
+    def invalidate_sql(self, command: str, default_db: str | None = None) -> int:
+        """Invalida as tabelas citadas por um comando que não seja somente leitura."""
+        if is_read_only(command):
+            return 0
+        removed = 0
+        for name in referenced_tables(command, default_db):
+            db_name, table_name = name.split(".", 1)
+            removed += self.invalidate_table(db_name, table_name)
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        for key, _ in self._disk_index():
+            self._disk_remove(key)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ---------- memória ----------
+    def _mem_put(self, key, df, tables, expires_at) -> None:
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            if key in self._entries:
+                self._pop_locked(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (df, expires_at, nbytes, frozenset(tables))
+            self._bytes += nbytes
+            now = time.time()
+            while self._bytes > self.max_bytes and self._entries:
+                # LRU: o menos usado fica no início; expirados saem primeiro
+                expired = [k for k, e in self._entries.items() if e[1] <= now]
+                self._pop_locked(expired[0] if expired else next(iter(self._entries)))
+
+    def _pop_locked(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    # ---------- disco (Parquet) ----------
+    def _disk_paths(self, key):
+        return (
+            os.path.join(self.disk_dir, f"{key}.parquet"),
+            os.path.join(self.disk_dir, f"{key}.json"),
+        )
+
+    def _disk_put(self, key, df, tables, expires_at) -> None:
+        if not self.disk_dir:
+            return
+        data_path, meta_path = self._disk_paths(key)
+        try:
+            df.to_parquet(data_path, index=False)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "tables": sorted(tables)}, f)
+        except Exception as e:
+            # ex.: pyarrow ausente ou tipos não suportados pelo Parquet
+            print(f"Cache em disco indisponível para a query: {e}")
+            self._disk_remove(key)
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None, None, None
+        data_path, meta_path = self._disk_paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None, None, None
+        expires_at = meta.get("expires_at", 0)
+        if expires_at <= now:
+            self._disk_remove(key)
+            return None, None, None
+        try:
+            df = pd.read_parquet(data_path)
+        except Exception:
+            self._disk_remove(key)
+            return None, None, None
+        return df, frozenset(meta.get("tables", ())), expires_at
+
+    def _disk_index(self):
+        if not self.disk_dir or not os.path.isdir(self.disk_dir):
+            return []
+        index = []
+        for fname in os.listdir(self.disk_dir):
+            if not fname.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.disk_dir, fname), encoding="utf-8") as f:
+                    tables = frozenset(json.load(f).get("tables", ()))
+            except (OSError, ValueError):
+                continue
+            index.append((fname[:-5], tables))
+        return index
+
+    def _disk_remove(self, key) -> None:
+        for path in self._disk_paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class SchemaCache:
+    def __init__(self, ttl_seconds: float | None = 300.0):
+        """
+        Args
+        ----
+        ttl_seconds : float | None
+            Validade das entradas; cobre DDL feito fora desta instância.
+            None = sem expiração, 0 = cache desligado.
+        """
+        self.ttl_seconds = ttl_seconds
+        self._columns = {}  # "db.tabela" -> (dict nome -> ColumnSpec, expires_at)
+        self._exists = {}   # "db.tabela" -> (bool, expires_at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _name(db_name, table_name) -> str:
+        # nomes de tabela no ClickHouse diferenciam maiúsculas
+        return f"{db_name}.{table_name}".replace("`", "")
+
+    def _expires_at(self) -> float:
+        return float("inf") if self.ttl_seconds is None else time.monotonic() + self.ttl_seconds
+
+    def _lookup(self, store, name):
+        with self._lock:
+            entry = store.get(name)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                store.pop(name, None)
+                return None
+            return value
+
+    def _store(self, store, name, value) -> None:
+        if self.ttl_seconds == 0:
+            return
+        with self._lock:
+            store[name] = (value, self._expires_at())
+
+    def columns(self, db_name, table_name, describe) -> dict:
+        """
+        Retorna {coluna: ColumnSpec} na ordem da tabela. `describe` é chamado
+        (e deve retornar as linhas do DESCRIBE TABLE) só em caso de miss.
+        """
+        name = self._name(db_name, table_name)
+        specs = self._lookup(self._columns, name)
+        if specs is None:
+            specs = {row[0]: parse_column(row[0], row[1]) for row in describe()}
+            self._store(self._columns, name, specs)
+            # DESCRIBE bem-sucedido implica que a tabela existe
+            self._store(self._exists, name, True)
+        return specs
+
+    def exists(self, db_name, table_name, check) -> bool:
+        """
+        Retorna o EXISTS TABLE em cache; `check` é chamado só em caso de miss.
+        Só o resultado positivo é guardado: uma tabela criada por outro processo
+        passa a ser vista na próxima consulta.
+        """
+        name = self._name(db_name, table_name)
+        value = self._lookup(self._exists, name)
+        if value is None:
+            value = bool(check())
+            if value:
+                self._store(self._exists, name, value)
+        return value
+
+    def invalidate(self, db_name, table_name=None) -> None:
+        """Descarta uma tabela ou, sem `table_name`, todas as tabelas do banco."""
+        with self._lock:
+            if table_name is not None:
+                name = self._name(db_name, table_name)
+                self._columns.pop(name, None)
+                self._exists.pop(name, None)
+                return
+            prefix = f"{db_name}.".replace("`", "")
+            for store in (self._columns, self._exists):
+                for name in [n for n in store if n.startswith(prefix)]:
+                    store.pop(name, None)
+
+    def invalidate_sql(self, command: str, default_db: str | None = None) -> None:
+        """Invalida as tabelas citadas por um comando que não seja somente leitura."""
+        if is_read_only(command):
+            return
+        for name in referenced_tables(command, default_db):
+            db_name, table_name = name.split(".", 1)
+            self.invalidate(db_name, table_name)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._columns.clear()
+            self._exists.clear()
@@ -0,0 +1,259 @@
+"""
+Escolha de codecs de compressão por coluna.
+
+Sem CODEC explícito o ClickHouse usa LZ4 em todas as colunas. Para cada
+coluna testamos uma lista de candidatos (LZ4, níveis de ZSTD e os codecs
+especializados Delta/DoubleDelta/T64 para inteiros e datas, Gorilla para
+floats) e medimos o tamanho comprimido de duas formas:
+
+- no servidor (`ClickhouseSync.benchmark_column_codecs`): uma tabela
+  temporária com uma cópia da coluna por codec recebe uma amostra da tabela
+  de origem; os tamanhos vêm de `system.columns`. É a medida real.
+- simulada (`simulate_codecs`): para um DataFrame, sem servidor. A coluna é
+  serializada no formato Native (clickhouse_native), dividida em blocos de
+  `block_bytes` como nos compressed blocks do ClickHouse, transformada
+  (Delta, DoubleDelta, Gorilla = XOR com o anterior, T64 = corte de bits +
+  transposição) e comprimida com lz4/zstandard. Os codecs especializados do
+  ClickHouse fazem ainda bit-packing próprio, então a simulação é uma
+  estimativa para ordenar os candidatos, não o tamanho exato.
+  Sem os pacotes `lz4`/`zstandard` (opcionais), ZSTD é estimado com zlib e
+  LZ4 com zlib nível 1.
+
+`recommend_codecs` escolhe o codec de cada coluna e `codec_alter_statements`
+gera os `ALTER TABLE ... MODIFY COLUMN ... CODEC(...)`.
+"""
+import zlib
+
+import numpy as _np
+import pandas as pd
+
+from clickhouse_coercion import NUMPY_INT_DTYPES, coerce_series, strip_wrappers
+from clickhouse_native import UnsupportedNativeType, encode_column
+
+GENERIC_CODECS = ["LZ4", "ZSTD(1)", "ZSTD(3)", "ZSTD(9)"]
+INTEGER_CODECS = GENERIC_CODECS + [
+    "Delta, LZ4", "Delta, ZSTD(1)",
+    "DoubleDelta, LZ4", "DoubleDelta, ZSTD(1)",
+    "T64, LZ4", "T64, ZSTD(1)",
+]
+FLOAT_CODECS = GENERIC_CODECS + ["Gorilla, LZ4", "Gorilla, ZSTD(1)"]
+
+# cabeçalho de cada compressed block (checksum 16 + método/tamanhos 9)
+_BLOCK_HEADER = 25
+_TIME_WIDTHS = {"Date": ("<u2", False), "Date32": ("<i4", True), "DateTime": ("<u4", False)}
+
+
+def candidate_codecs(ch_type: str) -> list[str]:
+    """Codecs a testar para um tipo (LowCardinality e compostos só genéricos)."""
+    if ch_type.startswith("LowCardinality("):
+        return list(GENERIC_CODECS)
+    base, _ = strip_wrappers(ch_type)
+    if base in NUMPY_INT_DTYPES or base in _TIME_WIDTHS:
+        return list(INTEGER_CODECS)
+    if base.startswith("DateTime64"):
+        return [c for c in INTEGER_CODECS if not c.startswith("T64")]
+    if base.startswith("Float"):
+        return list(FLOAT_CODECS)
+    return list(GENERIC_CODECS)
+
+
+# ---------- compressores ----------
+def _compressor(name: str, level: int | None):
+    """Função bytes -> bytes comprimidos, e se é uma estimativa (zlib)."""
+    if name == "LZ4":
+        try:
+            import lz4.block
+
+            return (lambda b: lz4.block.compress(b, store_size=False)), False
+        except ImportError:
+            return (lambda b: zlib.compress(b, 1)), True
+    try:
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor(level=level or 1)
+        return compressor.compress, False
+    except ImportError:
+        # zlib não tem os níveis do zstd; mapeia para a faixa 1..9
+        zlevel = min(max(level or 1, 1), 9)
+        return (lambda b: zlib.compress(b, zlevel)), True
+
+
+def _parse_codec(codec: str) -> tuple[list[str], str, int | None]:
+    """'Delta, ZSTD(3)' -> (['Delta'], 'ZSTD', 3)."""
+    parts = [p.strip() for p in codec.split(",")]
+    final = parts[-1]
+    if final.startswith("ZSTD"):
+        level = int(final[5:-1]) if "(" in final else 1
+        return parts[:-1], "ZSTD", level
+    return parts[:-1], final, None
+
+
+# ---------- transformações (aproximam os codecs especializados) ----------
+def _delta(arr: _np.ndarray) -> _np.ndarray:
+    out = arr.copy()
+    out[1:] = arr[1:] - arr[:-1]
+    return out
+
+
+def _gorilla(arr: _np.ndarray) -> _np.ndarray:
+    out = arr.copy()
+    out[1:] = arr[1:] ^ arr[:-1]
+    return out
+
+
+def _t64(arr: _np.ndarray, signed: bool) -> bytes:
+    """Subtrai o mínimo, corta os bits altos não usados e transpõe grupos de 64 valores."""
+    if not len(arr):
+        return b""
+    values = arr.astype(_np.int64) if signed else arr.astype(_np.uint64)
+    mn = values.min()
+    shifted = (values - mn).astype(_np.uint64)
+    bits = max(int(shifted.max()).bit_length(), 1)
+    pad = (-len(shifted)) % 64
+    groups = _np.concatenate([shifted, _np.zeros(pad, dtype=_np.uint64)]).reshape(-1, 64)
+    planes = [
+        _np.packbits(((groups >> _np.uint64(b)) & _np.uint64(1)).astype(_np.uint8), axis=1)
+        for b in range(bits)
+    ]
+    header = _np.array([mn, values.max()], dtype=values.dtype).tobytes()
+    return header + _np.stack(planes, axis=1).tobytes()
+
+
+def _transform(block: bytes, steps: list[str], dtype: str | None, signed: bool) -> bytes:
+    if not steps or dtype is None:
+        return block
+    arr = _np.frombuffer(block, dtype=dtype)
+    for step in steps:
+        if step == "Delta":
+            arr = _delta(arr)
+        elif step == "DoubleDelta":
+            arr = _delta(_delta(arr))
+        elif step == "Gorilla":
+            arr = _gorilla(arr.view(f"<u{arr.dtype.itemsize}"))
+        elif step == "T64":
+            return _t64(arr, signed)
+    return arr.tobytes()
+
+
+def _value_dtype(base: str) -> tuple[str | None, bool]:
+    """dtype NumPy dos valores no formato Native (para as transformações)."""
+    if base in NUMPY_INT_DTYPES:
+        dtype = _np.dtype(NUMPY_INT_DTYPES[base])
+        return f"<{dtype.kind}{dtype.itemsize}", dtype.kind == "i"
+    if base in _TIME_WIDTHS:
+        return _TIME_WIDTHS[base]
+    if base.startswith("DateTime64"):
+        return "<i8", True
+    if base == "Float32":
+        return "<f4", True
+    if base == "Float64":
+        return "<f8", True
+    return None, False
+
+
+def _blocks(body: bytes, block_bytes: int, width: int):
+    step = max(block_bytes - block_bytes % width, width)
+    for i in range(0, len(body), step):
+        yield body[i:i + step]
+
+
+def column_stream(values: pd.Series, ch_type: str, datetime_strfmt: str = "%Y-%m-%d %H:%M:%S") -> bytes:
+    """Bytes dos valores da coluna como o ClickHouse os grava (sem a máscara de nulos)."""
+    base, _ = strip_wrappers(ch_type)
+    coerced = coerce_series(values, f"Nullable({base})", datetime_strfmt).to_numpy(dtype=object)
+    # Nullable só para aceitar nulos; a máscara (1 byte por linha) é descartada
+    return encode_column(coerced, f"Nullable({base})", tz="UTC")[len(coerced):]
+
+
+def simulate_codecs(
+    df: pd.DataFrame,
+    column_types: dict,
+    candidates: dict | None = None,
+    block_bytes: int = 1024 * 1024,
+) -> pd.DataFrame:
+    """
+    Estima o tamanho comprimido de cada coluna com cada codec candidato.
+
+    Args
+    ----
+    column_types : dict
+        {coluna: tipo ClickHouse} (ex.: `ClickhouseSync._column_types`).
+    candidates : dict | None
+        {coluna: [codecs]} para substituir `candidate_codecs`.
+    block_bytes : int
+        Tamanho dos blocos comprimidos (max_compress_block_size do ClickHouse).
+
+    Returns
+    -------
+    pd.DataFrame
+        column, type, codec, compressed_bytes, uncompressed_bytes, ratio, estimated.
+    """
+    rows = []
+    for col, ch_type in column_types.items():
+        if col not in df.columns:
+            continue
+        base, _ = strip_wrappers(ch_type)
+        try:
+            body = column_stream(df[col], ch_type)
+        except (UnsupportedNativeType, ValueError, TypeError) as e:
+            print(f"Coluna '{col}' ({ch_type}) ignorada na simulação: {e}")
+            continue
+        dtype, signed = _value_dtype(base)
+        width = _np.dtype(dtype).itemsize if dtype else 1
+        codecs = (candidates or {}).get(col) or candidate_codecs(ch_type)
+        for codec in codecs:
+            steps, final, level = _parse_codec(codec)
+            compress, estimated = _compressor(final, level)
+            size = 0
+            for block in _blocks(body, block_bytes, width):
+                size += len(compress(_transform(block, steps, dtype, signed))) + _BLOCK_HEADER
+            rows.append({
+                "column": col,
+                "type": ch_type,
+                "codec": codec,
+                "compressed_bytes": size,
+                "uncompressed_bytes": len(body),
+                "ratio": len(body) / size if size else None,
+                "estimated": estimated,
+            })
+    return pd.DataFrame(
+        rows,
+        columns=["column", "type", "codec", "compressed_bytes", "uncompressed_bytes", "ratio", "estimated"],
+    )
+
+
+def recommend_codecs(results: pd.DataFrame, min_gain: float = 0.05, tolerance: float = 0.02) -> dict:
+    """
+    Escolhe um codec por coluna a partir do resultado do benchmark/simulação.
+
+    - o menor tamanho vence, mas entre candidatos até `tolerance` (2%) maiores
+      que o melhor fica o primeiro da lista (mais barato de comprimir/ler)
+    - a coluna só entra no resultado se economizar pelo menos `min_gain` (5%)
+      em relação ao LZ4 (padrão do ClickHouse) ou ao primeiro candidato
+
+    Returns
+    -------
+    dict
+        {coluna: (codec, bytes com o codec, bytes com o padrão)}
+    """
+    recommendations = {}
+    for col, group in results.groupby("column", sort=False):
+        group = group.reset_index(drop=True)
+        baseline_rows = group[group["codec"] == "LZ4"]
+        baseline = int((baseline_rows if len(baseline_rows) else group.iloc[:1])["compressed_bytes"].iloc[0])
+        best = group["compressed_bytes"].min()
+        pick = group[group["compressed_bytes"] <= best * (1 + tolerance)].iloc[0]
+        if pick["compressed_bytes"] <= baseline * (1 - min_gain):
+            recommendations[col] = (pick["codec"], int(pick["compressed_bytes"]), baseline)
+    return recommendations
+
+
+def codec_alter_statements(db_name: str, table_name: str, recommendations: dict, column_types: dict) -> list[str]:
+    """`ALTER TABLE ... MODIFY COLUMN ... CODEC(...)` para cada coluna recomendada."""
+    statements = []
+    for col, rec in recommendations.items():
+        codec = rec[0] if isinstance(rec, tuple) else rec
+        statements.append(
+            f"ALTER TABLE {db_name}.{table_name} MODIFY COLUMN `{col}` {column_types[col]} CODEC({codec})"
+        )
+    return statements
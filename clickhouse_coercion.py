@@ -0,0 +1,622 @@
+"""
+Coerção vetorizada de colunas pandas para os tipos do ClickHouse.
+
+Cada família de tipo do DESCRIBE TABLE (Int/UInt, Float, DateTime/Date,
+String, Decimal, UUID) tem uma conversão que opera na coluna inteira com
+NumPy/pandas, mantendo exatamente a semântica de nulos e defaults do
+`insert_df_in_batches_v4`:
+
+- Int/UInt inválido, fora do range ou nulo -> None (Nullable) | default
+  (0 para UInt, -1 para Int) nas colunas não-nullable
+- Float/DateTime/Date/String/Decimal/UUID inválido ou nulo -> None
+- valores de saída são sempre tipos Python nativos (int, float, str,
+  datetime, date, Decimal) ou None, em uma Series dtype object
+
+Quando a coluna tem uma mistura de tipos que não dá para vetorizar sem
+mudar o resultado, só as células afetadas caem no conversor escalar.
+"""
+import re
+import math
+import datetime as _dt
+from decimal import Decimal
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as _np
+import pandas as pd
+
+_INT_TYPE_RE = re.compile(r"\bU?Int(8|16|32|64)\b")
+_INT_STR_RE = re.compile(r"^[-+]?\d+([.,]\d+)?$")
+_NULL_STRINGS = ("nan", "none", "<na>", "null")
+
+NUMPY_INT_DTYPES = {
+    "Int8": _np.int8, "Int16": _np.int16, "Int32": _np.int32, "Int64": _np.int64,
+    "UInt8": _np.uint8, "UInt16": _np.uint16, "UInt32": _np.uint32, "UInt64": _np.uint64,
+}
+
+
+# ---------- tipos ----------
+# parsing memoizado: os mesmos tipos se repetem em todo insert
+@lru_cache(maxsize=4096)
+def strip_wrappers(tp: str) -> tuple[str, bool]:
+    """
+    Remove LowCardinality(...) e Nullable(...) em LOOP (pode vir aninhado).
+    Retorna (base_type, is_nullable).
+    Ex:
+    Nullable(Int32) -> ("Int32", True)
+    LowCardinality(Nullable(Int32)) -> ("Int32", True)
+    Nullable(LowCardinality(Int32)) -> ("Int32", True)
+    """
+    t = tp.strip()
+    nullable = False
+
+    while True:
+        m = re.match(r"LowCardinality\((.+)\)$", t)
+        if m:
+            t = m.group(1).strip()
+            continue
+
+        m = re.match(r"Nullable\((.+)\)$", t)
+        if m:
+            nullable = True
+            t = m.group(1).strip()
+            continue
+
+        break
+
+    return t, nullable
+
+
+@lru_cache(maxsize=256)
+def int_bounds(base_type: str) -> tuple[int, int]:
+    """Retorna (min, max) de um tipo Int/UInt do ClickHouse."""
+    unsigned = base_type.startswith("UInt")
+    bits = int(re.findall(r"\d+", base_type)[0])
+    if unsigned:
+        return 0, (2**bits) - 1
+    return -(2 ** (bits - 1)), (2 ** (bits - 1)) - 1
+
+
+@lru_cache(maxsize=4096)
+def column_family(base_tp: str) -> str:
+    """
+    Classifica um tipo base (sem wrappers) na família usada pelo coerce.
+    Retorna "datetime", "date", "string", "decimal", "uuid", "float", "other"
+    ou o próprio tipo inteiro ("Int32", "UInt16", ...).
+    A ordem dos testes é a mesma do `insert_df_in_batches_v4`.
+    """
+    if base_tp.startswith("DateTime"):
+        return "datetime"
+    if base_tp in ("Date", "Date32"):
+        return "date"
+    if "String" in base_tp or base_tp.startswith("FixedString"):
+        return "string"
+    if base_tp.startswith("Decimal"):
+        return "decimal"
+    if base_tp == "UUID":
+        return "uuid"
+    m_int = _INT_TYPE_RE.search(base_tp)
+    if m_int:
+        return m_int.group(0)
+    if base_tp.startswith("Float"):
+        return "float"
+    return "other"
+
+
+class ColumnSpec(NamedTuple):
+    """Tipo de uma coluna do DESCRIBE TABLE já decomposto."""
+    name: str
+    type: str
+    base_type: str
+    nullable: bool
+    low_cardinality: bool
+    family: str
+    bounds: tuple[int, int] | None
+
+
+def parse_column(name: str, tp: str) -> ColumnSpec:
+    """Decompõe o tipo de uma coluna (wrappers, família e limites de Int/UInt)."""
+    base_tp, nullable = strip_wrappers(tp)
+    family = column_family(base_tp)
+    return ColumnSpec(
+        name=name,
+        type=tp,
+        base_type=base_tp,
+        nullable=nullable,
+        low_cardinality="LowCardinality(" in tp,
+        family=family,
+        bounds=int_bounds(family) if family in NUMPY_INT_DTYPES else None,
+    )
+
+
+# ---------- conversores escalares (fallback exato) ----------
+def _coerce_int_scalar(v, base_type: str, nullable: bool):
+    unsigned = base_type.startswith("UInt")
+    default = 0 if unsigned else -1
+
+    # None / NaN / pd.NA
+    if v is None:
+        return None if nullable else default
+    try:
+        if pd.isna(v):
+            return None if nullable else default
+    except Exception:
+        pass
+
+    # bool
+    if isinstance(v, bool):
+        iv = int(v)
+
+    # python/numpy ints
+    elif isinstance(v, (int, _np.integer)):
+        iv = int(v)
+
+    # float / numpy float / Decimal
+    elif isinstance(v, (float, _np.floating, Decimal)):
+        fv = float(v)
+        if math.isnan(fv) or not fv.is_integer():
+            return None if nullable else default
+        iv = int(fv)
+
+    else:
+        s = str(v).strip()
+        if s == "" or s.lower() in _NULL_STRINGS:
+            return None if nullable else default
+        s2 = s.replace(",", ".")
+        if not _INT_STR_RE.match(s2):
+            return None if nullable else default
+        try:
+            fv = float(s2)
+        except Exception:
+            return None if nullable else default
+        if not fv.is_integer():
+            return None if nullable else default
+        iv = int(fv)
+
+    if unsigned and iv < 0:
+        return None if nullable else default
+
+    mn, mx = int_bounds(base_type)
+    if iv < mn or iv > mx:
+        return None if nullable else default
+
+    return iv  # PYTHON INT PURO
+
+
+def _coerce_float_scalar(v):
+    try:
+        fv = float(v)
+    except Exception:
+        return None
+    return None if math.isnan(fv) else fv
+
+
+def _coerce_datetime_scalar(v):
+    ts = pd.to_datetime(v, errors="coerce", utc=False)
+    if pd.isna(ts):
+        return None
+    if isinstance(ts, pd.Timestamp):
+        if ts.tzinfo is not None:
+            ts = ts.tz_convert(None)
+        return ts.to_pydatetime()
+    if isinstance(ts, _dt.datetime):
+        return ts.replace(tzinfo=None)
+    return None
+
+
+def _coerce_str_scalar(v, datetime_strfmt: str):
+    if isinstance(v, (pd.Timestamp, _dt.datetime)):
+        return v.strftime(datetime_strfmt)
+    if isinstance(v, _dt.date):
+        return v.strftime("%Y-%m-%d")
+    return str(v)
+
+
+def _coerce_decimal_scalar(v):
+    try:
+        d = Decimal(str(v))
+    except Exception:
+        try:
+            return _coerce_float_scalar(v)
+        except Exception:
+            return None
+    return None if d.is_nan() else d
+
+
+def _clean_scalar(v):
+    # numpy scalars -> python nativo (inclusive np.int64, np.float64)
+    if isinstance(v, _np.generic):
+        v = v.item()
+    # pandas Timestamp -> datetime python tz-naive
+    if isinstance(v, pd.Timestamp):
+        try:
+            if v.tzinfo is not None:
+                v = v.tz_convert(None)
+            return v.to_pydatetime()
+        except Exception:
+            return None
+    return v
+
+
+# ---------- helpers ----------
+def _null_mask(s: pd.Series) -> _np.ndarray:
+    return s.isna().to_numpy(dtype=bool)
+
+
+def _object_values(s: pd.Series) -> _np.ndarray:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # to_numpy com NaN converteria categorias inteiras para float (1 -> 1.0)
+        return s.astype(object).to_numpy()
+    return s.to_numpy(dtype=object)
+
+
+def _infer(values: _np.ndarray) -> str:
+    return pd.api.types.infer_dtype(values, skipna=True)
+
+
+def _is_plain_numeric(dtype) -> bool:
+    return (
+        pd.api.types.is_numeric_dtype(dtype)
+        and not pd.api.types.is_bool_dtype(dtype)
+        and not isinstance(dtype, pd.CategoricalDtype)
+    )
+
+
+def _new_out(n: int, fill=None) -> _np.ndarray:
+    out = _np.empty(n, dtype=object)
+    out[:] = fill
+    return out
+
+
+def _as_series(out: _np.ndarray, s: pd.Series) -> pd.Series:
+    return pd.Series(out, index=s.index, dtype=object, name=s.name)
+
+
+def _map_valid(out: _np.ndarray, values: _np.ndarray, valid: _np.ndarray, fn) -> None:
+    """Aplica `fn` célula a célula só nas posições `valid` (caminho de fallback)."""
+    idx = _np.flatnonzero(valid)
+    if len(idx):
+        out[idx] = _object_list([fn(v) for v in values[idx]])
+
+
+def _object_list(items: list) -> _np.ndarray:
+    # np.array(list) tentaria criar dimensões extras com listas/tuplas
+    arr = _np.empty(len(items), dtype=object)
+    for i, v in enumerate(items):
+        arr[i] = v
+    return arr
+
+
+# ---------- Int/UInt ----------
+def _int_range_mask(arr: _np.ndarray, mn: int, mx: int) -> _np.ndarray:
+    info = _np.iinfo(arr.dtype)
+    return (arr >= max(mn, info.min)) & (arr <= min(mx, info.max))
+
+
+def _float_int_mask(f: _np.ndarray, mn: int, mx: int) -> _np.ndarray:
+    # mx + 1 é potência de 2 (exata em float64): evita aceitar 2**63 para Int64
+    with _np.errstate(invalid="ignore"):
+        return _np.isfinite(f) & (f == _np.floor(f)) & (f >= mn) & (f < mx + 1)
+
+
+def _put_ints(out: _np.ndarray, pos: _np.ndarray, arr: _np.ndarray, int_tp: str) -> None:
+    if len(pos):
+        target = _np.uint64 if int_tp == "UInt64" else _np.int64
+        out[pos] = arr.astype(target).astype(object)
+
+
+def coerce_int_series(s: pd.Series, int_tp: str, nullable: bool) -> pd.Series:
+    """Int/UInt: range-check com máscaras; inválido/nulo -> None ou default."""
+    default = None if nullable else (0 if int_tp.startswith("UInt") else -1)
+    mn, mx = int_bounds(int_tp)
+    n = len(s)
+    out = _new_out(n, default)
+    na = _null_mask(s)
+    valid = ~na
+    dtype = s.dtype
+
+    if pd.api.types.is_bool_dtype(dtype):
+        arr = s.fillna(False).to_numpy(dtype=_np.int64)
+        _put_ints(out, _np.flatnonzero(valid), arr[valid], int_tp)
+        return _as_series(out, s)
+
+    if _is_plain_numeric(dtype):
+        if pd.api.types.is_integer_dtype(dtype):
+            target = _np.uint64 if pd.api.types.is_unsigned_integer_dtype(dtype) else _np.int64
+            arr = s.to_numpy(dtype=target, na_value=0)
+            ok = valid & _int_range_mask(arr, mn, mx)
+        else:
+            arr = s.to_numpy(dtype=_np.float64, na_value=_np.nan)
+            ok = valid & _float_int_mask(arr, mn, mx)
+        _put_ints(out, _np.flatnonzero(ok), arr[ok], int_tp)
+        return _as_series(out, s)
+
+    values = _object_values(s)
+    kind = _infer(values[valid])
+
+    if kind == "empty":
+        return _as_series(out, s)
+
+    if kind == "integer":
+        try:
+            arr = _np.asarray(values[valid], dtype=_np.int64)
+        except OverflowError:
+            arr = None
+        if arr is not None:
+            ok = _int_range_mask(arr, mn, mx)
+            _put_ints(out, _np.flatnonzero(valid)[ok], arr[ok], int_tp)
+            return _as_series(out, s)
+
+    elif kind in ("floating", "decimal"):
+        arr = _np.asarray(values[valid], dtype=_np.float64)
+        ok = _float_int_mask(arr, mn, mx)
+        _put_ints(out, _np.flatnonzero(valid)[ok], arr[ok], int_tp)
+        return _as_series(out, s)
+
+    elif kind == "string":
+        st = pd.Series(values[valid], dtype=object).str.strip()
+        is_null_str = (st == "") | st.str.lower().isin(_NULL_STRINGS)
+        s2 = st.str.replace(",", ".", regex=False)
+        matched = (s2.str.match(_INT_STR_RE) & ~is_null_str).to_numpy(dtype=bool)
+        arr = s2[matched].to_numpy(dtype=_np.float64)
+        ok = _float_int_mask(arr, mn, mx)
+        pos = _np.flatnonzero(valid)[matched][ok]
+        _put_ints(out, pos, arr[ok], int_tp)
+        return _as_series(out, s)
+
+    # misto (ex.: str + int, bool + str): conversor escalar só nos não-nulos
+    _map_valid(out, values, valid, lambda v: _coerce_int_scalar(v, int_tp, nullable))
+    return _as_series(out, s)
+
+
+# ---------- Float ----------
+def _put_floats(out: _np.ndarray, pos: _np.ndarray, arr: _np.ndarray) -> None:
+    keep = ~_np.isnan(arr)
+    if keep.any():
+        out[pos[keep]] = arr[keep].astype(object)
+
+
+def coerce_float_series(s: pd.Series) -> pd.Series:
+    """Float: float(v) vetorizado; inválido/NaN/nulo -> None."""
+    out = _new_out(len(s))
+    na = _null_mask(s)
+    valid = ~na
+
+    if _is_plain_numeric(s.dtype) or pd.api.types.is_bool_dtype(s.dtype):
+        arr = s.to_numpy(dtype=_np.float64, na_value=_np.nan)
+        _put_floats(out, _np.arange(len(s)), arr)
+        return _as_series(out, s)
+
+    values = _object_values(s)
+    pos = _np.flatnonzero(valid)
+    if _infer(values[valid]) in ("empty", "floating", "integer", "mixed-integer-float",
+                                 "decimal", "boolean", "string"):
+        try:
+            arr = _np.asarray(values[valid], dtype=_np.float64)
+        except (TypeError, ValueError, OverflowError):
+            arr = None
+        if arr is not None:
+            _put_floats(out, pos, arr)
+            return _as_series(out, s)
+
+    _map_valid(out, values, valid, _coerce_float_scalar)
+    return _as_series(out, s)
+
+
+# ---------- DateTime / Date ----------
+def _naive_datetimes(s: pd.Series) -> tuple[pd.Series, dict]:
+    """
+    Converte a coluna para datetime64 tz-naive (tz-aware -> UTC, igual ao
+    `tz_convert(None)` por célula). Retorna (série datetime64, reparos), onde
+    `reparos` guarda {posição: datetime} das células que o caminho vetorizado
+    não conseguiu converter e o conversor escalar conseguiu.
+    """
+    na = _null_mask(s)
+
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        ts = s
+        if ts.dt.tz is not None:
+            ts = ts.dt.tz_convert(None)
+        return ts.reset_index(drop=True), {}
+
+    values = _object_values(s)
+    kind = _infer(values[~na])
+    ts = None
+    if kind in ("string", "datetime", "datetime64", "date", "empty"):
+        try:
+            ts = pd.to_datetime(
+                pd.Series(values, dtype=object), errors="coerce", utc=True, format="mixed"
+            ).dt.tz_convert(None)
+        except Exception:
+            ts = None
+    if ts is None:
+        ts = pd.Series(pd.NaT, index=range(len(s)), dtype="datetime64[ns]")
+
+    # células não-nulas que viraram NaT: tenta o conversor escalar (exato)
+    repairs = {}
+    for pos in _np.flatnonzero(~na & ts.isna().to_numpy(dtype=bool)):
+        dtv = _coerce_datetime_scalar(values[pos])
+        if dtv is not None:
+            repairs[int(pos)] = dtv
+    return ts, repairs
+
+
+def coerce_datetime_series(s: pd.Series) -> pd.Series:
+    """DateTime: parse vetorizado (sem pd.to_datetime por célula) -> datetime | None."""
+    ts, repairs = _naive_datetimes(s)
+    out = _new_out(len(s))
+    ok = ts.notna().to_numpy(dtype=bool)
+    if ok.any():
+        out[ok] = ts[ok].dt.to_pydatetime().to_numpy(dtype=object)
+    for pos, dtv in repairs.items():
+        out[pos] = dtv
+    return _as_series(out, s)
+
+
+def coerce_date_series(s: pd.Series) -> pd.Series:
+    """Date: mesmo parse do DateTime, truncado para date | None."""
+    ts, repairs = _naive_datetimes(s)
+    out = _new_out(len(s))
+    ok = ts.notna().to_numpy(dtype=bool)
+    if ok.any():
+        out[ok] = ts[ok].dt.date.to_numpy(dtype=object)
+    for pos, dtv in repairs.items():
+        out[pos] = dtv.date()
+    return _as_series(out, s)
+
+
+# ---------- String ----------
+def coerce_str_series(s: pd.Series, datetime_strfmt: str = "%Y-%m-%d %H:%M:%S") -> pd.Series:
+    """String/FixedString: str(v); Timestamp/datetime via `datetime_strfmt`, date 'YYYY-MM-DD'."""
+    out = _new_out(len(s))
+    na = _null_mask(s)
+    valid = ~na
+    pos = _np.flatnonzero(valid)
+
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        if len(pos):
+            out[pos] = s[valid].dt.strftime(datetime_strfmt).to_numpy(dtype=object)
+        return _as_series(out, s)
+
+    values = _object_values(s)
+    kind = _infer(values[valid])
+    if kind == "string":
+        out[pos] = values[valid]
+    elif kind in ("datetime", "datetime64", "date", "mixed"):
+        _map_valid(out, values, valid, lambda v: _coerce_str_scalar(v, datetime_strfmt))
+    elif len(pos):
+        out[pos] = _object_list(list(map(str, values[valid])))
+    return _as_series(out, s)
+
+
+# ---------- Decimal / UUID / demais ----------
+def coerce_decimal_series(s: pd.Series) -> pd.Series:
+    """Decimal: Decimal(str(v)) (fallback float) só nas células não-nulas."""
+    out = _new_out(len(s))
+    values = _object_values(s)
+    _map_valid(out, values, ~_null_mask(s), _coerce_decimal_scalar)
+    return _as_series(out, s)
+
+
+def coerce_uuid_series(s: pd.Series) -> pd.Series:
+    """UUID: str(v) | None."""
+    out = _new_out(len(s))
+    valid = ~_null_mask(s)
+    values = _object_values(s)
+    pos = _np.flatnonzero(valid)
+    if _infer(values[valid]) == "string":
+        out[pos] = values[valid]
+    elif len(pos):
+        out[pos] = _object_list(list(map(str, values[valid])))
+    return _as_series(out, s)
+
+
+def coerce_other_series(s: pd.Series) -> pd.Series:
+    """Tipos sem coerção específica: só normaliza nulos, numpy scalars e Timestamps."""
+    out = _new_out(len(s))
+    valid = ~_null_mask(s)
+    pos = _np.flatnonzero(valid)
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        ts = s.dt.tz_convert(None) if s.dt.tz is not None else s
+        if len(pos):
+            out[pos] = ts[valid].dt.to_pydatetime().to_numpy(dtype=object)
+    elif _is_plain_numeric(s.dtype) or pd.api.types.is_bool_dtype(s.dtype):
+        out[pos] = s[valid].to_numpy().astype(object)
+    else:
+        _map_valid(out, _object_values(s), valid, _clean_scalar)
+    return _as_series(out, s)
+
+
+# ---------- entrada principal ----------
+def coerce_series(
+    s: pd.Series,
+    ch_type: str,
+    datetime_strfmt: str = "%Y-%m-%d %H:%M:%S",
+) -> pd.Series:
+    """
+    Converte uma coluna para o tipo do ClickHouse informado (string do DESCRIBE TABLE).
+    Retorna Series dtype object com tipos Python nativos ou None.
+    """
+    base_tp, nullable = strip_wrappers(ch_type)
+    family = column_family(base_tp)
+
+    if family == "datetime":
+        return coerce_datetime_series(s)
+    if family == "date":
+        return coerce_date_series(s)
+    if family == "string":
+        return coerce_str_series(s, datetime_strfmt)
+    if family == "decimal":
+        return coerce_decimal_series(s)
+    if family == "uuid":
+        return coerce_uuid_series(s)
+    if family == "float":
+        return coerce_float_series(s)
+    if family in NUMPY_INT_DTYPES:
+        return coerce_int_series(s, family, nullable)
+    return coerce_other_series(s)
+
+
+# ---------- leitura (resultado do ClickHouse -> pandas) ----------
+def _is_composite(tp: str) -> bool:
+    return tp.startswith(("Array(", "Map(", "Tuple(", "Nested("))
+
+
+def result_series(values, ch_type: str, name=None) -> pd.Series:
+    """
+    Converte uma coluna retornada com `columnar=True` (tupla, ou ndarray com
+    use_numpy) para uma Series com dtype pandas adequado ao tipo do ClickHouse:
+
+    - Int/UInt -> dtype NumPy; Nullable(Int/UInt) -> Int64/UInt8/... (pd.NA)
+    - Float -> float32/float64 (nulos viram NaN)
+    - DateTime/DateTime64/Date/Date32 -> datetime64 (nulos viram NaT)
+    - LowCardinality(...) e Enum -> category
+    - Bool -> bool; Nullable(Bool) -> boolean
+    - demais (String, Decimal, UUID, Array, ...) -> inferência padrão do pandas
+    """
+    tp = ch_type.strip()
+    base_tp, nullable = strip_wrappers(tp)
+
+    if _is_composite(base_tp):
+        return pd.Series(
+            values if isinstance(values, _np.ndarray) else _object_list(list(values)),
+            dtype=object, name=name,
+        )
+    if tp.startswith("LowCardinality(") or base_tp.startswith("Enum"):
+        return pd.Series(values, dtype="category", name=name)
+
+    family = column_family(base_tp)
+    if family in NUMPY_INT_DTYPES:
+        if nullable:
+            obj = _np.asarray(values, dtype=object)
+            mask = pd.isna(obj)
+            obj[mask] = 0
+            arr = pd.arrays.IntegerArray(obj.astype(NUMPY_INT_DTYPES[family]), mask)
+            return pd.Series(arr, name=name)
+        return pd.Series(_np.asarray(values, dtype=NUMPY_INT_DTYPES[family]), name=name)
+    if family == "float":
+        dtype = _np.float32 if base_tp == "Float32" else _np.float64
+        # None -> NaN na conversão para float
+        return pd.Series(_np.asarray(values, dtype=dtype), name=name)
+    if family in ("datetime", "date"):
+        return pd.Series(pd.to_datetime(values, cache=False), name=name)
+    if base_tp == "Bool":
+        return pd.Series(pd.array(values, dtype="boolean" if nullable else bool), name=name)
+    return pd.Series(values, name=name)
+
+
+def result_frame(columns, columns_info) -> pd.DataFrame:
+    """
+    Monta um DataFrame a partir do resultado de `execute(..., columnar=True,
+    with_column_types=True)`: `columns` é uma sequência por coluna e
+    `columns_info` é [(nome, tipo), ...].
+    """
+    if not columns:
+        columns = [() for _ in columns_info]
+    data = {
+        i: result_series(values, ch_type)
+        for i, (values, (_, ch_type)) in enumerate(zip(columns, columns_info))
+    }
+    df = pd.DataFrame(data, copy=False)
+    df.columns = [col[0] for col in columns_info]
+    return df
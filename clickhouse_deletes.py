@@ -0,0 +1,126 @@
+"""
+Planejador de exclusões do ClickhouseSync.
+
+`DELETE FROM ... WHERE` é uma mutação: em tabelas MergeTree grandes marca
+(lightweight delete) ou reescreve (ALTER DELETE) as partes afetadas. Quando a
+condição cobre partições inteiras ou a tabela toda, há caminhos bem mais
+baratos. A partir de:
+
+- `system.tables`: engine, chave de partição e total de linhas
+- `system.parts` (partes ativas): linhas e partes por partição
+- `SELECT _partition_id, count(), uniqExact(_part) ... WHERE <condição>`
+
+o plano escolhe, nesta ordem:
+
+1. nada a fazer, se nenhuma linha casa
+2. `TRUNCATE TABLE`, se a condição cobre a tabela inteira
+3. `ALTER TABLE ... DROP PARTITION ID`, para partições cobertas por inteiro
+   (2 e 3 só com `allow_drop_partition=True`)
+4. para o restante: lightweight `DELETE FROM` quando a fração das linhas das
+   partições afetadas é pequena (< `heavy_fraction`), senão `ALTER TABLE ...
+   DELETE`, que reescreve as partes de uma vez em vez de deixar máscaras
+
+Engines fora da família MergeTree não têm partições nem lightweight delete:
+usam TRUNCATE ou ALTER DELETE.
+"""
+from typing import NamedTuple
+
+
+class DeletePlan(NamedTuple):
+    strategy: str            # ex.: "drop_partition+lightweight_delete"
+    statements: list         # comandos SQL, na ordem de execução
+    rows: int                # linhas estimadas a remover
+    parts: int               # partes ativas afetadas
+    partitions: list         # partition_id removidos por DROP PARTITION
+    total_rows: int          # linhas da tabela no planejamento
+    fraction: float          # fração das linhas das partições parciais a remover
+
+    def describe(self) -> str:
+        if self.strategy == "noop":
+            return "nenhuma linha a remover"
+        text = f"{self.strategy}: ~{self.rows} linha(s) de {self.total_rows}, {self.parts} parte(s)"
+        if self.partitions:
+            text += f", {len(self.partitions)} partição(ões) removida(s) inteira(s)"
+        return text
+
+
+def build_delete_plan(
+    db_name: str,
+    table_name: str,
+    where: str | None,
+    engine: str,
+    total_rows: int,
+    partitions: dict,
+    matches: dict,
+    heavy_fraction: float = 0.3,
+    allow_drop_partition: bool = True,
+) -> DeletePlan:
+    """
+    Monta o plano a partir das estatísticas já consultadas.
+
+    Args
+    ----
+    where : str | None
+        Condição SQL; None = apagar tudo.
+    partitions : dict
+        {partition_id: (linhas, partes ativas)} de system.parts.
+    matches : dict
+        {partition_id: (linhas que casam, partes com linhas que casam)}.
+    heavy_fraction : float
+        A partir desta fração de linhas removidas nas partições afetadas usa
+        ALTER DELETE em vez de lightweight delete.
+    allow_drop_partition : bool
+        Se False, nunca usa DROP PARTITION nem troca uma condição que casa
+        com tudo por TRUNCATE: as contagens do planejamento não cobrem linhas
+        inseridas durante a exclusão, e essas linhas seriam apagadas junto.
+        Sem condição (`where=None`) o TRUNCATE continua valendo.
+    """
+    table = f"{db_name}.{table_name}"
+    all_parts = sum(p for _, p in partitions.values())
+    mergetree = "MergeTree" in (engine or "")
+
+    if where is None:
+        return DeletePlan("truncate", [f"TRUNCATE TABLE {table}"], total_rows, all_parts, [], total_rows, 1.0)
+
+    matched = sum(r for r, _ in matches.values())
+    touched_parts = sum(p for _, p in matches.values())
+    if matched == 0:
+        return DeletePlan("noop", [], 0, 0, [], total_rows, 0.0)
+
+    if not mergetree:
+        if allow_drop_partition and matched >= total_rows:
+            return DeletePlan("truncate", [f"TRUNCATE TABLE {table}"], matched, touched_parts, [], total_rows, 1.0)
+        return DeletePlan(
+            "alter_delete", [f"ALTER TABLE {table} DELETE WHERE {where}"],
+            matched, touched_parts, [], total_rows, matched / max(total_rows, 1),
+        )
+
+    # partições em que todas as linhas casam com a condição
+    full = [
+        pid for pid, (rows, _) in matches.items()
+        if pid in partitions and rows >= partitions[pid][0]
+    ]
+    if not allow_drop_partition:
+        full = []
+    if full and set(full) == set(partitions) and matched >= total_rows:
+        return DeletePlan("truncate", [f"TRUNCATE TABLE {table}"], matched, all_parts, [], total_rows, 1.0)
+
+    statements = [f"ALTER TABLE {table} DROP PARTITION ID '{pid}'" for pid in full]
+    strategies = ["drop_partition"] if full else []
+    parts = sum(partitions[pid][1] for pid in full)
+
+    rest = {pid: m for pid, m in matches.items() if pid not in full}
+    fraction = 0.0
+    if rest:
+        rest_rows = sum(r for r, _ in rest.values())
+        rest_total = sum(partitions.get(pid, (rows, 0))[0] for pid, (rows, _) in rest.items())
+        fraction = rest_rows / max(rest_total, 1)
+        parts += sum(p for _, p in rest.values())
+        if fraction >= heavy_fraction:
+            strategies.append("alter_delete")
+            statements.append(f"ALTER TABLE {table} DELETE WHERE {where}")
+        else:
+            strategies.append("lightweight_delete")
+            statements.append(f"DELETE FROM {table} WHERE {where}")
+
+    return DeletePlan("+".join(strategies), statements, matched, parts, full, total_rows, fraction)
@@ -0,0 +1,106 @@
+"""
+Detecção de mudanças por hash de linha para o ClickhouseSync.
+
+Cada linha recebe um hash de 64 bits calculado de forma vetorizada com
+`pd.util.hash_pandas_object` (sem loop Python). O hash é gravado numa coluna
+da tabela (padrão `_row_hash UInt64`); na carga seguinte os pares
+(chave, hash) já gravados são lidos numa única query e só as linhas novas ou
+com hash diferente são inseridas.
+
+Para o hash não depender de detalhes de leitura, as colunas passam por
+`canonical_frame` antes:
+
+- ordem das colunas por nome
+- datetime64 de qualquer unidade/fuso -> ns em UTC; datetime.date/datetime em
+  colunas object -> datetime64
+- inteiros com sinal (Int8..Int64, numpy ou nullable) -> Int64 e sem sinal
+  -> UInt64: o pandas faz o hash na largura do dtype, e -1 em int32 (o que o
+  ClickHouse devolve para Int32) teria hash diferente de -1 em int64
+- categorias, StringDtype e object texto dão o mesmo hash (comportamento do
+  pandas)
+- listas/dicts (Array/Map) são convertidos para texto
+
+Floats e inteiros têm hashes diferentes: uma coluna inteira que às vezes vem
+como float (por causa de NaN) deve ser convertida para Int64 antes.
+"""
+import datetime as _dt
+
+import numpy as _np
+import pandas as pd
+
+HASH_COLUMN = "_row_hash"
+
+
+def _canonical_series(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(series.dtype):
+        # int64/uint64 numpy já têm o mesmo hash de Int64/UInt64
+        if series.dtype in (_np.int64, _np.uint64):
+            return series
+        if pd.api.types.is_unsigned_integer_dtype(series.dtype):
+            return series.astype("UInt64")
+        return series.astype("Int64")
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        return series.dt.tz_convert("UTC").dt.tz_localize(None).astype("datetime64[ns]")
+    if pd.api.types.is_datetime64_dtype(series.dtype):
+        return series.astype("datetime64[ns]")
+    if series.dtype == object:
+        sample = series.dropna()
+        first = sample.iloc[0] if len(sample) else None
+        if isinstance(first, (_dt.date, _dt.datetime, pd.Timestamp)):
+            return pd.to_datetime(series).astype("datetime64[ns]")
+        if isinstance(first, (list, tuple, dict, set, _np.ndarray)):
+            return series.map(lambda v: None if v is None else str(v))
+    return series
+
+
+def canonical_frame(df: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """Colunas (em ordem de nome) normalizadas para o hash."""
+    columns = sorted(columns if columns is not None else df.columns)
+    return pd.DataFrame({c: _canonical_series(df[c]) for c in columns}, index=df.index)
+
+
+def row_hashes(df: pd.DataFrame, columns=None) -> _np.ndarray:
+    """Hash uint64 por linha sobre `columns` (padrão: todas)."""
+    frame = canonical_frame(df, columns)
+    if not len(frame.columns):
+        return _np.zeros(len(df), dtype=_np.uint64)
+    try:
+        hashes = pd.util.hash_pandas_object(frame, index=False)
+    except TypeError:
+        hashes = pd.util.hash_pandas_object(frame.astype(str), index=False)
+    return hashes.to_numpy(dtype=_np.uint64, copy=True)
+
+
+def split_changes(
+    key_hashes: _np.ndarray,
+    hashes: _np.ndarray,
+    stored_key_hashes: _np.ndarray,
+    stored_hashes: _np.ndarray,
+    latest_only: bool = True,
+) -> tuple[_np.ndarray, _np.ndarray]:
+    """
+    Compara os hashes da carga com os gravados.
+
+    Com `latest_only` (tabelas com versão) cada chave vale pelo último hash
+    gravado. Sem ele (append-only, versões antigas continuam na tabela) a
+    linha não mudou se o par (chave, hash) existe em qualquer linha gravada.
+
+    Returns
+    -------
+    (new, changed) : máscaras booleanas sobre as linhas da carga: chave
+    ausente na tabela / chave presente com hash diferente.
+    """
+    if not latest_only:
+        new = ~pd.Index(key_hashes).isin(stored_key_hashes)
+        pairs = pd.MultiIndex.from_arrays([key_hashes, hashes])
+        seen = pairs.isin(pd.MultiIndex.from_arrays([stored_key_hashes, stored_hashes]))
+        return new, ~new & ~seen
+
+    stored = pd.Series(stored_hashes, index=stored_key_hashes)
+    # a mesma chave pode aparecer mais de uma vez (versões ainda não mescladas)
+    stored = stored[~stored.index.duplicated(keep="last")]
+    positions = stored.index.get_indexer(key_hashes)
+    new = positions < 0
+    current = stored.to_numpy()[_np.where(new, 0, positions)] if len(stored) else hashes
+    changed = ~new & (current != hashes)
+    return new, changed
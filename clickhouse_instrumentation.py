@@ -0,0 +1,672 @@
+"""
+Instrumentação das chamadas do ClickhouseSync.
+
+Cada método público do ClickhouseSync vira um `CallEvent` com:
+
+- latência da chamada e o tempo gasto em cada fase: `coercion` (conversão dos
+  dados para o insert) e `network` (tempo dentro do driver: serialização,
+  envio e espera pelo servidor); o resto fica em `other`. No insert paralelo
+  as fases somam o tempo de todas as threads e podem passar da duração
+- linhas enviadas (INSERT) e recebidas (SELECT), lotes (INSERTs com dados) e
+  queries executadas
+- estatísticas do servidor somadas de `client.last_query` (profile_info e
+  progress): linhas/bytes lidos e gravados, blocos, tempo da query
+
+Chamadas aninhadas (ex.: `upsert_df` -> `insert_df_in_batches_v4`) viram
+eventos filhos; os números do filho também entram no pai. Ao fim de cada
+chamada o evento vai para os sinks configurados:
+
+    metrics = MetricsRegistry()
+    ch = ClickhouseSync(..., instrumentation=Instrumentation([LoggingSink(), metrics]))
+    ch.insert_df_in_batches_v4("bi", "vendas", df)
+    print(metrics.render())         # formato texto do Prometheus
+
+- `LoggingSink`: uma linha JSON por chamada no logging
+- `MetricsRegistry`: contadores e histograma de latência no estilo Prometheus
+- `SpanSink`: spans de um Tracer do OpenTelemetry, ou um callback que recebe
+  cada span como dict (nomes de atributos do OpenTelemetry)
+
+Qualquer objeto com `emit(event)` (e opcionalmente `start(event)`) serve de
+sink. Sem sinks nada é medido. Um sink que falha não interrompe a chamada.
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+# estatísticas do servidor somadas de last_query (nome -> (objeto, atributo))
+_SERVER_STATS = {
+    "read_rows": ("progress", "rows"),
+    "read_bytes": ("progress", "bytes"),
+    "total_rows_to_read": ("progress", "total_rows"),
+    "written_rows": ("progress", "written_rows"),
+    "written_bytes": ("progress", "written_bytes"),
+    "result_rows": ("profile_info", "rows"),
+    "result_bytes": ("profile_info", "bytes"),
+    "result_blocks": ("profile_info", "blocks"),
+}
+
+# argumentos copiados para os atributos do evento
+_ARGUMENT_ATTRIBUTES = ("db_name", "table_name", "view_name")
+_STATEMENT_ARGUMENTS = ("query", "select_query", "command")
+
+
+class CallEvent:
+    """Medições de uma chamada (inclui as chamadas aninhadas)."""
+
+    def __init__(self, method: str, attributes: dict, parent=None):
+        self.method = method
+        self.attributes = attributes
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.start_time = time.time()
+        self._t0 = time.perf_counter()
+        self.duration = 0.0
+        self.rows_sent = 0
+        self.rows_received = 0
+        self.bytes_sent = 0          # progress.written_bytes (descomprimido, no servidor)
+        self.bytes_received = 0      # profile_info.bytes do resultado
+        self.batches = 0
+        self.queries = 0
+        self.phases = {}             # {"coercion": s, "network": s}
+        self.server = {}             # somas de _SERVER_STATS + "elapsed"
+        self.error = None
+        self.exception = None
+
+    @property
+    def status(self) -> str:
+        return "error" if self.error else "ok"
+
+    @property
+    def end_time(self) -> float:
+        return self.start_time + self.duration
+
+    def phase_seconds(self) -> dict:
+        """Fases medidas mais `other` (duração que não caiu em nenhuma fase)."""
+        phases = dict(self.phases)
+        phases["other"] = max(self.duration - sum(self.phases.values()), 0.0)
+        return phases
+
+    def as_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "status": self.status,
+            "error": self.error,
+            "start_time": self.start_time,
+            "duration": round(self.duration, 6),
+            "attributes": self.attributes,
+            "rows_sent": self.rows_sent,
+            "rows_received": self.rows_received,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "batches": self.batches,
+            "queries": self.queries,
+            "phases": {k: round(v, 6) for k, v in self.phase_seconds().items()},
+            "server": self.server,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent.span_id if self.parent is not None else None,
+        }
+
+    def span_attributes(self) -> dict:
+        """Atributos com os nomes do OpenTelemetry (db.*) mais os contadores `clickhouse.*`."""
+        attrs = {"db.system": "clickhouse", "db.operation.name": self.method}
+        if self.attributes.get("db_name"):
+            attrs["db.namespace"] = self.attributes["db_name"]
+        if self.attributes.get("table_name"):
+            attrs["db.collection.name"] = self.attributes["table_name"]
+        if self.attributes.get("statement"):
+            attrs["db.query.text"] = self.attributes["statement"]
+        for key in ("rows_sent", "rows_received", "bytes_sent", "bytes_received", "batches", "queries"):
+            attrs[f"clickhouse.{key}"] = getattr(self, key)
+        if "df_rows" in self.attributes:
+            attrs["clickhouse.df_rows"] = self.attributes["df_rows"]
+        for phase, seconds in self.phase_seconds().items():
+            attrs[f"clickhouse.phase.{phase}_seconds"] = seconds
+        for key, value in self.server.items():
+            attrs[f"clickhouse.server.{key}"] = value
+        return attrs
+
+
+class Instrumentation:
+    """
+    Distribui os eventos das chamadas para os sinks.
+
+    A chamada em andamento é guardada por thread; `bind` a leva para funções
+    executadas em outras threads (ex.: lotes do insert paralelo).
+    """
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink) -> None:
+        self.sinks.remove(sink)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self):
+        """Evento da chamada em andamento na thread atual (ou None)."""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def active(self) -> bool:
+        return bool(self.sinks) and bool(self._stack())
+
+    # ---------- ciclo de vida do evento ----------
+    def begin(self, method: str, **attributes) -> CallEvent:
+        event = CallEvent(method, attributes, self.current())
+        self._notify("start", event)
+        return event
+
+    @contextmanager
+    def resume(self, event: CallEvent):
+        """Torna `event` a chamada atual da thread durante o bloco."""
+        stack = self._stack()
+        stack.append(event)
+        try:
+            yield event
+        finally:
+            stack.remove(event)
+
+    def finish(self, event: CallEvent, error: BaseException | None = None) -> None:
+        event.duration = time.perf_counter() - event._t0
+        if error is not None:
+            event.exception = error
+            event.error = f"{type(error).__name__}: {error}"
+        self._notify("emit", event)
+
+    @contextmanager
+    def call(self, method: str, **attributes):
+        """`with inst.call("metodo", db_name=...) as event:`; sem sinks, event é None."""
+        if not self.sinks:
+            yield None
+            return
+        event = self.begin(method, **attributes)
+        error = None
+        try:
+            with self.resume(event):
+                yield event
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.finish(event, error)
+
+    def _notify(self, hook: str, event: CallEvent) -> None:
+        for sink in list(self.sinks):
+            handler = getattr(sink, hook, None)
+            if handler is None:
+                continue
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"Erro no sink de instrumentação {type(sink).__name__}: {e}")
+
+    # ---------- medições ----------
+    def _add(self, events, phase=None, seconds=0.0, server=None, **counters) -> None:
+        with self._lock:
+            for event in events:
+                if phase is not None:
+                    event.phases[phase] = event.phases.get(phase, 0.0) + seconds
+                for key, value in counters.items():
+                    setattr(event, key, getattr(event, key) + value)
+                for key, value in (server or {}).items():
+                    event.server[key] = event.server.get(key, 0) + value
+
+    def add(self, **counters) -> None:
+        """Soma contadores (rows_sent=..., batches=...) na chamada atual e nas de fora."""
+        if self.active():
+            self._add(list(self._stack()), **counters)
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        """Soma `seconds` na fase `name` (para trechos longos demais para um `with`)."""
+        if self.active():
+            self._add(list(self._stack()), phase=name, seconds=seconds)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Soma o tempo do bloco na fase `name` da chamada atual."""
+        if not self.active():
+            yield
+            return
+        events = list(self._stack())
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(events, phase=name, seconds=time.perf_counter() - t0)
+
+    def record_query(self, seconds, sent_rows=0, received_rows=0, last_query=None, events=None) -> None:
+        """Registra uma query executada pelo driver (tempo de rede e last_query)."""
+        events = list(self._stack()) if events is None else events
+        if not events:
+            return
+        server = {}
+        bytes_sent = bytes_received = 0
+        if last_query is not None:
+            for key, (section, attr) in _SERVER_STATS.items():
+                value = getattr(getattr(last_query, section, None), attr, 0) or 0
+                if value:
+                    server[key] = int(value)
+            elapsed_ns = getattr(getattr(last_query, "progress", None), "elapsed_ns", 0) or 0
+            server["elapsed"] = elapsed_ns / 1e9 if elapsed_ns else float(getattr(last_query, "elapsed", 0) or 0)
+            bytes_sent = server.get("written_bytes", 0)
+            bytes_received = server.get("result_bytes", 0)
+        self._add(
+            events, phase="network", seconds=seconds, server=server,
+            queries=1, batches=1 if sent_rows else 0,
+            rows_sent=sent_rows, rows_received=received_rows,
+            bytes_sent=bytes_sent, bytes_received=bytes_received,
+        )
+
+    def bind(self, fn):
+        """`fn` executada em outra thread conta na chamada atual desta thread."""
+        stack = list(self._stack()) if self.sinks else []
+        if not stack:
+            return fn
+
+        @functools.wraps(fn)
+        def bound(*args, **kwargs):
+            local = self._stack()
+            saved = list(local)
+            local[:] = stack
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                local[:] = saved
+
+        return bound
+
+
+# ---------- client instrumentado ----------
+
+def _sent_rows(query, params, columnar) -> int:
+    if params is None or isinstance(params, dict) or not query.lstrip()[:6].upper() == "INSERT":
+        return 0
+    try:
+        if columnar:
+            return len(params[0]) if len(params) else 0
+        return len(params)
+    except TypeError:
+        return 0  # iterador: só o servidor sabe (server.written_rows)
+
+
+def _received_rows(result, with_column_types, columnar) -> int:
+    if not isinstance(result, (list, tuple)):
+        return 0
+    data = result[0] if with_column_types else result
+    if columnar:
+        return len(data[0]) if data else 0
+    return len(data)
+
+
+class InstrumentedClient:
+    """
+    Envolve um Client/PooledClient: `execute` e `execute_iter` contam como
+    fase `network` da chamada atual e somam linhas e `last_query`. Os demais
+    atributos são repassados ao client original.
+    """
+
+    def __init__(self, client, instrumentation: Instrumentation):
+        self.wrapped = client
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+    def __setattr__(self, name, value):
+        if name in ("wrapped", "instrumentation"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.wrapped, name, value)
+
+    def execute(self, query, params=None, *args, **kwargs):
+        if not self.instrumentation.active():
+            return self.wrapped.execute(query, params, *args, **kwargs)
+        result, ok = None, False
+        t0 = time.perf_counter()
+        try:
+            result = self.wrapped.execute(query, params, *args, **kwargs)
+            ok = True
+            return result
+        finally:
+            columnar = kwargs.get("columnar", False)
+            self.instrumentation.record_query(
+                time.perf_counter() - t0,
+                sent_rows=_sent_rows(query, params, columnar) if ok else 0,
+                received_rows=_received_rows(result, kwargs.get("with_column_types", False), columnar),
+                # após uma falha o last_query pode ser o da query anterior
+                last_query=getattr(self.wrapped, "last_query", None) if ok else None,
+            )
+
+    def execute_iter(self, query, *args, **kwargs):
+        rows = self.wrapped.execute_iter(query, *args, **kwargs)
+        if not self.instrumentation.active():
+            return rows
+        return self._iter(rows, list(self.instrumentation._stack()))
+
+    def _iter(self, rows, events):
+        seconds, count = 0.0, 0
+        iterator = iter(rows)
+        try:
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    row = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - t0
+                count += 1
+                yield row
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            self.instrumentation.record_query(
+                seconds, received_rows=count,
+                last_query=getattr(self.wrapped, "last_query", None), events=events,
+            )
+
+
+# ---------- métodos instrumentados ----------
+
+def _call_attributes(signature, args, kwargs) -> dict:
+    try:
+        bound = signature.bind_partial(*args, **kwargs).arguments
+    except TypeError:
+        return {}
+    attrs = {k: bound[k] for k in _ARGUMENT_ATTRIBUTES if isinstance(bound.get(k), str)}
+    for name in _STATEMENT_ARGUMENTS:
+        if isinstance(bound.get(name), str):
+            attrs["statement"] = bound[name][:1000]
+            break
+    if isinstance(bound.get("df"), pd.DataFrame):
+        attrs["df_rows"] = len(bound["df"])
+    return attrs
+
+
+def traced(fn, name: str | None = None):
+    """Envolve um método (ou gerador) em `self.instrumentation.call`."""
+    name = name or fn.__name__
+    signature = inspect.signature(fn)
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(self, *args, **kwargs):
+            inst = self.instrumentation
+            if not inst.enabled:
+                return (yield from fn(self, *args, **kwargs))
+            # o evento só é a chamada atual enquanto o gerador está rodando
+            event = inst.begin(name, **_call_attributes(signature, (self,) + args, kwargs))
+            gen = fn(self, *args, **kwargs)
+            error = None
+            try:
+                while True:
+                    with inst.resume(event):
+                        try:
+                            item = next(gen)
+                        except StopIteration as stop:
+                            return stop.value
+                    yield item
+            except GeneratorExit:
+                with inst.resume(event):
+                    gen.close()
+                raise
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                inst.finish(event, error)
+
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        inst = self.instrumentation
+        if not inst.enabled:
+            return fn(self, *args, **kwargs)
+        with inst.call(name, **_call_attributes(signature, (self,) + args, kwargs)):
+            return fn(self, *args, **kwargs)
+
+    return wrapper
+
+
+def instrument_methods(exclude=()):
+    """Decorator de classe: aplica `traced` a todos os métodos públicos, exceto `exclude`."""
+    def decorate(cls):
+        for attr, fn in list(vars(cls).items()):
+            if attr.startswith("_") or attr in exclude or not inspect.isfunction(fn):
+                continue
+            setattr(cls, attr, traced(fn))
+        return cls
+
+    return decorate
+
+
+# ---------- sinks ----------
+
+class LoggingSink:
+    """Uma linha JSON por chamada (`extra={"clickhouse_call": dict}` para handlers estruturados)."""
+
+    def __init__(self, logger=None, level=logging.INFO, nested_level=logging.DEBUG):
+        self.logger = logger or logging.getLogger("clickhouse_sync")
+        self.level = level
+        self.nested_level = nested_level  # chamadas aninhadas (ex.: describe_table dentro do insert)
+
+    def emit(self, event: CallEvent) -> None:
+        level = logging.ERROR if event.error else (self.level if event.parent is None else self.nested_level)
+        if not self.logger.isEnabledFor(level):
+            return
+        record = event.as_dict()
+        self.logger.log(
+            level, "%s %s %.3fs %s", event.method, event.status, event.duration,
+            json.dumps(record, ensure_ascii=False, default=str),
+            extra={"clickhouse_call": record},
+        )
+
+
+class MetricsRegistry:
+    """
+    Contadores e histograma de latência por método, no estilo Prometheus.
+    `render()` devolve o formato texto de exposição (para um endpoint /metrics
+    ou o textfile collector do node_exporter); `snapshot()` devolve um dict.
+
+    As chamadas aninhadas também contam no próprio método: somar linhas de
+    todos os métodos conta o mesmo dado mais de uma vez; filtre pelo método
+    de entrada (ex.: method="insert_df_in_batches_v4").
+    """
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    _COUNTERS = {
+        "rows_sent_total": "rows_sent",
+        "rows_received_total": "rows_received",
+        "bytes_sent_total": "bytes_sent",
+        "bytes_received_total": "bytes_received",
+        "batches_total": "batches",
+        "queries_total": "queries",
+    }
+
+    def __init__(self, prefix: str = "clickhouse_sync", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+        self._counters = {}      # (nome, labels) -> valor
+        self._histograms = {}    # labels -> [contagem por bucket..., soma, total]
+        self._lock = threading.Lock()
+
+    def _inc(self, name, labels, value) -> None:
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def emit(self, event: CallEvent) -> None:
+        method = (("method", event.method),)
+        with self._lock:
+            self._inc("calls_total", method + (("status", event.status),), 1)
+            for name, attr in self._COUNTERS.items():
+                value = getattr(event, attr)
+                if value:
+                    self._inc(name, method, value)
+            for phase, seconds in event.phase_seconds().items():
+                self._inc("phase_seconds_total", method + (("phase", phase),), seconds)
+            for key, value in event.server.items():
+                self._inc(f"server_{key}_total", method, value)
+
+            hist = self._histograms.setdefault(method, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if event.duration <= bound:
+                    hist[i] += 1
+            hist[-2] += event.duration
+            hist[-1] += 1
+
+    def value(self, name: str, **labels) -> float:
+        """Valor atual de um contador (ex.: value("rows_sent_total", method="upsert_df"))."""
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items(), key=_label_order))), 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = {}
+            for (name, labels), value in self._counters.items():
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+            histograms = [
+                {
+                    "labels": dict(labels),
+                    "buckets": dict(zip(self.buckets, hist[:-2])),
+                    "sum": hist[-2],
+                    "count": hist[-1],
+                }
+                for labels, hist in self._histograms.items()
+            ]
+        return {"counters": counters, "call_duration_seconds": histograms}
+
+    def render(self) -> str:
+        """Formato texto de exposição do Prometheus."""
+        lines = []
+        with self._lock:
+            by_name = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                by_name.setdefault(name, []).append((labels, value))
+            for name, samples in by_name.items():
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                lines.extend(f"{metric}{_labels(labels)} {_number(value)}" for labels, value in samples)
+
+            metric = f"{self.prefix}_call_duration_seconds"
+            if self._histograms:
+                lines.append(f"# TYPE {metric} histogram")
+            for labels, hist in sorted(self._histograms.items()):
+                for bound, count in zip(self.buckets, hist[:-2]):
+                    lines.append(f"{metric}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', '+Inf'),))} {hist[-1]}")
+                lines.append(f"{metric}_sum{_labels(labels)} {_number(hist[-2])}")
+                lines.append(f"{metric}_count{_labels(labels)} {hist[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_order(item):
+    # mesma ordem usada no emit: method, depois status/phase
+    return (item[0] != "method", item[0])
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class SpanSink:
+    """
+    Spans no formato do OpenTelemetry.
+
+    Args
+    ----
+    tracer : opentelemetry.trace.Tracer | None
+        Cada chamada vira um span (filho do span da chamada de fora, ou do
+        span ativo no contexto do OpenTelemetry).
+    callback : callable | None
+        Sem OpenTelemetry instalado: recebe um dict por chamada terminada com
+        name, trace_id, span_id, parent_span_id, start/end_time_unix_nano,
+        attributes e status (como num span OTLP).
+    """
+
+    def __init__(self, tracer=None, callback=None):
+        if (tracer is None) == (callback is None):
+            raise ValueError("Informe exatamente um entre tracer e callback.")
+        self.tracer = tracer
+        self.callback = callback
+        self._spans = {}      # span_id do evento -> span do OpenTelemetry
+        self._lock = threading.Lock()
+
+    def start(self, event: CallEvent) -> None:
+        if self.tracer is None:
+            return
+        context = None
+        with self._lock:
+            parent = self._spans.get(event.parent.span_id) if event.parent is not None else None
+        if parent is not None:
+            from opentelemetry import trace
+
+            context = trace.set_span_in_context(parent)
+        span = self.tracer.start_span(
+            f"ClickhouseSync.{event.method}",
+            context=context,
+            start_time=int(event.start_time * 1e9),
+            attributes=event.span_attributes(),
+        )
+        with self._lock:
+            self._spans[event.span_id] = span
+
+    def emit(self, event: CallEvent) -> None:
+        if self.tracer is None:
+            self.callback({
+                "name": f"ClickhouseSync.{event.method}",
+                "trace_id": event.trace_id,
+                "span_id": event.span_id,
+                "parent_span_id": event.parent.span_id if event.parent is not None else None,
+                "start_time_unix_nano": int(event.start_time * 1e9),
+                "end_time_unix_nano": int(event.end_time * 1e9),
+                "attributes": event.span_attributes(),
+                "status": {"code": "ERROR" if event.error else "OK", "message": event.error or ""},
+            })
+            return
+        with self._lock:
+            span = self._spans.pop(event.span_id, None)
+        if span is None:
+            return
+        span.set_attributes(event.span_attributes())
+        if event.exception is not None:
+            from opentelemetry.trace import Status, StatusCode
+
+            span.record_exception(event.exception)
+            span.set_status(Status(StatusCode.ERROR, event.error))
+        span.end(end_time=int(event.end_time * 1e9))
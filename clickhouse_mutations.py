@@ -0,0 +1,222 @@
+"""
+Acompanhamento de mutações e merges do ClickhouseSync.
+
+`ALTER TABLE ... DELETE/UPDATE`, lightweight `DELETE FROM` assíncrono e
+`OPTIMIZE` em tabelas replicadas retornam antes de o trabalho terminar: a
+mutação fica em `system.mutations` (parts_to_do, is_done) e as partes são
+reescritas por merges em `system.merges` (progress, bytes). O
+`MutationHandle` devolvido pelos métodos que alteram dados consulta essas
+tabelas com backoff exponencial até terminar:
+
+    handle = ch.delete_by_value("bi", "vendas", "loja", "L1", wait=False)
+    print(handle.status())          # progresso atual, sem bloquear
+    handle.wait(timeout=600)        # bloqueia (MutationTimeoutError se estourar)
+    await handle                    # em código asyncio (ver wait_async)
+
+Mutações que somem de `system.mutations` (KILL MUTATION, limpeza) contam como
+terminadas. Um `latest_fail_reason` preenchido faz `wait` levantar
+`MutationFailedError`: o ClickHouse re-tenta a mutação para sempre.
+"""
+import asyncio
+import time
+from typing import NamedTuple
+
+
+class MutationTimeoutError(Exception):
+    """A mutação/merge não terminou dentro do timeout."""
+
+
+class MutationFailedError(Exception):
+    """O ClickHouse registrou uma falha (latest_fail_reason) na mutação."""
+
+
+class MutationProgress(NamedTuple):
+    done: bool
+    mutations_left: int      # mutações acompanhadas ainda não concluídas
+    parts_to_do: int         # partes que ainda faltam reescrever
+    merges: int              # merges em andamento na tabela
+    bytes_total: int         # bytes comprimidos das partes em merge
+    bytes_done: int          # estimativa (bytes_total * progress)
+    fail_reason: str
+    elapsed: float           # segundos desde a criação do handle
+
+    def describe(self) -> str:
+        if self.done:
+            return f"concluído em {self.elapsed:.1f}s"
+        text = (
+            f"{self.mutations_left} mutação(ões), {self.parts_to_do} parte(s) a reescrever, "
+            f"{self.merges} merge(s)"
+        )
+        if self.bytes_total:
+            text += f" ({self.bytes_done / self.bytes_total:.0%} de {self.bytes_total / 1024**2:.1f} MB)"
+        return text + f", {self.elapsed:.1f}s"
+
+
+class MutationHandle:
+    """
+    Estado de uma operação assíncrona em `db_name.table_name`.
+
+    Args
+    ----
+    execute : callable
+        `execute(query, params)` -> linhas (ex.: `ClickhouseSync.client.execute`).
+    mutation_ids : iterable
+        mutation_id de `system.mutations` a acompanhar.
+    merges : bool
+        Se True (OPTIMIZE), também espera terminar os merges da tabela.
+    parts : iterable | None
+        Com `merges`, só contam os merges que têm alguma destas partes entre as
+        de origem (as partes ativas no momento do OPTIMIZE); merges de fundo de
+        partes inseridas depois são ignorados. None = qualquer merge da tabela.
+    plan : DeletePlan | None
+        Plano de exclusão que gerou a operação, quando houver.
+    """
+
+    def __init__(
+        self, execute, db_name, table_name, mutation_ids=(), merges=False, plan=None, parts=None,
+    ):
+        self._execute = execute
+        self.db_name = db_name
+        self.table_name = table_name
+        self.mutation_ids = list(mutation_ids)
+        self.merges = merges
+        self.parts = None if parts is None else list(parts)
+        self.plan = plan
+        self.started = time.monotonic()
+        self._last = None
+
+    def __repr__(self):
+        return (
+            f"MutationHandle({self.db_name}.{self.table_name}, "
+            f"mutations={self.mutation_ids}, merges={self.merges})"
+        )
+
+    def status(self) -> MutationProgress:
+        """Consulta system.mutations/system.merges uma vez."""
+        elapsed = time.monotonic() - self.started
+        if self._last is not None and self._last.done:
+            return self._last._replace(elapsed=elapsed)
+        if not self.mutation_ids and not self.merges:
+            self._last = MutationProgress(True, 0, 0, 0, 0, 0, "", elapsed)
+            return self._last
+
+        params = {"db": self.db_name, "table": self.table_name}
+        mutations_left, parts_to_do, fail_reason = 0, 0, ""
+        if self.mutation_ids:
+            rows = self._execute(
+                "SELECT mutation_id, is_done, parts_to_do, latest_fail_reason FROM system.mutations "
+                "WHERE database = %(db)s AND table = %(table)s AND mutation_id IN %(ids)s",
+                {**params, "ids": tuple(self.mutation_ids)},
+            )
+            for _, is_done, parts, reason in rows:
+                if not is_done:
+                    mutations_left += 1
+                    parts_to_do += int(parts)
+                    fail_reason = fail_reason or (reason or "")
+
+        # merges de mutação (is_mutation) para mutações, merges comuns para OPTIMIZE
+        merges, bytes_total, bytes_done = 0, 0, 0
+        optimize = self.merges and not mutations_left
+        if mutations_left or (optimize and self.parts != []):
+            query = (
+                "SELECT count(), sum(total_size_bytes_compressed), "
+                "sum(total_size_bytes_compressed * progress) FROM system.merges "
+                "WHERE database = %(db)s AND table = %(table)s AND is_mutation = %(mutation)s"
+            )
+            merge_params = {**params, "mutation": 0 if optimize else 1}
+            if optimize and self.parts is not None:
+                query += " AND hasAny(source_part_names, %(parts)s)"
+                merge_params["parts"] = self.parts
+            merges, bytes_total, bytes_done = self._execute(query, merge_params)[0]
+
+        done = mutations_left == 0 and (not self.merges or merges == 0)
+        self._last = MutationProgress(
+            done, mutations_left, parts_to_do, int(merges),
+            int(bytes_total or 0), int(bytes_done or 0), fail_reason, elapsed,
+        )
+        return self._last
+
+    def done(self) -> bool:
+        return self.status().done
+
+    def _check(self, progress, deadline):
+        if progress.fail_reason:
+            raise MutationFailedError(
+                f"Mutação em {self.db_name}.{self.table_name} falhou: {progress.fail_reason}"
+            )
+        if deadline is not None and time.monotonic() >= deadline:
+            raise MutationTimeoutError(
+                f"{self.db_name}.{self.table_name} não terminou a tempo: {progress.describe()}"
+            )
+
+    def _intervals(self, poll_interval, max_interval, backoff):
+        interval = poll_interval
+        while True:
+            yield interval
+            interval = min(interval * backoff, max_interval)
+
+    def wait(
+        self,
+        timeout: float | None = None,
+        poll_interval: float = 0.5,
+        max_interval: float = 10.0,
+        backoff: float = 2.0,
+        on_progress=None,
+    ) -> MutationProgress:
+        """
+        Bloqueia até a operação terminar.
+
+        Args
+        ----
+        timeout : float | None
+            Segundos; None espera indefinidamente. Estourando, levanta
+            MutationTimeoutError (a mutação continua no servidor; veja `cancel`).
+        poll_interval, max_interval, backoff : float
+            Intervalo inicial entre consultas, teto e fator de crescimento.
+        on_progress : callable | None
+            Chamado com cada MutationProgress (ex.: print/log).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for interval in self._intervals(poll_interval, max_interval, backoff):
+            progress = self.status()
+            if on_progress is not None:
+                on_progress(progress)
+            if progress.done:
+                return progress
+            self._check(progress, deadline)
+            if deadline is not None:
+                interval = min(interval, max(deadline - time.monotonic(), 0))
+            time.sleep(interval)
+
+    async def wait_async(
+        self,
+        timeout: float | None = None,
+        poll_interval: float = 0.5,
+        max_interval: float = 10.0,
+        backoff: float = 2.0,
+        on_progress=None,
+    ) -> MutationProgress:
+        """Como `wait`, sem bloquear o event loop (consultas numa thread, asyncio.sleep)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for interval in self._intervals(poll_interval, max_interval, backoff):
+            progress = await asyncio.to_thread(self.status)
+            if on_progress is not None:
+                on_progress(progress)
+            if progress.done:
+                return progress
+            self._check(progress, deadline)
+            if deadline is not None:
+                interval = min(interval, max(deadline - time.monotonic(), 0))
+            await asyncio.sleep(interval)
+
+    def __await__(self):
+        return self.wait_async().__await__()
+
+    def cancel(self):
+        """KILL MUTATION das mutações acompanhadas ainda em andamento."""
+        if not self.mutation_ids:
+            return
+        self._execute(
+            "KILL MUTATION WHERE database = %(db)s AND table = %(table)s AND mutation_id IN %(ids)s",
+            {"db": self.db_name, "table": self.table_name, "ids": tuple(self.mutation_ids)},
+        )
@@ -0,0 +1,311 @@
+"""
+Insert em formato Native via HTTP, sem montar valores por linha.
+
+O `insert_df_in_batches_v4` entrega ao driver listas/tuplas de valores Python
+que ele serializa um a um. Aqui cada coluna (já convertida pelas mesmas
+regras do v4, ver clickhouse_coercion) é codificada direto em bytes com
+NumPy, no layout do formato Native do ClickHouse:
+
+    varint(n_colunas) varint(n_linhas)
+    para cada coluna: string(nome) string(tipo) dados
+
+e o bloco é enviado como corpo de `INSERT INTO ... FORMAT Native` pela
+interface HTTP (porta 8123).
+
+Tipos suportados: Int/UInt 8-64, Float32/64, Bool, Date, Date32, DateTime,
+DateTime64, String, FixedString, Decimal, UUID, com Nullable e
+LowCardinality (enviado como o tipo base; o servidor converte). Demais
+tipos (Array, Map, Enum, ...) devem usar o `insert_df_in_batches_v4`.
+"""
+import re
+import base64
+import datetime as _dt
+import uuid as _uuid
+import urllib.error
+import urllib.parse
+import urllib.request
+from decimal import Decimal, localcontext
+
+import numpy as _np
+import pandas as pd
+
+from clickhouse_coercion import NUMPY_INT_DTYPES, coerce_series, parse_column
+
+_DECIMAL_RE = re.compile(r"^Decimal(32|64|128|256)?\((?:\s*(\d+)\s*,)?\s*(\d+)\s*\)$")
+_DATETIME_TZ_RE = re.compile(r"'([^']+)'")
+_DATETIME64_RE = re.compile(r"^DateTime64\(\s*(\d+)")
+_FIXED_STRING_RE = re.compile(r"^FixedString\((\d+)\)$")
+# tipos base com encoder; Array(Int32), Map(String, ...) etc. cairiam nas
+# famílias do coerce pelo tipo interno e seriam codificados errado
+_SUPPORTED_RE = re.compile(
+    r"^(?:U?Int(?:8|16|32|64)|Float(?:32|64)|Bool|String|FixedString\(\d+\)|Date|Date32"
+    r"|DateTime(?:\(.*\))?|DateTime64\(.*\)|Decimal(?:32|64|128|256)?\(.*\)|UUID)$"
+)
+_EPOCH = _dt.datetime(1970, 1, 1)
+_EPOCH_DATE = _np.datetime64("1970-01-01", "D")
+
+
+class UnsupportedNativeType(TypeError):
+    """Tipo de coluna sem encoder Native (use o insert_df_in_batches_v4)."""
+
+
+# ---------- primitivas ----------
+def write_varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def write_str(s: str) -> bytes:
+    raw = s.encode("utf-8")
+    return write_varint(len(raw)) + raw
+
+
+def _encode_strings(items: list) -> bytes:
+    """varint(len) + bytes de cada item, montado com NumPy (sem concatenação por item)."""
+    encoded = [v if isinstance(v, bytes) else v.encode("utf-8") for v in items]
+    if not encoded:
+        return b""
+    lengths = _np.fromiter(map(len, encoded), dtype=_np.int64, count=len(encoded))
+    prefix_len = _np.ones(len(lengths), dtype=_np.int64)
+    for k in range(1, 10):
+        prefix_len += lengths >= (1 << (7 * k))
+    sizes = lengths + prefix_len
+    starts = _np.cumsum(sizes) - sizes
+
+    out = _np.empty(int(sizes.sum()), dtype=_np.uint8)
+    is_data = _np.ones(len(out), dtype=bool)
+    for k in range(int(prefix_len.max())):
+        sel = prefix_len > k
+        pos = starts[sel] + k
+        byte = (lengths[sel] >> (7 * k)) & 0x7F
+        more = prefix_len[sel] > k + 1
+        out[pos] = (byte | (more << 7)).astype(_np.uint8)
+        is_data[pos] = False
+    out[is_data] = _np.frombuffer(b"".join(encoded), dtype=_np.uint8)
+    return out.tobytes()
+
+
+# ---------- valores (object array de tipos Python nativos | None) ----------
+def _null_mask(values: _np.ndarray) -> _np.ndarray:
+    return pd.isna(values)
+
+
+def _filled(values: _np.ndarray, mask: _np.ndarray, fill) -> _np.ndarray:
+    if not mask.any():
+        return values
+    out = values.copy()
+    out[mask] = fill
+    return out
+
+
+def _epoch_ticks(values, tz: str | None, unit: str = "s") -> _np.ndarray:
+    """
+    datetime naive -> epoch em `unit` (int64). Como no driver, o datetime naive
+    é interpretado no fuso `tz` (fuso da coluna ou do servidor).
+    """
+    ts = pd.DatetimeIndex(pd.to_datetime(values, cache=False))
+    if tz:
+        # como o pytz.localize do driver: horário ambíguo (fim do horário de
+        # verão) conta como horário padrão e horário inexistente (início) usa o
+        # offset de antes da mudança
+        standard = _np.zeros(len(ts), dtype=bool)
+        local = ts.tz_localize(tz, ambiguous=standard, nonexistent="NaT")
+        utc = local.tz_convert("UTC").tz_localize(None).values.copy()
+        gap = _np.asarray(local.isna() & ts.notna())
+        if gap.any():
+            before = ts[gap].tz_localize(tz, ambiguous=standard[gap], nonexistent="shift_backward")
+            offset = before.tz_localize(None) - before.tz_convert("UTC").tz_localize(None)
+            utc[gap] = (ts[gap] - offset).values
+        ts = pd.DatetimeIndex(utc)
+    return ts.as_unit(unit).asi8.copy()
+
+
+def _decimal_params(base_type: str) -> tuple[int, int]:
+    """Retorna (bytes, escala) de um Decimal(P, S) / DecimalNN(S)."""
+    m = _DECIMAL_RE.match(base_type)
+    if not m:
+        raise UnsupportedNativeType(base_type)
+    bits, precision, scale = m.group(1), m.group(2), int(m.group(3))
+    if bits:
+        return int(bits) // 8, scale
+    precision = int(precision)
+    if precision <= 9:
+        return 4, scale
+    if precision <= 18:
+        return 8, scale
+    if precision <= 38:
+        return 16, scale
+    return 32, scale
+
+
+def encode_values(values: _np.ndarray, base_type: str, family: str, tz: str | None) -> bytes:
+    """Codifica os valores (sem nulos; nulos já substituídos) de um tipo base."""
+    if not _SUPPORTED_RE.match(base_type):
+        raise UnsupportedNativeType(base_type)
+    n = len(values)
+    if family in NUMPY_INT_DTYPES:
+        dtype = _np.dtype(NUMPY_INT_DTYPES[family]).newbyteorder("<")
+        return _np.asarray(values).astype(dtype).tobytes()
+    if family == "float":
+        dtype = "<f4" if base_type == "Float32" else "<f8"
+        return _np.asarray(values, dtype=_np.float64).astype(dtype).tobytes()
+    if base_type == "Bool":
+        return _np.asarray(values).astype(bool).astype("<u1").tobytes()
+    if family == "string":
+        m = _FIXED_STRING_RE.match(base_type)
+        items = [v if isinstance(v, bytes) else str(v).encode("utf-8") for v in values]
+        if m:
+            length = int(m.group(1))
+            # o dtype S{n} cortaria em silêncio; o servidor/driver recusam o valor
+            too_long = next((v for v in items if len(v) > length), None)
+            if too_long is not None:
+                raise ValueError(
+                    f"Valor com {len(too_long)} bytes excede {base_type}: {too_long[:20]!r}"
+                )
+            return _np.array(items, dtype=f"S{length}").tobytes() if n else b""
+        return _encode_strings(items)
+    if family == "datetime":
+        m64 = _DATETIME64_RE.match(base_type)
+        m_tz = _DATETIME_TZ_RE.search(base_type)
+        col_tz = m_tz.group(1) if m_tz else tz
+        if m64:
+            precision = min(int(m64.group(1)), 9)
+            ns = _epoch_ticks(values, col_tz, unit="ns")
+            return (ns // (10 ** (9 - precision))).astype("<i8").tobytes()
+        secs = _epoch_ticks(values, col_tz)
+        return _np.clip(secs, 0, 2**32 - 1).astype("<u4").tobytes()
+    if family == "date":
+        days = (pd.to_datetime(values, cache=False).values.astype("datetime64[D]") - _EPOCH_DATE)
+        days = days.astype(_np.int64)
+        if base_type == "Date32":
+            return days.astype("<i4").tobytes()
+        return _np.clip(days, 0, 2**16 - 1).astype("<u2").tobytes()
+    if family == "decimal":
+        width, scale = _decimal_params(base_type)
+        factor = 10 ** scale
+        # como no driver: trunca na escala, com precisão suficiente para Decimal256
+        with localcontext() as ctx:
+            ctx.prec = 76
+            ints = [
+                int((v if isinstance(v, Decimal) else Decimal(str(v))) * factor)
+                for v in values
+            ]
+        if width <= 8:
+            return _np.array(ints, dtype=f"<i{width}").tobytes()
+        return b"".join(i.to_bytes(width, "little", signed=True) for i in ints)
+    if family == "uuid":
+        # metade alta e metade baixa, cada uma como UInt64 little-endian
+        try:
+            hex_digits = "".join(map(str, values)).replace("-", "")
+            halves = _np.frombuffer(bytes.fromhex(hex_digits), dtype=">u8")
+            if len(halves) != 2 * n:
+                raise ValueError
+        except ValueError:
+            # formatos alternativos ({...}, urn:uuid:) ou valor inválido
+            halves = _np.array(
+                [h for v in values for h in divmod(_uuid.UUID(str(v)).int, 1 << 64)],
+                dtype=_np.uint64,
+            )
+        return halves.astype("<u8").tobytes()
+    raise UnsupportedNativeType(base_type)
+
+
+_PLACEHOLDER = {"string": "", "float": 0.0, "decimal": 0, "uuid": "00000000-0000-0000-0000-000000000000"}
+
+
+def _placeholder(base_type: str, family: str):
+    if family in NUMPY_INT_DTYPES or base_type == "Bool":
+        return 0
+    if family in ("datetime", "date"):
+        return _EPOCH
+    return _PLACEHOLDER.get(family)
+
+
+def native_type(ch_type: str) -> str:
+    """Tipo declarado no bloco: LowCardinality(...) é removido (o servidor converte)."""
+    spec = parse_column("", ch_type)
+    return f"Nullable({spec.base_type})" if spec.nullable else spec.base_type
+
+
+def encode_column(values: _np.ndarray, ch_type: str, tz: str | None = None) -> bytes:
+    """
+    Codifica uma coluna convertida (`coerce_series(...).to_numpy(dtype=object)`).
+    Nullable: máscara UInt8 (1 = nulo) seguida dos valores com placeholder.
+    """
+    spec = parse_column("", ch_type)
+    mask = _null_mask(values)
+    if mask.any() and not spec.nullable:
+        # o v4 também falharia no driver; aqui o erro vem antes de enviar
+        raise ValueError(f"Valores nulos em coluna não-nullable ({ch_type}).")
+    body = encode_values(
+        _filled(values, mask, _placeholder(spec.base_type, spec.family)),
+        spec.base_type, spec.family, tz,
+    )
+    if spec.nullable:
+        return mask.astype("<u1").tobytes() + body
+    return body
+
+
+def encode_block(columns: list[tuple[str, str, bytes]], n_rows: int) -> bytes:
+    """Monta um bloco Native a partir de [(nome, tipo, dados codificados), ...]."""
+    parts = [write_varint(len(columns)), write_varint(n_rows)]
+    for name, ch_type, data in columns:
+        parts.append(write_str(name))
+        parts.append(write_str(ch_type))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def encode_frame(
+    df: pd.DataFrame,
+    column_types: dict,
+    datetime_strfmt: str = "%Y-%m-%d %H:%M:%S",
+    tz: str | None = None,
+) -> bytes:
+    """Aplica as coerções do v4 e codifica o DataFrame inteiro como um bloco Native."""
+    columns = []
+    for col, ch_type in column_types.items():
+        values = coerce_series(df[col], ch_type, datetime_strfmt).to_numpy(dtype=object)
+        columns.append((col, native_type(ch_type), encode_column(values, ch_type, tz)))
+    return encode_block(columns, len(df))
+
+
+# ---------- transporte HTTP ----------
+def http_insert(
+    url: str,
+    query: str,
+    body: bytes,
+    user: str | None = None,
+    password: str | None = None,
+    database: str | None = None,
+    settings: dict | None = None,
+    timeout: float = 300.0,
+) -> None:
+    """Envia `body` como dados do `query` (INSERT ... FORMAT ...) via POST."""
+    params = {"query": query}
+    if database:
+        params["database"] = database
+    for key, value in (settings or {}).items():
+        params[key] = value
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/?{urllib.parse.urlencode(params)}",
+        data=body,
+        method="POST",
+        headers={"Content-Type": "application/octet-stream"},
+    )
+    if user:
+        token = base64.b64encode(f"{user}:{password or ''}".encode("utf-8")).decode("ascii")
+        request.add_header("Authorization", f"Basic {token}")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"HTTP {e.code} do ClickHouse: {detail}") from e
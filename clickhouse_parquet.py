@@ -0,0 +1,184 @@
+"""
+Exportação Parquet no cliente, em streaming.
+
+`COPY ... TO` não existe no ClickHouse e, com `INTO OUTFILE`, o arquivo fica
+no servidor. Aqui o resultado da query é lido bloco a bloco (`execute_iter`),
+agrupado em `row_group_rows` linhas e gravado como um row group do arquivo
+com o `pyarrow.parquet.ParquetWriter`. A memória fica limitada a um row group.
+
+O schema Arrow vem dos tipos do ClickHouse (e não da inferência do pandas),
+então todos os row groups têm o mesmo schema mesmo quando uma coluna vem
+inteira nula em um deles:
+
+    Int/UInt 8-64 -> int8..uint64      Int/UInt 128-256 -> string
+    Float32/64    -> float32/float64   Bool             -> bool
+    String/FixedString/Enum/UUID/IPv4/IPv6 -> string
+    Date/Date32   -> date32            DateTime('tz')   -> timestamp[s, tz]
+    DateTime64(p) -> timestamp[ms|us|ns]
+    Decimal(P, S) -> decimal128 (decimal256 se P > 38)
+    Array(T) -> list<T>   Map(K, V) -> map<K, V>   Tuple(...) -> struct
+    LowCardinality(String) -> dictionary<int32, string>
+
+Para datasets particionados, `hive_segment` monta os diretórios no padrão
+Hive (`coluna=valor`), legíveis por pyarrow.dataset, Spark, DuckDB, etc.
+
+Exige pyarrow (importado só quando a exportação é usada).
+"""
+import re
+import urllib.parse
+from functools import lru_cache
+
+from clickhouse_coercion import strip_wrappers
+
+_DECIMAL_RE = re.compile(r"^Decimal(32|64|128|256)?\((?:\s*(\d+)\s*,)?\s*(\d+)\s*\)$")
+_DATETIME64_RE = re.compile(r"^DateTime64\(\s*(\d+)\s*(?:,\s*'([^']+)')?\s*\)$")
+_DATETIME_TZ_RE = re.compile(r"^DateTime\(\s*'([^']+)'\s*\)$")
+_DECIMAL_PRECISION = {"32": 9, "64": 18, "128": 38, "256": 76}
+_INT_ARROW = {
+    "Int8": "int8", "Int16": "int16", "Int32": "int32", "Int64": "int64",
+    "UInt8": "uint8", "UInt16": "uint16", "UInt32": "uint32", "UInt64": "uint64",
+}
+
+
+def require_pyarrow():
+    """Importa pyarrow e pyarrow.parquet, com mensagem clara se faltar."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "A exportação Parquet exige pyarrow (pip install pyarrow)."
+        ) from e
+    return pyarrow, pyarrow.parquet
+
+
+def _split_args(args: str) -> list[str]:
+    """Separa os argumentos de um tipo no nível de topo: 'String, Array(Int8)'."""
+    parts, depth, quoted, current = [], 0, False, []
+    for ch in args:
+        if ch == "'":
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(ch)
+    if current:
+        parts.append("".join(current).strip())
+    return parts
+
+
+def _inner(tp: str, prefix: str) -> str:
+    return tp[len(prefix) + 1:-1]
+
+
+@lru_cache(maxsize=512)
+def arrow_type(ch_type: str):
+    """Tipo Arrow equivalente a um tipo do ClickHouse (Nullable é tratado pelo schema)."""
+    pa, _ = require_pyarrow()
+    low_cardinality = ch_type.strip().startswith("LowCardinality(")
+    base, _ = strip_wrappers(ch_type)
+
+    if base in _INT_ARROW:
+        return getattr(pa, _INT_ARROW[base])()
+    if base == "Float32":
+        return pa.float32()
+    if base == "Float64":
+        return pa.float64()
+    if base == "Bool":
+        return pa.bool_()
+    if base in ("Date", "Date32"):
+        return pa.date32()
+    if base == "DateTime":
+        return pa.timestamp("s")
+    m = _DATETIME_TZ_RE.match(base)
+    if m:
+        return pa.timestamp("s", tz=m.group(1))
+    m = _DATETIME64_RE.match(base)
+    if m:
+        precision = int(m.group(1))
+        unit = "ms" if precision <= 3 else "us" if precision <= 6 else "ns"
+        return pa.timestamp(unit, tz=m.group(2))
+    m = _DECIMAL_RE.match(base)
+    if m:
+        bits, precision, scale = m.group(1), m.group(2), int(m.group(3))
+        precision = int(precision) if precision else _DECIMAL_PRECISION[bits]
+        if precision > 38:
+            return pa.decimal256(precision, scale)
+        return pa.decimal128(precision, scale)
+    if base.startswith("Array("):
+        return pa.list_(arrow_type(_inner(base, "Array")))
+    if base.startswith("Map("):
+        key, value = _split_args(_inner(base, "Map"))
+        return pa.map_(arrow_type(key), arrow_type(value))
+    if base.startswith("Tuple("):
+        fields = []
+        for i, arg in enumerate(_split_args(_inner(base, "Tuple"))):
+            # Tuple(a Int32, b String) -> campos nomeados; senão f0, f1, ...
+            m = re.match(r"^([A-Za-z_]\w*)\s+(.+)$", arg)
+            if m:
+                name, tp = m.group(1), m.group(2)
+            else:
+                name, tp = f"f{i}", arg
+            fields.append((name, arrow_type(tp)))
+        return pa.struct(fields)
+    if low_cardinality and base == "String":
+        return pa.dictionary(pa.int32(), pa.string())
+    # String, FixedString, Enum, UUID, IPv4/IPv6, Int128/256 e demais: texto
+    return pa.string()
+
+
+def arrow_schema(columns_info):
+    """Schema Arrow a partir de [(coluna, tipo ClickHouse), ...]."""
+    pa, _ = require_pyarrow()
+    return pa.schema([pa.field(name, arrow_type(tp)) for name, tp in columns_info])
+
+
+def _as_text(values):
+    return [None if v is None else str(v) for v in values]
+
+
+def column_array(values, field):
+    """Array Arrow de uma coluna (tupla/lista de valores Python do driver)."""
+    pa, _ = require_pyarrow()
+    tp = field.type
+    if pa.types.is_dictionary(tp):
+        return column_array(values, pa.field(field.name, tp.value_type)).dictionary_encode()
+    if pa.types.is_string(tp):
+        try:
+            return pa.array(values, type=tp)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            # UUID, IPv4Address, int (Int128/256), ...
+            return pa.array(_as_text(values), type=tp)
+    return pa.array(values, type=tp)
+
+
+def rows_to_table(rows: list, schema):
+    """Converte uma lista de linhas (tuplas) em uma pyarrow.Table com `schema`."""
+    pa, _ = require_pyarrow()
+    if rows:
+        columns = list(zip(*rows))
+    else:
+        columns = [()] * len(schema)
+    arrays = [column_array(values, field) for values, field in zip(columns, schema)]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+_KEY_RE = re.compile(r"\W+")
+
+
+def hive_key(expr: str) -> str:
+    """Nome de partição a partir de uma coluna/expressão: 'toYYYYMM(dt)' -> 'toYYYYMM_dt'."""
+    return _KEY_RE.sub("_", expr).strip("_") or "partition"
+
+
+def hive_segment(key: str, value) -> str:
+    """Diretório Hive `chave=valor`, com o valor codificado como URI (como o pyarrow)."""
+    if value is None:
+        return f"{key}={HIVE_NULL}"
+    return f"{key}={urllib.parse.quote(str(value), safe='')}"
@@ -0,0 +1,298 @@
+"""
+Pool de conexões para o ClickhouseSync.
+
+Cada `clickhouse_driver.Client` mantém UMA conexão TCP e não pode ser usado
+por duas threads ao mesmo tempo. O `ClickhousePool` guarda vários Clients e
+empresta um por vez (checkout), com:
+
+- tamanho mínimo/máximo
+- health check no checkout (mesma query do `test_connection`) para conexões
+  que ficaram paradas mais que `health_check_interval` segundos
+- descarte de conexões ociosas há mais de `max_idle_seconds` (acima do mínimo)
+- API de context manager: `with pool.connection() as client: ...`
+
+O `PooledClient` expõe a mesma interface usada pelo ClickhouseSync
+(`execute`, `execute_iter`, ...) e faz checkout/devolução a cada chamada, o que
+torna os métodos existentes seguros para uso a partir de várias threads.
+"""
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Mesma query usada em ClickhouseSync.test_connection
+HEALTH_CHECK_QUERY = "SELECT version()"
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou disponível dentro do timeout de checkout."""
+
+
+class QueryCancelledError(Exception):
+    """A chamada foi cancelada via PooledClient.cancel()."""
+
+
+class ClickhousePool:
+    def __init__(
+        self,
+        factory,
+        min_size: int = 1,
+        max_size: int = 8,
+        max_idle_seconds: float = 300.0,
+        health_check_interval: float = 30.0,
+        checkout_timeout: float | None = 30.0,
+    ):
+        """
+        Args
+        ----
+        factory : callable
+            Função sem argumentos que cria um novo `Client`.
+        min_size : int
+            Conexões mantidas mesmo quando ociosas.
+        max_size : int
+            Máximo de conexões abertas ao mesmo tempo.
+        max_idle_seconds : float
+            Conexões ociosas há mais tempo que isso são descartadas (acima de min_size).
+        health_check_interval : float
+            Conexões paradas há mais tempo que isso passam pelo health check
+            no checkout. Use 0 para checar em todo checkout.
+        checkout_timeout : float | None
+            Tempo máximo de espera por uma conexão livre (None = espera indefinida).
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Tamanhos inválidos: exige 0 <= min_size <= max_size e max_size >= 1.")
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = deque()  # (client, last_used)
+        self._size = 0        # conexões criadas (ociosas + emprestadas)
+        self._closed = False
+        self._cond = threading.Condition()
+
+        for _ in range(min_size):
+            self._idle.append((self.factory(), time.monotonic()))
+            self._size += 1
+
+    # ---------- checkout / devolução ----------
+    def acquire(self, timeout: float | None = None):
+        """Empresta um Client do pool (cria um novo se houver espaço)."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            client, last_used = None, None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError("Pool de conexões fechado.")
+                    self._evict_idle_locked()
+                    if self._idle:
+                        client, last_used = self._idle.pop()  # LIFO: a mais recente
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"Nenhuma conexão livre em {timeout}s (max_size={self.max_size})."
+                        )
+                    self._cond.wait(remaining)
+
+            if client is None:
+                try:
+                    return self.factory()
+                except Exception:
+                    self._discard()
+                    raise
+
+            idle_for = time.monotonic() - last_used
+            if idle_for < self.health_check_interval or self._is_healthy(client):
+                return client
+            # conexão morta: descarta e tenta a próxima
+            self._disconnect(client)
+            self._discard()
+
+    def release(self, client, discard: bool = False) -> None:
+        """Devolve um Client ao pool (ou descarta, ex.: após leitura interrompida)."""
+        if discard or self._closed:
+            self._disconnect(client)
+            self._discard()
+            return
+        with self._cond:
+            self._idle.append((client, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float | None = None):
+        """`with pool.connection() as client:` empresta e devolve um Client."""
+        client = self.acquire(timeout)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    # ---------- manutenção ----------
+    def evict_idle(self) -> int:
+        """Descarta conexões ociosas há mais de `max_idle_seconds`. Retorna quantas."""
+        with self._cond:
+            return self._evict_idle_locked()
+
+    def close(self) -> None:
+        """Fecha todas as conexões ociosas; as emprestadas são fechadas na devolução."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for client, _ in idle:
+            self._disconnect(client)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    def _evict_idle_locked(self) -> int:
+        now = time.monotonic()
+        evicted = 0
+        # o mais antigo fica à esquerda (checkout/devolução são LIFO pela direita)
+        while (
+            self._idle
+            and self._size > self.min_size
+            and now - self._idle[0][1] > self.max_idle_seconds
+        ):
+            client, _ = self._idle.popleft()
+            self._size -= 1
+            evicted += 1
+            self._disconnect(client)
+        return evicted
+
+    def _discard(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _is_healthy(client) -> bool:
+        try:
+            client.execute(HEALTH_CHECK_QUERY)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _disconnect(client) -> None:
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+
+
+class PooledClient:
+    """
+    Substituto do `Client` que faz checkout no pool a cada chamada.
+    `last_query` é guardado por thread (a última query executada pela thread atual).
+    """
+
+    def __init__(self, pool: ClickhousePool):
+        self.pool = pool
+        self._local = threading.local()
+        self._client_settings = None
+        self._active = {}        # thread id -> Client emprestado no momento
+        self._cancelled = set()  # thread ids com cancelamento pendente
+        self._lock = threading.Lock()
+
+    def _borrow(self):
+        ident = threading.get_ident()
+        if ident in self._cancelled:
+            raise QueryCancelledError("Chamada cancelada.")
+        client = self.pool.acquire()
+        with self._lock:
+            self._active[ident] = client
+        return ident, client
+
+    def _give_back(self, ident, client, discard: bool = False) -> None:
+        with self._lock:
+            self._active.pop(ident, None)
+            # conexão derrubada por cancel() não volta para o pool
+            discard = discard or ident in self._cancelled
+        self._local.last_query = getattr(client, "last_query", None)
+        self.pool.release(client, discard=discard)
+
+    @contextmanager
+    def _checkout(self):
+        ident, client = self._borrow()
+        try:
+            yield client
+        finally:
+            self._give_back(ident, client)
+
+    def execute(self, *args, **kwargs):
+        with self._checkout() as client:
+            return client.execute(*args, **kwargs)
+
+    def execute_iter(self, *args, **kwargs):
+        """Mantém a conexão emprestada enquanto o resultado é consumido."""
+        ident, client = self._borrow()
+        completed = False
+        try:
+            for row in client.execute_iter(*args, **kwargs):
+                yield row
+            completed = True
+        finally:
+            # leitura interrompida deixa dados pendentes no socket: descarta
+            self._give_back(ident, client, discard=not completed)
+
+    def query_dataframe(self, *args, **kwargs):
+        with self._checkout() as client:
+            return client.query_dataframe(*args, **kwargs)
+
+    def insert_dataframe(self, *args, **kwargs):
+        with self._checkout() as client:
+            return client.insert_dataframe(*args, **kwargs)
+
+    # ---------- cancelamento ----------
+    def cancel(self, thread_id: int) -> bool:
+        """
+        Cancela o que a thread `thread_id` está executando: derruba a conexão
+        emprestada (o servidor aborta a query) e faz as próximas chamadas dessa
+        thread falharem com QueryCancelledError até `reset_cancel(thread_id)`.
+        Retorna True se havia uma conexão ativa.
+        """
+        with self._lock:
+            self._cancelled.add(thread_id)
+            client = self._active.get(thread_id)
+        if client is None:
+            return False
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+        return True
+
+    def reset_cancel(self, thread_id: int) -> None:
+        with self._lock:
+            self._cancelled.discard(thread_id)
+
+    def disconnect(self) -> None:
+        self.pool.close()
+
+    @property
+    def last_query(self):
+        return getattr(self._local, "last_query", None)
+
+    @property
+    def client_settings(self) -> dict:
+        if self._client_settings is None:
+            with self.pool.connection() as client:
+                self._client_settings = dict(client.client_settings)
+        return self._client_settings
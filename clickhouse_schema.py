@@ -0,0 +1,312 @@
+"""
+Inferência de schema compacto para o `create_table_from_df`.
+
+O `df_to_clickhouse_type` mapeia todo inteiro para Int32 e todo texto para
+String, e a tabela sai com `ORDER BY tuple()`. Com `compact_types=True` o
+tipo de cada coluna é escolhido a partir dos dados:
+
+- inteiros: menor Int/UInt que comporta o mínimo/máximo da coluna
+- floats com valores inteiros (NaN por causa de nulos) -> inteiro Nullable;
+  com até 4 casas decimais -> Decimal(9|18, S)
+- datas: Date (ou Date32 fora de 1970..2149) quando tudo é meia-noite,
+  DateTime quando há hora, DateTime64(3|6) com frações de segundo;
+  textos no formato AAAA-MM-DD[ HH:MM:SS] também viram data
+- textos com poucos valores distintos -> LowCardinality(String)
+
+Checagens numéricas usam a coluna inteira (vetorizado); textos são
+analisados em uma amostra de `sample_rows` linhas.
+
+`suggest_order_by`, `suggest_partition_by` e `suggest_codecs` dão sugestões
+para a chave de ordenação, a partição e os codecs, e `create_table_sql`
+monta o DDL.
+"""
+import re
+from typing import NamedTuple
+
+import numpy as _np
+import pandas as pd
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_DATETIME_RE = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?$")
+_DATE_MIN, _DATE_MAX = pd.Timestamp("1970-01-01"), pd.Timestamp("2149-06-06")
+_DATE32_MIN, _DATE32_MAX = pd.Timestamp("1900-01-01"), pd.Timestamp("2299-12-31")
+_DATETIME_MAX = pd.Timestamp("2106-02-07 06:28:15")
+_MAX_DECIMAL_SCALE = 4
+
+
+class InferredColumn(NamedTuple):
+    name: str
+    type: str           # tipo completo, ex. "LowCardinality(Nullable(String))"
+    base_type: str      # sem Nullable/LowCardinality
+    nullable: bool
+    distinct: int       # valores distintos (na amostra, para textos)
+    low_cardinality: bool
+    min_value: object = None
+    max_value: object = None
+    monotonic: bool = False
+
+
+def int_type_for(mn: int, mx: int) -> str:
+    """Menor Int/UInt que comporta [mn, mx]."""
+    if mn >= 0:
+        for bits in (8, 16, 32, 64):
+            if mx < 2**bits:
+                return f"UInt{bits}"
+        return "UInt128"
+    for bits in (8, 16, 32, 64):
+        if -(2 ** (bits - 1)) <= mn and mx < 2 ** (bits - 1):
+            return f"Int{bits}"
+    return "Int128"
+
+
+def _decimal_scale(values: _np.ndarray) -> int | None:
+    """Menor escala (0..4) que representa todos os floats; None se nenhuma serve."""
+    tol = 1e-12 * _np.maximum(1.0, _np.abs(values))
+    for scale in range(_MAX_DECIMAL_SCALE + 1):
+        if _np.all(_np.abs(_np.round(values, scale) - values) <= tol):
+            return scale
+    return None
+
+
+def _date_type(ts: pd.Series) -> str:
+    """Tipo para uma série datetime64 sem nulos."""
+    if ts.empty:
+        return "DateTime"
+    mn, mx = ts.min(), ts.max()
+    if (ts == ts.dt.normalize()).all():
+        if mn >= _DATE_MIN and mx <= _DATE_MAX:
+            return "Date"
+        if mn >= _DATE32_MIN and mx <= _DATE32_MAX:
+            return "Date32"
+    if (ts.dt.microsecond != 0).any() or (ts.dt.nanosecond != 0).any():
+        return "DateTime64(6)" if (ts.dt.microsecond % 1000 != 0).any() else "DateTime64(3)"
+    if mn >= _DATE_MIN and mx <= _DATETIME_MAX:
+        return "DateTime"
+    return "DateTime64(3)"
+
+
+def _sample(s: pd.Series, sample_rows: int) -> pd.Series:
+    if len(s) <= sample_rows:
+        return s
+    return s.sample(sample_rows, random_state=0)
+
+
+def _is_low_cardinality(distinct: int, n: int, max_distinct: int, max_ratio: float) -> bool:
+    return 0 < distinct <= max_distinct and distinct <= max_ratio * n
+
+
+def infer_column(
+    s: pd.Series,
+    sample_rows: int = 100_000,
+    low_cardinality_max: int = 10_000,
+    low_cardinality_ratio: float = 0.2,
+    decimals: bool = True,
+) -> InferredColumn:
+    """Infere o tipo compacto de uma coluna (ver docstring do módulo)."""
+    name = s.name
+    null_mask = s.isna()
+    nullable = bool(null_mask.any())
+    valid = s[~null_mask]
+    n = len(valid)
+    base = "String"
+    low_card = False
+    mn = mx = None
+    monotonic = False
+
+    if pd.api.types.is_bool_dtype(s.dtype):
+        base = "UInt8"
+        distinct = int(valid.nunique())
+    elif pd.api.types.is_integer_dtype(s.dtype):
+        mn, mx = (int(valid.min()), int(valid.max())) if n else (0, 0)
+        base = int_type_for(mn, mx)
+        distinct = int(valid.nunique())
+        monotonic = bool(n > 1 and valid.is_monotonic_increasing)
+    elif pd.api.types.is_float_dtype(s.dtype):
+        values = valid.to_numpy(dtype=_np.float64)
+        base = "Float64"
+        finite = bool(_np.isfinite(values).all())
+        if decimals and finite and n:
+            scale = _decimal_scale(values)
+            mn, mx = float(values.min()), float(values.max())
+            if scale == 0 and abs(mn) < 2**63 and abs(mx) < 2**63:
+                base = int_type_for(int(mn), int(mx))
+            elif scale is not None:
+                int_digits = len(str(int(max(abs(mn), abs(mx)))))
+                precision = int_digits + scale
+                if precision <= 18:
+                    base = f"Decimal({9 if precision <= 9 else 18}, {scale})"
+        distinct = int(valid.nunique())
+        monotonic = bool(n > 1 and valid.is_monotonic_increasing)
+    elif pd.api.types.is_datetime64_any_dtype(s.dtype):
+        ts = valid.dt.tz_convert(None) if valid.dt.tz is not None else valid
+        base = _date_type(ts)
+        mn, mx = (ts.min(), ts.max()) if n else (None, None)
+        distinct = int(ts.nunique())
+        monotonic = bool(n > 1 and ts.is_monotonic_increasing)
+    else:
+        sample = _sample(valid, sample_rows)
+        distinct = int(sample.nunique())
+        is_text = bool(sample.map(lambda v: isinstance(v, str)).all()) if len(sample) else False
+        if is_text and len(sample):
+            texts = sample.astype(str)
+            if texts.str.fullmatch(_DATE_RE).all() or texts.str.fullmatch(_DATETIME_RE).all():
+                parsed = pd.to_datetime(texts, errors="coerce", format="ISO8601")
+                if parsed.notna().all():
+                    base = _date_type(parsed)
+                    mn, mx = parsed.min(), parsed.max()
+            if base == "String":
+                low_card = _is_low_cardinality(
+                    distinct, len(sample), low_cardinality_max, low_cardinality_ratio
+                )
+
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        low_card = True
+        base = "String"
+
+    tp = f"Nullable({base})" if nullable else base
+    if low_card:
+        tp = f"LowCardinality({tp})"
+    return InferredColumn(
+        name=name, type=tp, base_type=base, nullable=nullable, distinct=distinct,
+        low_cardinality=low_card, min_value=mn, max_value=mx, monotonic=monotonic,
+    )
+
+
+def infer_schema(
+    df: pd.DataFrame,
+    sample_rows: int = 100_000,
+    low_cardinality_max: int = 10_000,
+    low_cardinality_ratio: float = 0.2,
+    decimals: bool = True,
+    datetime_nullable_cols=None,
+) -> list[InferredColumn]:
+    """
+    Infere o schema compacto de um DataFrame. Colunas em `datetime_nullable_cols`
+    são forçadas a Nullable(DateTime), como no `create_table_from_df`.
+    """
+    forced = set(datetime_nullable_cols or [])
+    columns = []
+    for col in df.columns:
+        if col in forced:
+            columns.append(InferredColumn(col, "Nullable(DateTime)", "DateTime", True, 0, False))
+            continue
+        columns.append(
+            infer_column(
+                df[col], sample_rows, low_cardinality_max, low_cardinality_ratio, decimals
+            )
+        )
+    return columns
+
+
+def _is_time(col: InferredColumn) -> bool:
+    return col.base_type.startswith(("Date", "DateTime"))
+
+
+def _low_distinct(col: InferredColumn, n_rows: int) -> bool:
+    if col.low_cardinality:
+        return True
+    if col.base_type.startswith(("Float", "Decimal")) or _is_time(col):
+        return False
+    return _is_low_cardinality(col.distinct, max(n_rows, 1), 10_000, 0.2)
+
+
+def _time_column(columns: list[InferredColumn]) -> InferredColumn | None:
+    """Coluna de tempo não-nullable com o valor mais recente (ex.: data_cadastro)."""
+    times = [c for c in columns if _is_time(c) and not c.nullable and c.max_value is not None]
+    if not times:
+        return None
+    return max(times, key=lambda c: pd.Timestamp(c.max_value))
+
+
+def suggest_order_by(columns: list[InferredColumn], n_rows: int, max_keys: int = 3) -> list[str]:
+    """
+    Chave de ordenação sugerida: colunas de baixa cardinalidade (da menor para a
+    maior) e, por último, a coluna de tempo. Colunas Nullable ficam de fora
+    (o ClickHouse não aceita chave Nullable sem `allow_nullable_key`).
+    """
+    time_col = _time_column(columns)
+    low = sorted(
+        (c for c in columns if not c.nullable and c.distinct >= 2 and _low_distinct(c, n_rows)),
+        key=lambda c: c.distinct,
+    )
+    keys = [c.name for c in low[: max_keys - (1 if time_col else 0)]]
+    if time_col is not None:
+        keys.append(time_col.name)
+    return keys
+
+
+def suggest_partition_by(columns: list[InferredColumn]) -> str | None:
+    """
+    Partição sugerida pela coluna de tempo: toYYYYMM até ~10 anos de dados,
+    toYear acima disso, nenhuma com menos de 2 meses.
+    """
+    time_col = _time_column(columns)
+    if time_col is None or time_col.min_value is None:
+        return None
+    span_days = (pd.Timestamp(time_col.max_value) - pd.Timestamp(time_col.min_value)).days
+    if span_days < 60:
+        return None
+    if span_days <= 3660:
+        return f"toYYYYMM(`{time_col.name}`)"
+    return f"toYear(`{time_col.name}`)"
+
+
+def suggest_codecs(columns: list[InferredColumn]) -> dict:
+    """
+    Codecs sugeridos: Delta+ZSTD para datas e inteiros crescentes (ids,
+    timestamps), ZSTD para textos, decimais e floats. LowCardinality já é
+    um dicionário e fica com o padrão (LZ4).
+    """
+    codecs = {}
+    for c in columns:
+        if c.low_cardinality:
+            continue
+        if c.monotonic and (_is_time(c) or "Int" in c.base_type):
+            codecs[c.name] = "Delta, ZSTD(1)"
+        elif _is_time(c):
+            codecs[c.name] = "DoubleDelta, ZSTD(1)" if c.base_type.startswith("DateTime") else "ZSTD(1)"
+        elif c.base_type == "String" or c.base_type.startswith(("Decimal", "Float")):
+            codecs[c.name] = "ZSTD(1)"
+    return codecs
+
+
+def _key_sql(keys) -> str:
+    if keys is None or keys == []:
+        return "tuple()"
+    if isinstance(keys, str):
+        return keys
+    names = [k if ("(" in k or "`" in k) else f"`{k}`" for k in keys]
+    return names[0] if len(names) == 1 else f"({', '.join(names)})"
+
+
+def create_table_sql(
+    db_name: str,
+    table_name: str,
+    columns: list[tuple[str, str]],
+    engine: str = "MergeTree()",
+    order_by=None,
+    partition_by: str | None = None,
+    codecs: dict | None = None,
+) -> str:
+    """
+    DDL `CREATE TABLE IF NOT EXISTS`. `columns` = [(nome, tipo), ...];
+    `order_by` aceita lista de colunas ou expressão; `codecs` = {coluna: "ZSTD(1)"}.
+    ORDER BY/PARTITION BY só se aplicam a engines da família MergeTree.
+    """
+    codecs = codecs or {}
+    defs = []
+    for name, tp in columns:
+        codec = codecs.get(name)
+        if codec:
+            codec = codec if codec.upper().startswith("CODEC(") else f"CODEC({codec})"
+            defs.append(f"`{name}` {tp} {codec}")
+        else:
+            defs.append(f"`{name}` {tp}")
+    columns_str = ",\n    ".join(defs)
+
+    query = f"CREATE TABLE IF NOT EXISTS {db_name}.{table_name} (\n    {columns_str}\n)\nENGINE = {engine}"
+    if "MergeTree" in engine:
+        if partition_by:
+            query += f"\nPARTITION BY {partition_by}"
+        query += f"\nORDER BY {_key_sql(order_by)}"
+    return query
@@ -1,45 +1,248 @@
 from clickhouse_driver import Client
+from clickhouse_driver.util.escape import escape_param
 import pandas as pd
 import datetime as _dt
 import numpy as _np
-from decimal import Decimal
+import os
+import re
+import time
+import shutil
+import uuid
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from clickhouse_coercion import (
+    NUMPY_INT_DTYPES,
+    coerce_series,
+    coerce_str_series,
+    coerce_float_series,
+    coerce_decimal_series,
+    coerce_uuid_series,
+    column_family,
+    result_frame,
+    strip_wrappers,
+)
+from clickhouse_pool import HEALTH_CHECK_QUERY, ClickhousePool, PooledClient
+from clickhouse_buffer import BufferedWriter
+from clickhouse_batching import (
+    AdaptiveBatchSizer,
+    batch_dedup_token,
+    estimate_row_bytes,
+    is_retryable,
+    retry_delay,
+)
+from clickhouse_cache import SchemaCache, is_read_only, referenced_tables
+from clickhouse_instrumentation import Instrumentation, InstrumentedClient, instrument_methods
+from clickhouse_native import encode_frame, http_insert
+from clickhouse_codecs import (
+    candidate_codecs,
+    codec_alter_statements,
+    recommend_codecs,
+    simulate_codecs,
+)
+from clickhouse_schema import (
+    InferredColumn,
+    create_table_sql,
+    infer_schema,
+    suggest_codecs,
+    suggest_order_by,
+    suggest_partition_by,
+)
+from clickhouse_deletes import DeletePlan, build_delete_plan
+from clickhouse_mutations import MutationHandle
+from clickhouse_hashing import HASH_COLUMN, row_hashes, split_changes
+from clickhouse_upsert import check_replacing_table, latest_view_sql, replacing_engine
+from clickhouse_parquet import (
+    arrow_schema,
+    hive_key,
+    hive_segment,
+    require_pyarrow,
+    rows_to_table,
+)
 # Se não houver airflow instalado, AirflowException vira Exception comum
 try:
     from airflow.exceptions import AirflowException
 except ImportError:
     AirflowException = Exception
 pd.set_option('display.max_columns', 50)
+
+def _qn(db_name: str, name: str) -> str:
+    """Nome qualificado com crases: `db`.`nome`."""
+    return ".".join("`" + part.replace("`", "\\`") + "`" for part in (db_name, name))
+
+
+def _sanitize_select(select_query: str) -> str:
+    """Tira espaços e ';' do fim e exige uma consulta SELECT/WITH."""
+    sql = (select_query or "").strip().rstrip(";").strip()
+    if not re.match(r"^(\(\s*)*(SELECT|WITH)\b", sql, re.IGNORECASE):
+        raise AirflowException("A consulta da view deve começar com SELECT ou WITH.")
+    return sql
+
+
+def _client_uses_numpy(client) -> bool:
+    return bool(getattr(client, "client_settings", {}).get("use_numpy"))
+
+
+def _column_payload(values, kind: str, use_numpy: bool):
+    """
+    Monta os valores de UMA coluna para o insert columnar.
+    - os coerces já entregam tipos Python nativos ou None
+    - use_numpy: Int/Float sem nulos vão como array tipado; o resto como
+      array object (o driver exige ndarray em todas as colunas)
+    - sem use_numpy: o driver exige list/tuple por coluna
+    """
+    if use_numpy:
+        has_nulls = bool(pd.isna(values).any())
+        if not has_nulls and kind in NUMPY_INT_DTYPES:
+            return values.astype(NUMPY_INT_DTYPES[kind])
+        if not has_nulls and kind == "float":
+            return values.astype(_np.float64)
+        return values
+    return values.tolist()
+
+
+@instrument_methods(exclude=("connection", "df_to_clickhouse_type"))
 class ClickhouseSync:
-    def __init__(self,host,port,user,password,database):
+    def __init__(
+        self,host,port,user,password,database,settings=None,
+        pool_min_size=1,pool_max_size=8,pool_max_idle_seconds=300,
+        query_cache=None,schema_cache_ttl=300,http_port=8123,
+        instrumentation=None,
+    ):
         ...
+        # latência, linhas e fases de cada chamada (ver clickhouse_instrumentation)
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.database = database
+        # porta da interface HTTP (usada pelo insert_df_native)
+        self.http_port = http_port
+        self._server_timezone = None
+        # settings repassados ao Client (ex: {"use_numpy": True})
+        self.settings = dict(settings or {})
+        # pool de conexões (ver clickhouse_pool): self.client faz checkout por chamada
+        self.pool_min_size = pool_min_size
+        self.pool_max_size = pool_max_size
+        self.pool_max_idle_seconds = pool_max_idle_seconds
+        self.pool = None
         self.client = None
+        # cache opcional de resultados (ver clickhouse_cache.QueryResultCache)
+        self.query_cache = query_cache
+        # DESCRIBE/EXISTS em cache por instância (None = sem expiração, 0 = desligado)
+        self.schema_cache = SchemaCache(ttl_seconds=schema_cache_ttl)
+
+    @property
+    def client(self):
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        # execute/execute_iter medidos como fase "network" da chamada atual
+        if value is not None and not isinstance(value, InstrumentedClient):
+            value = InstrumentedClient(value, self.instrumentation)
+        self._client = value
+
+    def __enter__(self):
+        if not self.client:
+            self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _new_client(self) -> Client:
+        """Cria um novo Client (conexão independente) com as configurações da instância."""
+        return Client(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            settings=self.settings
+        )
 
     def connect(self):
-        """Estabelece a conexão com o banco de dados ClickHouse."""
+        """Estabelece a conexão com o banco de dados ClickHouse (via pool de conexões)."""
         try:
-            self.client = Client(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database
+            self.pool = ClickhousePool(
+                self._new_client,
+                min_size=self.pool_min_size,
+                max_size=self.pool_max_size,
+                max_idle_seconds=self.pool_max_idle_seconds,
             )
+            self.client = PooledClient(self.pool)
             df = self.execute_query_to_df("show databases")
             print("Conexão estabelecida com sucesso!")
         except Exception as e:
             print(f"Erro ao conectar ao banco de dados: {e}")
             raise AirflowException(e)
 
+    def close(self):
+        """Fecha todas as conexões do pool."""
+        if self.pool:
+            self.pool.close()
+        self.pool = None
+        self.client = None
+
+    def _invalidate_cache(self, db_name, table_name):
+        """Descarta do query_cache os resultados que leem db_name.table_name."""
+        if self.query_cache is not None:
+            self.query_cache.invalidate_table(db_name, table_name)
+
+    def describe_table(self, db_name, table_name):
+        """
+        Retorna {coluna: ColumnSpec} (tipo, tipo base, nullable, LowCardinality,
+        família e limites de Int/UInt) a partir do schema cache; o DESCRIBE TABLE
+        só é executado em caso de miss.
+        """
+        return self.schema_cache.columns(
+            db_name, table_name,
+            lambda: self.client.execute(f"DESCRIBE TABLE {db_name}.{table_name}"),
+        )
+
+    def _column_types(self, db_name, table_name):
+        return {name: spec.type for name, spec in self.describe_table(db_name, table_name).items()}
+
+    def _invalidate_schema(self, db_name, table_name=None):
+        self.schema_cache.invalidate(db_name, table_name)
+
+    @contextmanager
+    def connection(self):
+        """
+        Empresta um Client exclusivo: `with ch.connection() as client: ...`.
+        Sem pool (client atribuído manualmente), abre um Client dedicado e o fecha no fim.
+        """
+        if self.pool:
+            with self.pool.connection() as client:
+                yield InstrumentedClient(client, self.instrumentation)
+            return
+        client = self._new_client()
+        try:
+            yield InstrumentedClient(client, self.instrumentation)
+        finally:
+            client.disconnect()
+
+    def _cap_workers(self, max_workers: int) -> int:
+        """
+        Limita threads que seguram uma conexão do pool cada a `pool_max_size`:
+        com mais threads que conexões, as excedentes esperariam o checkout e
+        estourariam o `checkout_timeout` do pool em lotes demorados.
+        """
+        if self.pool and max_workers > self.pool.max_size:
+            print(f"max_workers={max_workers} limitado ao pool_max_size={self.pool.max_size}.")
+            return self.pool.max_size
+        return max_workers
+
     def test_connection(self):
         """Realiza uma consulta simples para testar a conexão."""
         if self.client:
             try:
-                query = "SELECT version()"
+                query = HEALTH_CHECK_QUERY
                 result = self.client.execute(query)
                 print(f"Versão do ClickHouse: {result[0][0]}")
             except Exception as e:
@@ -68,6 +271,7 @@ class ClickhouseSync:
                 try:
                     query = f"DROP DATABASE IF EXISTS {db_name}"
                     self.client.execute(query)
+                    self._invalidate_schema(db_name)
                     print(f"Banco de dados '{db_name}' removido com sucesso.")
                 except Exception as e:
                     print(f"Erro ao remover o banco de dados '{db_name}': {e}")
@@ -96,6 +300,13 @@ class ClickhouseSync:
             table_name: str,
             df: pd.DataFrame,
             datetime_nullable_cols: list[str] | None = None,
+            compact_types: bool = False,
+            order_by=None,
+            partition_by: str | None = None,
+            codecs=None,
+            engine: str = "MergeTree()",
+            sample_rows: int = 100_000,
+            column_types: dict | None = None,
         ):
         """
         Cria uma tabela a partir de um DataFrame.
@@ -114,17 +325,72 @@ class ClickhouseSync:
             DataFrame de referência.
         datetime_nullable_cols : list[str] | None
             Colunas que devem ser salvas como `Nullable(DateTime)`.
+        compact_types : bool
+            Usa a inferência compacta (ver clickhouse_schema): menor Int/UInt,
+            LowCardinality(String), Date/DateTime, Decimal. Padrão: tipos do
+            `df_to_clickhouse_type`.
+        order_by : list[str] | str | None
+            Chave de ordenação (colunas ou expressão). "auto" usa a sugestão;
+            None mantém `tuple()`.
+        partition_by : str | None
+            Expressão de partição; "auto" usa a sugestão.
+        codecs : dict | str | None
+            {coluna: "ZSTD(1)"}; "auto" usa a sugestão.
+        engine : str
+            Engine da tabela (ex.: "ReplacingMergeTree(versao)").
+        sample_rows : int
+            Linhas amostradas na análise de colunas de texto (compact_types).
+        column_types : dict | None
+            {coluna: tipo ClickHouse} que substitui o tipo inferido.
         """
-        datetime_nullable_cols = set(datetime_nullable_cols or [])
-
         if not self.client:
             print("Cliente não conectado ao banco de dados.")
             return
 
         try:
             self.create_database_if_not_exists(db_name)
+            query = self.suggest_table_ddl(
+                db_name, table_name, df,
+                datetime_nullable_cols=datetime_nullable_cols,
+                compact_types=compact_types, order_by=order_by,
+                partition_by=partition_by, codecs=codecs,
+                engine=engine, sample_rows=sample_rows, column_types=column_types,
+            )
+            self.client.execute(query)
+            self._invalidate_schema(db_name, table_name)
+            print(f"Tabela '{table_name}' criada no banco '{db_name}' com sucesso.")
+        except Exception as e:
+            print(f"Erro ao criar a tabela '{table_name}': {e}")
+            raise AirflowException(e)
 
-            columns = []
+    def suggest_table_ddl(
+            self,
+            db_name: str,
+            table_name: str,
+            df: pd.DataFrame,
+            datetime_nullable_cols: list[str] | None = None,
+            compact_types: bool = True,
+            order_by="auto",
+            partition_by="auto",
+            codecs="auto",
+            engine: str = "MergeTree()",
+            sample_rows: int = 100_000,
+            column_types: dict | None = None,
+        ) -> str:
+        """
+        Monta (sem executar) o DDL sugerido para o DataFrame, para revisão antes
+        de criar a tabela. Por padrão aplica tipos compactos e as sugestões de
+        ORDER BY, PARTITION BY e codecs; o `create_table_from_df` só faz isso
+        com `compact_types=True` e "auto" nos demais (com os mesmos argumentos,
+        gera o mesmo DDL). `column_types` ({coluna: tipo}) substitui o tipo inferido.
+        """
+        if compact_types:
+            inferred = infer_schema(
+                df, sample_rows=sample_rows, datetime_nullable_cols=datetime_nullable_cols
+            )
+        else:
+            datetime_nullable_cols = set(datetime_nullable_cols or [])
+            inferred = []
             for col_name, dtype in df.dtypes.items():
                 # --- tipo base inferido ---
                 if col_name in datetime_nullable_cols:
@@ -132,61 +398,204 @@ class ClickhouseSync:
                     is_nullable = True        # sempre Nullable
                 else:
                     click_type = self.df_to_clickhouse_type(dtype)
-                    is_nullable = df[col_name].isnull().any()
-
-                if is_nullable:
-                    click_type = f"Nullable({click_type})"
+                    is_nullable = bool(df[col_name].isnull().any())
+                full_type = f"Nullable({click_type})" if is_nullable else click_type
+                # estatísticas só para as sugestões automáticas
+                series = df[col_name]
+                is_time = click_type == "DateTime" and col_name not in datetime_nullable_cols
+                inferred.append(InferredColumn(
+                    col_name, full_type, click_type, is_nullable,
+                    distinct=int(series.nunique()) if order_by == "auto" else 0,
+                    low_cardinality=False,
+                    min_value=series.min() if is_time else None,
+                    max_value=series.max() if is_time else None,
+                ))
+
+        if order_by == "auto":
+            order_by = suggest_order_by(inferred, len(df))
+        if partition_by == "auto":
+            partition_by = suggest_partition_by(inferred)
+        if codecs == "auto":
+            codecs = suggest_codecs(inferred)
+
+        column_types = column_types or {}
+        return create_table_sql(
+            db_name, table_name, [(c.name, column_types.get(c.name, c.type)) for c in inferred],
+            engine=engine, order_by=order_by, partition_by=partition_by, codecs=codecs,
+        )
 
-                columns.append(f"`{col_name}` {click_type}")
+    def benchmark_column_codecs(
+            self,
+            db_name: str,
+            table_name: str,
+            columns: list[str] | None = None,
+            sample_rows: int = 1_000_000,
+            candidates: dict | None = None,
+        ) -> pd.DataFrame:
+        """
+        Mede no servidor o tamanho comprimido de cada coluna com cada codec candidato.
 
-            columns_str = ",\n    ".join(columns)
+        Cria uma tabela temporária `_codec_bench_<tabela>` no mesmo banco, com uma
+        cópia de cada coluna por codec (ver clickhouse_codecs.candidate_codecs),
+        copia `sample_rows` linhas da origem (na ordem de leitura, como ficam
+        gravadas), junta as partes (OPTIMIZE FINAL) e lê os tamanhos de
+        `system.columns`. A tabela temporária é removida ao final.
 
-            query = f"""
-            CREATE TABLE IF NOT EXISTS {db_name}.{table_name} (
-                {columns_str}
+        Returns
+        -------
+        pd.DataFrame
+            column, type, codec, compressed_bytes, uncompressed_bytes, ratio, estimated.
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return pd.DataFrame()
+
+        column_types = self._column_types(db_name, table_name)
+        selected = [c for c in (columns or column_types) if c in column_types]
+        bench_table = f"_codec_bench_{table_name}"
+        layout = []  # (coluna de teste, coluna de origem, tipo, codec)
+        for i, col in enumerate(selected):
+            codecs = (candidates or {}).get(col) or candidate_codecs(column_types[col])
+            for k, codec in enumerate(codecs):
+                layout.append((f"c{i}_{k}", col, column_types[col], codec))
+
+        defs = ",\n    ".join(f"`{name}` {tp} CODEC({codec})" for name, _, tp, codec in layout)
+        select = ", ".join(f"`{col}`" for _, col, _, _ in layout)
+        try:
+            self.client.execute(f"DROP TABLE IF EXISTS {db_name}.{bench_table}")
+            self.client.execute(
+                f"CREATE TABLE {db_name}.{bench_table} (\n    {defs}\n) "
+                f"ENGINE = MergeTree() ORDER BY tuple()"
             )
-            ENGINE = MergeTree()
-            ORDER BY tuple()
-            """
-            self.client.execute(query)
-            print(f"Tabela '{table_name}' criada no banco '{db_name}' com sucesso.")
+            # uma thread na leitura: preserva a ordem em que os dados estão gravados
+            self.client.execute(
+                f"INSERT INTO {db_name}.{bench_table} SELECT {select} "
+                f"FROM {db_name}.{table_name} LIMIT {int(sample_rows)}",
+                settings={"max_threads": 1, "max_insert_threads": 1},
+            )
+            self.client.execute(f"OPTIMIZE TABLE {db_name}.{bench_table} FINAL")
+            sizes = {
+                name: (compressed, uncompressed)
+                for name, compressed, uncompressed in self.client.execute(
+                    "SELECT name, data_compressed_bytes, data_uncompressed_bytes "
+                    "FROM system.columns WHERE database = %(db)s AND table = %(table)s",
+                    {"db": db_name, "table": bench_table},
+                )
+            }
         except Exception as e:
-            print(f"Erro ao criar a tabela '{table_name}': {e}")
+            print(f"Erro ao medir os codecs da tabela '{table_name}': {e}")
+            raise AirflowException(e)
+        finally:
+            try:
+                self.client.execute(f"DROP TABLE IF EXISTS {db_name}.{bench_table}")
+            except Exception as e:
+                print(f"Não foi possível remover a tabela de teste '{bench_table}': {e}")
+
+        rows = []
+        for name, col, tp, codec in layout:
+            compressed, uncompressed = sizes.get(name, (0, 0))
+            rows.append({
+                "column": col,
+                "type": tp,
+                "codec": codec,
+                "compressed_bytes": compressed,
+                "uncompressed_bytes": uncompressed,
+                "ratio": uncompressed / compressed if compressed else None,
+                "estimated": False,
+            })
+        return pd.DataFrame(rows)
+
+    def suggest_column_codecs(
+            self,
+            db_name: str,
+            table_name: str,
+            df: pd.DataFrame | None = None,
+            min_gain: float = 0.05,
+            apply: bool = False,
+            **benchmark_kwargs,
+        ) -> list[str]:
+        """
+        Gera os `ALTER TABLE ... MODIFY COLUMN ... CODEC(...)` recomendados.
+
+        Sem `df`, mede no servidor (`benchmark_column_codecs`) usando a própria
+        tabela. Com `df` (amostra), simula localmente (clickhouse_codecs), com
+        os tipos da tabela se ela existir ou os tipos compactos inferidos do DF.
+        Colunas que não economizam pelo menos `min_gain` em relação ao LZ4 ficam
+        como estão. Com `apply=True` os ALTERs são executados; o novo codec vale
+        para as partes novas e para as antigas conforme forem sendo mescladas.
+
+        Returns
+        -------
+        list[str]
+            Os comandos ALTER TABLE (executados ou não).
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return []
+
+        try:
+            if df is None:
+                column_types = self._column_types(db_name, table_name)
+                results = self.benchmark_column_codecs(db_name, table_name, **benchmark_kwargs)
+            else:
+                if self.table_exists(db_name, table_name):
+                    column_types = self._column_types(db_name, table_name)
+                else:
+                    column_types = {c.name: c.type for c in infer_schema(df)}
+                results = simulate_codecs(df, column_types, **benchmark_kwargs)
+                if results["estimated"].any():
+                    print("lz4/zstandard não instalados: tamanhos estimados com zlib.")
+
+            recommendations = recommend_codecs(results, min_gain=min_gain)
+            for col, (codec, size, baseline) in recommendations.items():
+                print(
+                    f"Coluna '{col}': CODEC({codec}) {size / 1024**2:.2f} MB "
+                    f"vs LZ4 {baseline / 1024**2:.2f} MB (-{1 - size / baseline:.0%})."
+                )
+            statements = codec_alter_statements(db_name, table_name, recommendations, column_types)
+            if apply:
+                for statement in statements:
+                    self.client.execute(statement)
+                self._invalidate_schema(db_name, table_name)
+                print(f"{len(statements)} coluna(s) da tabela '{table_name}' com codec atualizado.")
+            return statements
+        except AirflowException:
+            raise
+        except Exception as e:
+            print(f"Erro ao sugerir codecs para a tabela '{table_name}': {e}")
             raise AirflowException(e)
 
     def insert_df_in_batches(self, db_name, table_name, df, batch_size=200000):
         """Insere dados de um DataFrame em uma tabela no ClickHouse em lotes de batch_size, garantindo tipos de dados compatíveis."""
         if self.client:
             try:
-                # Passo 1: Obter os tipos de dados das colunas da tabela no banco
-                query_get_types = f"DESCRIBE TABLE {db_name}.{table_name}"
-                table_schema = self.client.execute(query_get_types)
-                
-                # Criar um dicionário com os nomes das colunas e seus respectivos tipos de dados
-                column_types = {column[0]: column[1] for column in table_schema}
+                # Passo 1: Obter os tipos de dados das colunas da tabela (schema cache)
+                column_types = self._column_types(db_name, table_name)
                 
                 # Passo 2: Verificar os tipos de dados e transformar conforme necessário
-                for col in df.columns:
-                    expected_type = column_types.get(col)
-                    
-                    if expected_type:
-                        # Mapear o tipo do ClickHouse para um tipo Python equivalente (exemplo básico)
-                        if 'Int' in expected_type:
-                            df[col] = df[col].astype("Int64")
-                        elif 'Float' in expected_type:
-                            df[col] = df[col].astype(float)
-                        elif 'String' in expected_type or 'FixedString' in expected_type:
-                            df[col] = df[col].astype(str)
-                        elif 'Date' in expected_type or 'DateTime' in expected_type:
-                            df[col] = pd.to_datetime(df[col])
-                        # Aqui, você pode adicionar outros tipos conforme necessário
+                with self.instrumentation.phase("coercion"):
+                    for col in df.columns:
+                        expected_type = column_types.get(col)
+
+                        if expected_type:
+                            # Mapear o tipo do ClickHouse para um tipo Python equivalente (exemplo básico)
+                            if 'Int' in expected_type:
+                                df[col] = df[col].astype("Int64")
+                            elif 'Float' in expected_type:
+                                df[col] = df[col].astype(float)
+                            elif 'String' in expected_type or 'FixedString' in expected_type:
+                                df[col] = df[col].astype(str)
+                            elif 'Date' in expected_type or 'DateTime' in expected_type:
+                                df[col] = pd.to_datetime(df[col])
+                            # Aqui, você pode adicionar outros tipos conforme necessário
 
                 # Passo 3: Dividir o DataFrame em lotes de tamanho batch_size e inserir no banco
                 for i in range(0, len(df), batch_size):
                     batch_df = df.iloc[i:i+batch_size]
 
                     # Converter o DataFrame para uma lista de tuplas (formato esperado pelo ClickHouse)
-                    data = [tuple(x) for x in batch_df.to_numpy()]
+                    with self.instrumentation.phase("coercion"):
+                        data = [tuple(x) for x in batch_df.to_numpy()]
                     
                     # Gerar a lista de colunas para o INSERT
                     columns_str = ', '.join([f"`{col}`" for col in df.columns])
@@ -201,15 +610,198 @@ class ClickhouseSync:
             except Exception as e:
                 print(f"Erro ao inserir dados na tabela '{table_name}': {e}")
                 raise AirflowException(e)
+            finally:
+                self._invalidate_cache(db_name, table_name)
         else:
             print("Cliente não conectado ao banco de dados.")
 
+    def plan_delete(
+        self,
+        db_name: str,
+        table_name: str,
+        where: str | None = None,
+        params: dict | None = None,
+        heavy_fraction: float = 0.3,
+        allow_drop_partition: bool = True,
+    ) -> DeletePlan | None:
+        """
+        Planeja a exclusão das linhas de `where` sem apagar nada.
+
+        Lê engine/total de linhas de `system.tables`, linhas e partes ativas por
+        partição de `system.parts` e conta as linhas que casam por partição
+        (`_partition_id`). Veja `clickhouse_deletes` para as regras.
+
+        Args
+        ----
+        where : str | None
+            Condição SQL (pode usar `%(nome)s` com `params`). None = tabela toda.
+        heavy_fraction : float
+            Fração das linhas das partições afetadas a partir da qual usa
+            ALTER DELETE em vez de lightweight delete.
+        allow_drop_partition : bool
+            Se False, não usa DROP PARTITION nem TRUNCATE quando `where` casa com
+            todas as linhas (linhas inseridas durante a exclusão seriam apagadas).
+
+        Returns
+        -------
+        DeletePlan
+            strategy, statements, rows e parts estimados, partições removidas.
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return None
+
+        try:
+            info = self.client.execute(
+                "SELECT engine, total_rows FROM system.tables "
+                "WHERE database = %(db)s AND name = %(table)s",
+                {"db": db_name, "table": table_name},
+            )
+            if not info:
+                raise ValueError(f"Tabela {db_name}.{table_name} não encontrada.")
+            engine, total_rows = info[0]
+
+            partitions = {}
+            if "MergeTree" in engine:
+                partitions = {
+                    pid: (int(rows), int(parts))
+                    for pid, rows, parts in self.client.execute(
+                        "SELECT partition_id, sum(rows), count() FROM system.parts "
+                        "WHERE database = %(db)s AND table = %(table)s AND active "
+                        "GROUP BY partition_id",
+                        {"db": db_name, "table": table_name},
+                    )
+                }
+                total_rows = sum(rows for rows, _ in partitions.values())
+            elif total_rows is None:
+                total_rows = self.client.execute(f"SELECT count() FROM {db_name}.{table_name}")[0][0]
+
+            matches = {}
+            if where is not None:
+                if "MergeTree" in engine:
+                    rows = self.client.execute(
+                        f"SELECT _partition_id, count(), uniqExact(_part) "
+                        f"FROM {db_name}.{table_name} WHERE {where} GROUP BY _partition_id",
+                        params or None,
+                    )
+                    matches = {pid: (int(n), int(parts)) for pid, n, parts in rows}
+                else:
+                    n = self.client.execute(
+                        f"SELECT count() FROM {db_name}.{table_name} WHERE {where}", params or None
+                    )[0][0]
+                    matches = {"": (int(n), 0)} if n else {}
+
+            return build_delete_plan(
+                db_name, table_name, where, engine, int(total_rows or 0), partitions, matches,
+                heavy_fraction=heavy_fraction, allow_drop_partition=allow_drop_partition,
+            )
+        except Exception as e:
+            print(f"Erro ao planejar a exclusão em {db_name}.{table_name}: {e}")
+            raise AirflowException(e)
+
+    def delete_where(
+        self,
+        db_name: str,
+        table_name: str,
+        where: str | None = None,
+        params: dict | None = None,
+        dry_run: bool = False,
+        wait: bool = True,
+        timeout: float | None = None,
+        **plan_kwargs,
+    ) -> MutationHandle | None:
+        """
+        Apaga as linhas de `where` pela estratégia mais barata do `plan_delete`
+        (TRUNCATE, DROP PARTITION, lightweight DELETE ou ALTER DELETE).
+
+        Args
+        ----
+        where : str | None
+            Condição SQL (pode usar `%(nome)s` com `params`). None = tabela toda.
+        dry_run : bool
+            Só mostra o plano, sem apagar.
+        wait : bool
+            Se True (padrão), só retorna depois de as mutações terminarem. Se
+            False, retorna logo após enviá-las; acompanhe pelo handle.
+        timeout : float | None
+            Limite da espera com wait=True (MutationTimeoutError).
+        **plan_kwargs
+            heavy_fraction, allow_drop_partition (veja `plan_delete`).
+
+        Returns
+        -------
+        MutationHandle
+            `handle.plan` é o DeletePlan; `handle.status()`/`handle.wait()`
+            acompanham as mutações em system.mutations.
+
+        Exemplo
+        -------
+        handle = ch.delete_where("bi", "vendas", "data_venda < %(d)s", {"d": "2024-01-01"}, wait=False)
+        print(handle.plan.strategy, handle.plan.rows, handle.status().describe())
+        handle.wait(timeout=600)
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return None
+
+        plan = self.plan_delete(db_name, table_name, where, params, **plan_kwargs)
+        print(f"[{db_name}.{table_name}] plano de exclusão: {plan.describe()}")
+        if dry_run:
+            return MutationHandle(self.client.execute, db_name, table_name, plan=plan)
+
+        try:
+            # DROP PARTITION/TRUNCATE são síncronos; DELETE FROM e ALTER DELETE viram mutações
+            mutating = any(st.startswith("DELETE FROM") or " DELETE WHERE " in st for st in plan.statements)
+            before = self._mutation_ids(db_name, table_name) if mutating else set()
+            for statement in plan.statements:
+                settings = None
+                if statement.startswith("DELETE FROM") and not wait:
+                    settings = {"lightweight_deletes_sync": 0}
+                args = params if params and "%(" in statement else None
+                self.client.execute(statement, args, settings=settings)
+            ids = sorted(self._mutation_ids(db_name, table_name) - before) if mutating else []
+            handle = MutationHandle(self.client.execute, db_name, table_name, ids, plan=plan)
+            if wait:
+                handle.wait(timeout)
+            return handle
+        except Exception as e:
+            print(f"Erro ao deletar dados de {db_name}.{table_name}: {e}")
+            raise AirflowException(e)
+        finally:
+            self._invalidate_cache(db_name, table_name)
+
+    def _mutation_ids(self, db_name, table_name, pending_only=False):
+        """mutation_id de system.mutations para a tabela."""
+        query = (
+            "SELECT mutation_id FROM system.mutations "
+            "WHERE database = %(db)s AND table = %(table)s"
+        )
+        if pending_only:
+            query += " AND NOT is_done"
+        return {row[0] for row in self.client.execute(query, {"db": db_name, "table": table_name})}
+
+    def pending_mutations(self, db_name, table_name):
+        """
+        Handle das mutações ainda não concluídas da tabela, inclusive as de
+        outros processos: `ch.pending_mutations(db, t).wait(timeout=900)` antes
+        de disparar uma nova evita empilhar mutações.
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return None
+        try:
+            ids = sorted(self._mutation_ids(db_name, table_name, pending_only=True))
+            return MutationHandle(self.client.execute, db_name, table_name, ids)
+        except Exception as e:
+            print(f"Erro ao consultar mutações de {db_name}.{table_name}: {e}")
+            raise AirflowException(e)
+
     def clean_table(self,db_name,table_name):
         if self.client:
             try:
-                query = f"DELETE FROM {db_name}.{table_name} WHERE 1 = 1"
-                self.client.execute(query)
+                handle = self.delete_where(db_name, table_name)
                 print(f"Dados da tabela {db_name}.{table_name} deletados com sucesso")
+                return handle
             except Exception as e:
                 print(f"Erro ao inserir dados na tabela '{table_name}': {e}")
                 raise AirflowException(e)
@@ -222,14 +814,20 @@ class ClickhouseSync:
             try:
                 query = f"DROP TABLE IF EXISTS {db_name}.{table_name}"
                 self.client.execute(query)
+                self._invalidate_schema(db_name, table_name)
                 print(f"Tabela '{table_name}' no banco de dados '{db_name}' removida com sucesso.")
             except Exception as e:
                 print(f"Erro ao remover a tabela '{table_name}': {e}")
                 raise AirflowException(e)
+            finally:
+                self._invalidate_cache(db_name, table_name)
         else:
             print("Cliente não conectado ao banco de dados.")
 
-    def delete_data_by_date(self, db_name, table_name, date_column, comparator, date_value):
+    def delete_data_by_date(
+        self, db_name, table_name, date_column, comparator, date_value, wait=True, timeout=None,
+        allow_drop_partition=False,
+    ):
         """
         Apaga dados de uma tabela com base em uma comparação de datas.
         
@@ -239,6 +837,13 @@ class ClickhouseSync:
         date_column (str): Nome da coluna de data para comparação.
         comparator (str): Tipo de comparador ('>', '>=', '<', '<=', '=').
         date_value (str): Valor da data para comparação (formato 'YYYY-MM-DD').
+        wait (bool): Se False, retorna sem esperar a mutação (veja delete_where).
+        timeout (float): Limite da espera, em segundos.
+        allow_drop_partition (bool): Permite DROP PARTITION/TRUNCATE (veja plan_delete).
+            Desligado por padrão: linhas inseridas durante a exclusão seriam apagadas.
+
+        Returns:
+        MutationHandle: acompanha a mutação (status/wait).
         """
         if self.client:
             valid_comparators = ['>', '>=', '<', '<=', '=']
@@ -247,12 +852,13 @@ class ClickhouseSync:
                 return
             
             try:
-                query = f"""
-                DELETE FROM {db_name}.{table_name}
-                WHERE `{date_column}` {comparator} '{date_value}'
-                """
-                self.client.execute(query)
+                where = f"`{date_column}` {comparator} '{date_value}'"
+                handle = self.delete_where(
+                    db_name, table_name, where, wait=wait, timeout=timeout,
+                    allow_drop_partition=allow_drop_partition,
+                )
                 print(f"Dados da tabela '{table_name}' no banco '{db_name}' com '{date_column} {comparator} {date_value}' deletados com sucesso.")
+                return handle
             except Exception as e:
                 print(f"Erro ao deletar dados: {e}")
                 raise AirflowException(e)
@@ -298,8 +904,9 @@ class ClickhouseSync:
         if self.client:
             try:
                 query = f"EXISTS TABLE {db_name}.{table_name}"
-                result = self.client.execute(query)
-                exists = result[0][0] == 1
+                exists = self.schema_cache.exists(
+                    db_name, table_name, lambda: self.client.execute(query)[0][0] == 1
+                )
                 print(f"A tabela '{table_name}' no banco '{db_name}' {'existe' if exists else 'não existe'}.")
                 return exists
             except Exception as e:
@@ -309,31 +916,55 @@ class ClickhouseSync:
             print("Cliente não conectado ao banco de dados.")
             return False
         
-    def execute_query_to_df(self, query):
+    def execute_query_to_df(self, query, columnar=False, use_cache=True):
         """
         Executa uma query e retorna o resultado como um DataFrame do Pandas.
         
         Args:
         query (str): A query SQL a ser executada.
+        columnar (bool): Se True, lê o resultado por coluna (`columnar=True` do driver,
+            arrays NumPy quando o Client usa `use_numpy`) e monta o DataFrame direto
+            das colunas, com dtypes pandas por tipo do ClickHouse (Int64 nullable,
+            datetime64, category para LowCardinality). Evita as tuplas por linha.
+        use_cache (bool): Com `query_cache` configurado, usa/guarda o resultado no
+            cache (apenas queries de leitura). False força a ida ao banco.
         
         Returns:
         pd.DataFrame: DataFrame contendo os resultados da query.
         """
         if self.client:
             try:
-                # Executa a query e obtém os resultados
-                result = self.client.execute(query, with_column_types=True)
-                
-                # A função execute retorna duas coisas quando with_column_types=True:
-                # 1. A lista de resultados
-                # 2. A lista de colunas com seus tipos [(coluna, tipo), ...]
-                data, columns_info = result
-                
-                # Extrai os nomes das colunas a partir da descrição retornada
-                column_names = [col[0] for col in columns_info]
-                
-                # Retorna os resultados como um DataFrame
-                df = pd.DataFrame(data, columns=column_names)
+                cache_key = None
+                if self.query_cache is not None and use_cache and is_read_only(query):
+                    cache_key = self.query_cache.make_key(query, columnar=columnar)
+                    cached = self.query_cache.get(cache_key)
+                    if cached is not None:
+                        return cached
+
+                if columnar:
+                    columns, columns_info = self.client.execute(
+                        query, with_column_types=True, columnar=True
+                    )
+                    df = result_frame(columns, columns_info)
+                else:
+                    # Executa a query e obtém os resultados
+                    result = self.client.execute(query, with_column_types=True)
+
+                    # A função execute retorna duas coisas quando with_column_types=True:
+                    # 1. A lista de resultados
+                    # 2. A lista de colunas com seus tipos [(coluna, tipo), ...]
+                    data, columns_info = result
+
+                    # Extrai os nomes das colunas a partir da descrição retornada
+                    column_names = [col[0] for col in columns_info]
+
+                    # Monta o DataFrame com os resultados
+                    df = pd.DataFrame(data, columns=column_names)
+
+                if cache_key is not None:
+                    self.query_cache.put(cache_key, df, referenced_tables(query, self.database))
+                elif self.query_cache is not None:
+                    self.query_cache.invalidate_sql(query, self.database)
                 return df
             
             except Exception as e:
@@ -343,6 +974,160 @@ class ClickhouseSync:
             print("Cliente não conectado ao banco de dados.")
             return None
 
+    def iter_query_dfs(self, query, chunk_rows=100000, params=None, settings=None):
+        """
+        Executa uma query em streaming e gera um DataFrame a cada `chunk_rows` linhas.
+
+        Usa `execute_iter` (o driver lê o resultado bloco a bloco), então a memória
+        fica limitada a um chunk, independentemente do tamanho do resultado.
+        Se a query não retornar linhas, gera um único DataFrame vazio com as colunas.
+
+        Args:
+        query (str): A query SQL a ser executada.
+        chunk_rows (int): Linhas por DataFrame gerado.
+        params (dict): Parâmetros da query (opcional).
+        settings (dict): Settings da query (ex: {"max_block_size": 65536}).
+
+        Exemplo:
+        for df in ch.iter_query_dfs("SELECT * FROM db.vendas", chunk_rows=500_000):
+            df.to_parquet(...)
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return
+        if chunk_rows < 1:
+            raise AirflowException("chunk_rows deve ser >= 1.")
+
+        chunks = self._iter_row_chunks(query, chunk_rows, params, settings)
+        try:
+            columns_info = next(chunks, None)
+            if columns_info is None:
+                return
+            column_names = [col[0] for col in columns_info]
+
+            emitted = False
+            for chunk in chunks:
+                emitted = True
+                yield pd.DataFrame(chunk, columns=column_names)
+            if not emitted:
+                yield pd.DataFrame(columns=column_names)
+
+        except Exception as e:
+            print(f"Erro ao executar a query em streaming: {e}")
+            raise AirflowException(e)
+        finally:
+            chunks.close()
+
+    def _iter_row_chunks(self, query, chunk_rows, params=None, settings=None):
+        """
+        Gera [(coluna, tipo), ...] e depois listas de até `chunk_rows` linhas,
+        lidas em streaming com `execute_iter`.
+        """
+        rows = self.client.execute_iter(
+            query, params, with_column_types=True, settings=settings
+        )
+        try:
+            # com with_column_types=True o primeiro item é [(coluna, tipo), ...]
+            columns_info = next(rows, None)
+            if columns_info is None:
+                return
+            yield columns_info
+            while True:
+                chunk = list(islice(rows, chunk_rows))
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            # consumo interrompido: fecha o stream (o pool descarta a conexão)
+            if hasattr(rows, "close"):
+                rows.close()
+
+    def export_query_to_parquet(
+        self,
+        query: str,
+        output_file_path: str,
+        row_group_rows: int = 1_000_000,
+        compression: str = "snappy",
+        compression_level: int | None = None,
+        params: dict | None = None,
+        settings: dict | None = None,
+    ) -> int:
+        """
+        Exporta o resultado de uma query para um arquivo Parquet local, em streaming.
+
+        O resultado é lido com `execute_iter` e gravado com o ParquetWriter do
+        pyarrow, um row group a cada `row_group_rows` linhas; a memória fica
+        limitada a um row group. O schema vem dos tipos do ClickHouse (ver
+        clickhouse_parquet). O arquivo é gravado em `<caminho>.tmp` e renomeado
+        ao final, então uma exportação interrompida não deixa arquivo parcial.
+
+        Args:
+        query (str): A query SQL a ser exportada.
+        output_file_path (str): Caminho do arquivo Parquet de destino.
+        row_group_rows (int): Linhas por row group.
+        compression (str): "snappy", "zstd", "gzip", "lz4", "brotli" ou "none".
+        compression_level (int): Nível de compressão (zstd/gzip/brotli).
+        params (dict): Parâmetros da query (opcional).
+        settings (dict): Settings da query (ex: {"max_block_size": 65536}).
+
+        Returns:
+        int: Total de linhas exportadas.
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return 0
+        if row_group_rows < 1:
+            raise AirflowException("row_group_rows deve ser >= 1.")
+
+        tmp_path = f"{output_file_path}.tmp"
+        writer = None
+        chunks = None
+        try:
+            _, pq = require_pyarrow()
+            chunks = self._iter_row_chunks(query, row_group_rows, params, settings)
+            columns_info = next(chunks, None)
+            if columns_info is None:
+                raise AirflowException("A query não retornou um resultado para exportar.")
+            schema = arrow_schema(columns_info)
+            writer = pq.ParquetWriter(
+                tmp_path, schema,
+                compression=compression, compression_level=compression_level,
+            )
+
+            total = 0
+            start = time.perf_counter()
+            for group, rows in enumerate(chunks, start=1):
+                writer.write_table(rows_to_table(rows, schema), row_group_size=len(rows))
+                total += len(rows)
+                elapsed = time.perf_counter() - start
+                print(
+                    f"Row group {group} gravado em '{output_file_path}': {total} linhas "
+                    f"({total / elapsed if elapsed > 0 else 0:,.0f} linhas/s)."
+                )
+            if total == 0:
+                writer.write_table(rows_to_table([], schema))
+
+            writer.close()
+            writer = None
+            os.replace(tmp_path, output_file_path)
+            elapsed = time.perf_counter() - start
+            print(
+                f"Exportação para '{output_file_path}' concluída: {total} linhas em "
+                f"{elapsed:.1f}s ({total / elapsed if elapsed > 0 else 0:,.0f} linhas/s)."
+            )
+            return total
+
+        except Exception as e:
+            print(f"Erro ao exportar a query para Parquet: {e}")
+            raise AirflowException(e)
+        finally:
+            if chunks is not None:
+                chunks.close()
+            if writer is not None:
+                writer.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
     # Novos métodos para gerenciamento de views
     def create_view(self, db_name, view_name, select_query):
         """
@@ -364,6 +1149,7 @@ class ClickhouseSync:
                 {select_query}
                 """
                 self.client.execute(query)
+                self._invalidate_schema(db_name, view_name)
                 print(f"View '{view_name}' criada no banco de dados '{db_name}' com sucesso.")
             except Exception as e:
                 print(f"Erro ao criar a view '{view_name}': {e}")
@@ -383,6 +1169,7 @@ class ClickhouseSync:
             try:
                 query = f"DROP VIEW IF EXISTS {db_name}.{view_name}"
                 self.client.execute(query)
+                self._invalidate_schema(db_name, view_name)
                 print(f"View '{view_name}' no banco de dados '{db_name}' removida com sucesso.")
             except Exception as e:
                 print(f"Erro ao remover a view '{view_name}': {e}")
@@ -390,32 +1177,235 @@ class ClickhouseSync:
         else:
             print("Cliente não conectado ao banco de dados.")
 
-    def export_view_to_parquet(self, db_name, view_name, output_file_path):
+    def export_to_parquet_dataset(
+        self,
+        db_name: str,
+        table_name: str,
+        output_dir: str,
+        partition_by: str | None = None,
+        date_column: str | None = None,
+        date_start=None,
+        date_end=None,
+        date_freq: str = "MS",
+        hash_key: str | None = None,
+        hash_buckets: int = 8,
+        where: str | None = None,
+        max_workers: int = 4,
+        overwrite: bool = False,
+        **kwargs,
+    ) -> int:
+        """
+        Exporta uma tabela/view para um dataset Parquet particionado (padrão Hive),
+        baixando as partes em paralelo, cada uma por uma conexão do pool.
+
+        Informe exatamente um modo de divisão:
+        - `partition_by`: uma parte por valor distinto da coluna/expressão
+          (ex.: "ano_mes", "toYYYYMM(dt)"; em tabelas MergeTree "_partition_id"
+          usa as partições da própria tabela). Diretórios `coluna=valor`; se for
+          uma coluna da tabela, ela sai dos arquivos (fica só no caminho).
+        - `date_column`: faixas [início, fim) de `date_freq` (frequência do pandas:
+          "D", "W-MON", "MS", ...) entre `date_start` e `date_end` (padrão: min/max
+          da coluna). Diretórios `<coluna>_start=AAAA-MM-DD`.
+        - `hash_key`: `cityHash64(hash_key) % hash_buckets`. Diretórios `bucket=k`.
+
+        Cada parte vira `<output_dir>/<chave>=<valor>/part-0.parquet`, gravado pelo
+        `export_query_to_parquet` (kwargs: row_group_rows, compression, settings...).
+        `max_workers` é limitado a `pool_max_size` (cada parte segura uma conexão
+        durante o download).
+
+        Args:
+        where (str): Filtro adicional aplicado a todas as partes (opcional).
+        max_workers (int): Partes exportadas ao mesmo tempo.
+        overwrite (bool): Apaga `output_dir` antes, se já existir com arquivos.
+
+        Returns:
+        int: Total de linhas exportadas.
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return 0
+
+        modes = [m for m in (partition_by, date_column, hash_key) if m]
+        if len(modes) != 1:
+            raise AirflowException("Informe exatamente um entre partition_by, date_column e hash_key.")
+        if max_workers < 1:
+            raise AirflowException("max_workers deve ser >= 1.")
+        max_workers = self._cap_workers(max_workers)
+
+        if os.path.isdir(output_dir) and os.listdir(output_dir):
+            if not overwrite:
+                raise AirflowException(
+                    f"Diretório '{output_dir}' não está vazio; use overwrite=True para substituí-lo."
+                )
+            shutil.rmtree(output_dir)
+
+        source = f"{db_name}.{table_name}"
+        base_filter = f"({where})" if where else None
+        try:
+            shards, select = self._dataset_shards(
+                db_name, table_name, partition_by, date_column, date_start, date_end,
+                date_freq, hash_key, hash_buckets, base_filter,
+            )
+        except Exception as e:
+            print(f"Erro ao planejar a exportação de '{source}': {e}")
+            raise AirflowException(e)
+        print(f"Exportando '{source}' em {len(shards)} parte(s) com {max_workers} workers.")
+
+        def _export_shard(segment, condition, params):
+            # com params o driver formata a query: '%' literal do `where` vira '%%'
+            shard_filter = base_filter
+            if shard_filter and params is not None:
+                shard_filter = shard_filter.replace("%", "%%")
+            conditions = [c for c in (shard_filter, condition) if c]
+            query = f"SELECT {select} FROM {source}"
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            shard_dir = os.path.join(output_dir, segment)
+            os.makedirs(shard_dir, exist_ok=True)
+            return self.export_query_to_parquet(
+                query, os.path.join(shard_dir, "part-0.parquet"), params=params, **kwargs
+            )
+
+        start = time.perf_counter()
+        futures = {}
+        errors = {}
+        exported = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for shard in shards:
+                futures[shard[0]] = executor.submit(_export_shard, *shard)
+            for segment, future in futures.items():
+                try:
+                    exported += future.result()
+                except Exception as e:
+                    errors[segment] = e
+                    print(f"Erro na parte '{segment}': {e}")
+
+        if errors:
+            raise AirflowException(
+                f"{len(errors)} parte(s) falharam ao exportar '{source}': {sorted(errors)}"
+            )
+        elapsed = time.perf_counter() - start
+        print(
+            f"Dataset '{output_dir}' exportado: {exported} linhas em {len(shards)} parte(s), "
+            f"{elapsed:.1f}s ({exported / elapsed if elapsed > 0 else 0:,.0f} linhas/s)."
+        )
+        return exported
+
+    def _dataset_shards(
+        self, db_name, table_name, partition_by, date_column, date_start, date_end,
+        date_freq, hash_key, hash_buckets, base_filter,
+    ):
+        """Retorna ([(diretório Hive, condição SQL, params), ...], lista do SELECT)."""
+        source = f"{db_name}.{table_name}"
+        filter_sql = f" WHERE {base_filter}" if base_filter else ""
+
+        if hash_key:
+            if hash_buckets < 1:
+                raise ValueError("hash_buckets deve ser >= 1.")
+            shards = [
+                (hive_segment("bucket", k), f"cityHash64({hash_key}) % {hash_buckets} = {k}", None)
+                for k in range(hash_buckets)
+            ]
+            return shards, "*"
+
+        if partition_by:
+            values = [
+                row[0] for row in self.client.execute(
+                    f"SELECT DISTINCT {partition_by} FROM {source}{filter_sql} ORDER BY 1"
+                )
+            ]
+            key = hive_key(partition_by)
+            escaped = partition_by.replace("%", "%%")  # ex.: "id % 10", formatado com params
+            shards = [
+                (
+                    hive_segment(key, v),
+                    f"{partition_by} IS NULL" if v is None else f"{escaped} = %(v)s",
+                    None if v is None else {"v": v},
+                )
+                for v in values
+            ]
+            # coluna física: fica só no caminho (padrão Hive)
+            select = f"* EXCEPT ({partition_by})" if partition_by in self._column_types(db_name, table_name) else "*"
+            return shards, select
+
+        if date_start is None or date_end is None:
+            lo, hi = self.client.execute(f"SELECT min({date_column}), max({date_column}) FROM {source}{filter_sql}")[0]
+            if lo is None:
+                return [], "*"
+            date_start = lo if date_start is None else date_start
+        start = pd.Timestamp(date_start)
+        end = pd.Timestamp(date_end) if date_end is not None else None
+
+        stop = end if end is not None else pd.Timestamp(hi)
+        edges = [start] + [e for e in pd.date_range(start, stop, freq=date_freq) if e > start and (end is None or e < end)]
+        bounds = list(zip(edges, edges[1:] + [end]))
+        # datas à meia-noite vão como Date ('AAAA-MM-DD'), que serve para Date e DateTime
+        daily = all(e == e.normalize() for e in edges + ([end] if end is not None else []))
+
+        def _param(ts):
+            return ts.date() if daily else ts.to_pydatetime()
+
+        key = f"{hive_key(date_column)}_start"
+        column = date_column.replace("%", "%%")
+        shards = []
+        for lo, hi in bounds:
+            params = {"lo": _param(lo)}
+            condition = f"{column} >= %(lo)s"
+            if hi is not None:
+                params["hi"] = _param(hi)
+                condition += f" AND {column} < %(hi)s"
+            shards.append((hive_segment(key, _param(lo)), condition, params))
+        return shards, "*"
+
+    def export_view_to_parquet(self, db_name, view_name, output_file_path, **kwargs):
         """
-        Exporta o resultado de uma view para um arquivo Parquet.
+        Exporta o resultado de uma view para um arquivo Parquet local.
 
         Args:
             db_name (str): Nome do banco de dados.
             view_name (str): Nome da view a ser exportada.
             output_file_path (str): Caminho para o arquivo Parquet de destino.
+            **kwargs: repassados ao `export_query_to_parquet`
+                (row_group_rows, compression, compression_level, settings).
+
+        Returns:
+            int: Total de linhas exportadas.
         """
-        if self.client:
-            try:
-                query = f"COPY {db_name}.{view_name} TO '{output_file_path}' (FORMAT Parquet, COMPRESSION 'SNAPPY')"
-                self.client.execute(query)
-                print(f"View '{view_name}' exportada para o arquivo Parquet '{output_file_path}' com sucesso.")
-            except Exception as e:
-                print(f"Erro ao exportar a view '{view_name}' para Parquet: {e}")
-                raise AirflowException(e)
-        else:
+        if not self.client:
             print("Cliente não conectado ao banco de dados.")
+            return 0
+        total = self.export_query_to_parquet(
+            f"SELECT * FROM {db_name}.{view_name}", output_file_path, **kwargs
+        )
+        print(f"View '{view_name}' exportada para o arquivo Parquet '{output_file_path}' com sucesso.")
+        return total
+
+    def optimize_table(self, db_name, table_name, wait=False, timeout=None):
+        """
+        OPTIMIZE TABLE ... FINAL.
 
-    def optimize_table(self, db_name, table_name):
+        Retorna um MutationHandle que acompanha, em system.merges, os merges das
+        partes ativas no momento do OPTIMIZE (merges de fundo de partes novas
+        não contam). Em tabelas replicadas o OPTIMIZE pode retornar antes do
+        merge terminar; com wait=True o método espera esses merges acabarem
+        (respeitando `timeout`, em segundos).
+        """
         if self.client:
             try:
+                parts = [row[0] for row in self.client.execute(
+                    "SELECT name FROM system.parts "
+                    "WHERE database = %(db)s AND table = %(table)s AND active",
+                    {"db": db_name, "table": table_name},
+                )]
                 query = f"OPTIMIZE TABLE {db_name}.{table_name} FINAL"
                 self.client.execute(query)
+                handle = MutationHandle(
+                    self.client.execute, db_name, table_name, merges=True, parts=parts,
+                )
+                if wait:
+                    handle.wait(timeout)
                 print(f"Tabela '{table_name}' otimizada com sucesso.")
+                return handle
             except Exception as e:
                 print(f"Erro ao otimizar a tabela '{table_name}': {e}")
                 raise AirflowException(e)
@@ -439,6 +1429,10 @@ class ClickhouseSync:
             except Exception as e:
                 print(f"Erro ao executar o comando: {e}")
                 raise AirflowException(e)
+            finally:
+                self.schema_cache.invalidate_sql(command, self.database)
+                if self.query_cache is not None:
+                    self.query_cache.invalidate_sql(command, self.database)
         else:
             print("Cliente não conectado ao banco de dados.")
         return None
@@ -477,18 +1471,31 @@ class ClickhouseSync:
         if not self.client:
             print("Cliente não conectado ao banco de dados.")
             return
-        desc = self.client.execute(f"DESCRIBE TABLE {db_name}.{table_name}")
+        # colunas de chave (ORDER BY/PARTITION BY) não podem ser Nullable
+        key_cols = {
+            row[0] for row in self.client.execute(
+                "SELECT name FROM system.columns WHERE database = %(db)s AND table = %(table)s "
+                "AND (is_in_sorting_key OR is_in_partition_key OR is_in_primary_key)",
+                {"db": db_name, "table": table_name},
+            )
+        }
+        if key_cols:
+            print(f"Colunas de chave mantidas como estão: {sorted(key_cols)}")
         alters = []
-        for row in desc:
-            # DESCRIBE retorna: name, type, default_type, default_expression, ... (varia por versão)
-            col_name, col_type = row[0], row[1]
-            if col_name in skip:
+        for col_name, col_type in self._column_types(db_name, table_name).items():
+            if col_name in skip or col_name in key_cols:
                 continue
-            if not col_type.startswith("Nullable("):
+            if col_type.startswith("LowCardinality(") and not col_type.startswith("LowCardinality(Nullable("):
+                # Nullable fica dentro do LowCardinality
+                alters.append(f"MODIFY COLUMN `{col_name}` LowCardinality(Nullable({col_type[15:-1]}))")
+            elif not col_type.startswith(("Nullable(", "LowCardinality(")):
                 alters.append(f"MODIFY COLUMN `{col_name}` Nullable({col_type})")
         if alters:
             alter_sql = f"ALTER TABLE {db_name}.{table_name} " + ", ".join(alters)
-            self.client.execute(alter_sql)
+            try:
+                self.client.execute(alter_sql)
+            finally:
+                self._invalidate_schema(db_name, table_name)
             print("Schema atualizado: colunas convertidas para Nullable(...).")
         else:
             print("Schema já compatível: todas as colunas são Nullable(...).")
@@ -507,6 +1514,10 @@ class ClickhouseSync:
             except Exception as e:
                 print(f"Erro ao realizar a consulta: {e}")
                 raise AirflowException(e)
+            finally:
+                self.schema_cache.invalidate_sql(query, self.database)
+                if self.query_cache is not None:
+                    self.query_cache.invalidate_sql(query, self.database)
         else:
             print("Cliente não conectado ao banco de dados.")
 
@@ -551,8 +1562,8 @@ class ClickhouseSync:
             df = df.where(pd.notna(df), None)
 
             # Lê o schema da tabela de destino
-            schema = self.client.execute(f"DESCRIBE TABLE {db_name}.{table_name}")
-            column_types = {col[0]: col[1] for col in schema}
+            column_types = self._column_types(db_name, table_name)
+            t_coercion = time.perf_counter()
 
             # Descarta colunas do DF que não existem na tabela
             extra_cols = [c for c in df.columns if c not in column_types]
@@ -560,11 +1571,37 @@ class ClickhouseSync:
                 df = df.drop(columns=extra_cols)
                 print(f"Colunas ignoradas (não existem em {db_name}.{table_name}): {extra_cols}")
 
-            for col in df.columns:
-                tp = column_types[col]
-                base_tp = tp[9:-1] if tp.startswith("Nullable(") and tp.endswith(")") else tp
-                s = df[col]
-
+            def _to_int(v):
+                if v is None or (isinstance(v, float) and pd.isna(v)):
+                    return None
+                try:
+                    return int(v)
+                except Exception:
+                    return None
+
+            def _to_int_series(s):
+                # int(v) tolerante: vetorizado p/ colunas numéricas, _to_int no resto
+                out = _np.full(len(s), None, dtype=object)
+                valid = s.notna().to_numpy(dtype=bool)
+                if pd.api.types.is_bool_dtype(s.dtype):
+                    out[valid] = s[valid].to_numpy(dtype=_np.int64).astype(object)
+                elif pd.api.types.is_unsigned_integer_dtype(s.dtype):
+                    out[valid] = s[valid].to_numpy(dtype=_np.uint64).astype(object)
+                elif pd.api.types.is_integer_dtype(s.dtype):
+                    out[valid] = s[valid].to_numpy(dtype=_np.int64).astype(object)
+                elif pd.api.types.is_float_dtype(s.dtype):
+                    f = s.to_numpy(dtype=_np.float64, na_value=_np.nan)
+                    ok = _np.isfinite(f)  # int(inf) falharia -> None
+                    out[ok] = list(map(int, f[ok]))
+                else:
+                    out[valid] = list(map(_to_int, s[valid]))
+                return pd.Series(out, index=s.index, dtype=object)
+
+            for col in df.columns:
+                tp = column_types[col]
+                base_tp = tp[9:-1] if tp.startswith("Nullable(") and tp.endswith(")") else tp
+                s = df[col]
+
                 # ---- DateTime ----
                 if base_tp.startswith("DateTime"):
                     s = pd.to_datetime(s, errors="coerce", utc=False)
@@ -573,8 +1610,8 @@ class ClickhouseSync:
                             s = s.dt.tz_localize(None)
                     except Exception:
                         pass
-                    s = s.apply(lambda x: x if (pd.notna(x) and x >= ts_min) else None)
-                    df[col] = s.astype(object)
+                    s = s.where(s >= ts_min)
+                    df[col] = s.astype(object).where(s.notna(), None)
 
                 # ---- Date ----
                 elif base_tp == "Date":
@@ -584,73 +1621,33 @@ class ClickhouseSync:
                             s = s.dt.tz_localize(None)
                     except Exception:
                         pass
-                    s = s.apply(lambda x: x.date() if pd.notna(x) else None)
-                    df[col] = s.astype(object)
+                    df[col] = s.dt.date.astype(object).where(s.notna(), None)
 
                 # ---- String / FixedString ----
                 elif "String" in base_tp or base_tp.startswith("FixedString"):
                     # IMPORTANTE: evitar path datetime-like do pandas
-                    s = s.astype(object)
-                    def _to_str(v):
-                        # <<< linha decisiva contra o erro >>>
-                        if v is None or v is pd.NaT or pd.isna(v):
-                            return None
-                        if isinstance(v, (pd.Timestamp, _dt.datetime)):
-                            return v.strftime(datetime_strfmt)
-                        if isinstance(v, _dt.date):
-                            return v.strftime("%Y-%m-%d")
-                        return str(v)
-                    df[col] = s.map(_to_str).astype(object)
+                    df[col] = coerce_str_series(s, datetime_strfmt)
 
                 # ---- Inteiros (Int/UInt) ----
                 elif "Int" in base_tp or base_tp.startswith("UInt"):
-                    def _to_int(v):
-                        if v is None or (isinstance(v, float) and pd.isna(v)):
-                            return None
-                        try:
-                            return int(v)
-                        except Exception:
-                            return None
-                    df[col] = s.map(_to_int).astype(object)
+                    df[col] = _to_int_series(s)
 
                 # ---- Float ----
                 elif "Float" in base_tp:
-                    def _to_float(v):
-                        if v is None or (isinstance(v, float) and pd.isna(v)):
-                            return None
-                        try:
-                            return float(v)
-                        except Exception:
-                            return None
-                    df[col] = s.map(_to_float).astype(object)
+                    df[col] = coerce_float_series(s)
 
                 # ---- Decimal ----
                 elif base_tp.startswith("Decimal"):
-                    def _to_decimal(v):
-                        if v is None or (isinstance(v, float) and pd.isna(v)):
-                            return None
-                        try:
-                            return Decimal(str(v))
-                        except Exception:
-                            try:
-                                return float(v)
-                            except Exception:
-                                return None
-                    df[col] = s.map(_to_decimal).astype(object)
+                    df[col] = coerce_decimal_series(s)
 
                 # ---- UUID ----
                 elif base_tp == "UUID":
-                    def _to_uuid_str(v):
-                        if v is None or (isinstance(v, float) and pd.isna(v)):
-                            return None
-                        return str(v)
-                    df[col] = s.map(_to_uuid_str).astype(object)
+                    df[col] = coerce_uuid_series(s)
 
                 # ---- Default ----
                 else:
-                    def _nullify(v):
-                        return None if (v is None or (isinstance(v, float) and pd.isna(v)) or pd.isna(v)) else v
-                    df[col] = s.map(_nullify).astype(object)
+                    df[col] = s.astype(object).where(s.notna(), None)
+            self.instrumentation.add_phase("coercion", time.perf_counter() - t_coercion)
 
             # Ordem de colunas conforme o DF final (todas existentes no schema)
             cols = list(df.columns)
@@ -683,8 +1680,9 @@ class ClickhouseSync:
             # Insert em lotes
             for i in range(0, len(df), batch_size):
                 batch_df = df.iloc[i:i + batch_size]
-                data = [tuple(_clean_cell(v) for v in row)
-                        for row in batch_df.itertuples(index=False, name=None)]
+                with self.instrumentation.phase("coercion"):
+                    data = [tuple(_clean_cell(v) for v in row)
+                            for row in batch_df.itertuples(index=False, name=None)]
                 query = f"INSERT INTO {db_name}.{table_name} ({columns_str}) VALUES"
                 self.client.execute(query, data)
                 print(f"Lote {i // batch_size + 1} inserido com sucesso.")
@@ -692,6 +1690,8 @@ class ClickhouseSync:
         except Exception as e:
             print(f"Erro ao inserir dados na tabela '{table_name}': {e}")
             raise AirflowException(e)
+        finally:
+            self._invalidate_cache(db_name, table_name)
 
     def value_exists(
         self,
@@ -759,6 +1759,9 @@ class ClickhouseSync:
         date_value: str,
         filter_column: str,
         filter_value,
+        wait: bool = True,
+        timeout: float | None = None,
+        allow_drop_partition: bool = False,
     ):
         """
         Apaga dados de uma tabela com base em uma comparação de datas e uma condição adicional de igualdade.
@@ -779,6 +1782,17 @@ class ClickhouseSync:
             Nome da coluna adicional usada no filtro.
         filter_value : qualquer tipo
             Valor que deve ser igual na coluna adicional.
+        wait : bool
+            Se False, retorna sem esperar a mutação (veja delete_where).
+        timeout : float | None
+            Limite da espera, em segundos.
+        allow_drop_partition : bool
+            Permite DROP PARTITION/TRUNCATE (veja plan_delete). Desligado por
+            padrão: linhas inseridas durante a exclusão seriam apagadas.
+
+        Returns
+        -------
+        MutationHandle
 
         Exemplo
         -------
@@ -805,17 +1819,20 @@ class ClickhouseSync:
             else:
                 value_expr = str(filter_value)
 
-            query = f"""
-            DELETE FROM {db_name}.{table_name}
-            WHERE `{date_column}` {comparator} '{date_value}'
-              AND `{filter_column}` = '{value_expr}'
-            """
+            where = (
+                f"`{date_column}` {comparator} '{date_value}' "
+                f"AND `{filter_column}` = '{value_expr}'"
+            )
 
-            self.client.execute(query)
+            handle = self.delete_where(
+                db_name, table_name, where, wait=wait, timeout=timeout,
+                allow_drop_partition=allow_drop_partition,
+            )
             print(
                 f"Registros de '{db_name}.{table_name}' removidos com sucesso "
                 f"onde {date_column} {comparator} '{date_value}' e {filter_column} = {filter_value}"
             )
+            return handle
 
         except Exception as e:
             print(f"Erro ao deletar dados da tabela '{table_name}': {e}")
@@ -830,6 +1847,9 @@ class ClickhouseSync:
         value=None,
         comparator: str = "=",
         dry_run: bool = False,
+        wait: bool = True,
+        timeout: float | None = None,
+        allow_drop_partition: bool = False,
     ):
         """
         Deleta registros de {db_name}.{table_name} onde `column_name` <comparator> value.
@@ -844,6 +1864,14 @@ class ClickhouseSync:
         value : qualquer tipo | list/tuple/set (para IN/NOT IN) | ignorado em IS NULL/IS NOT NULL
         comparator : str
         dry_run : bool  -> se True, apenas mostra a contagem afetada (não deleta)
+        wait : bool     -> se False, retorna sem esperar a mutação (veja delete_where)
+        timeout : float | None -> limite da espera, em segundos
+        allow_drop_partition : bool -> permite DROP PARTITION/TRUNCATE (veja plan_delete);
+            desligado por padrão: linhas inseridas durante a exclusão seriam apagadas
+
+        Returns
+        -------
+        MutationHandle (None em dry_run)
         """
         if not self.client:
             print("Cliente não conectado ao banco de dados.")
@@ -875,23 +1903,73 @@ class ClickhouseSync:
                 params["val"] = value
                 where = f"{col} {comparator} %(val)s"
 
-            # Dry run: quantos seriam afetados?
-            count_q = f"SELECT count() FROM {db_name}.{table_name} WHERE {where}"
-            n = self.client.execute(count_q, params)[0][0]
-            msg_prefix = f"[{db_name}.{table_name}] {n} registro(s) "
+            # O plano já conta as linhas afetadas; em dry_run nada é apagado
+            handle = self.delete_where(
+                db_name, table_name, where, params, dry_run=dry_run, wait=wait, timeout=timeout,
+                allow_drop_partition=allow_drop_partition,
+            )
+            msg_prefix = f"[{db_name}.{table_name}] {handle.plan.rows} registro(s) "
             if dry_run:
                 print(msg_prefix + "seriam afetados (dry_run=True). Nenhuma exclusão realizada.")
                 return
 
-            # Executa a deleção (mutação)
-            del_q = f"DELETE FROM {db_name}.{table_name} WHERE {where}"
-            self.client.execute(del_q, params)
-            print(msg_prefix + "deletados com sucesso.")
+            if wait:
+                print(msg_prefix + "deletados com sucesso.")
+            else:
+                print(msg_prefix + f"em exclusão ({handle.status().describe()}).")
+            return handle
 
         except Exception as e:
             print(f"Erro ao deletar dados de {db_name}.{table_name}: {e}")
             raise AirflowException(e)
             
+    def _coerce_frame_for_insert(
+        self,
+        df: pd.DataFrame,
+        cols: list,
+        column_types: dict,
+        datetime_strfmt: str = "%Y-%m-%d %H:%M:%S",
+        debug_bad: bool = True,
+        debug_bad_n: int = 20,
+    ):
+        """
+        Aplica a coerção do v4 (clickhouse_coercion) nas colunas `cols` do DF.
+        Retorna ({coluna: ndarray object}, {coluna: família}).
+        """
+        bad_report = {}
+        col_kinds = {}  # família de cada coluna (usado no modo columnar)
+        coerced = {}
+
+        for col in cols:
+            tp = column_types[col]
+            base_tp, nullable = strip_wrappers(tp)
+            col_kinds[col] = column_family(base_tp)
+            out = coerce_series(df[col], tp, datetime_strfmt)
+
+            # debug dos "ruins" para Int/UInt: valida o RESULTADO FINAL
+            if debug_bad and col_kinds[col] in NUMPY_INT_DTYPES:
+                if pd.api.types.infer_dtype(out, skipna=True) not in ("integer", "empty"):
+                    bad_mask = out.map(lambda v: not (v is None or isinstance(v, (int, _np.integer))))
+                    if bool(bad_mask.any()):
+                        bad_report[col] = {
+                            "type": tp,
+                            "count": int(bad_mask.sum()),
+                            "sample": out[bad_mask].head(debug_bad_n).tolist(),
+                            "types": out[bad_mask].map(type).value_counts().head(5).to_dict(),
+                        }
+
+            coerced[col] = out.to_numpy(dtype=object)
+
+        if debug_bad and bad_report:
+            print("⚠️ Colunas Int/UInt ainda com valores inválidos após coerce:")
+            for c, info in bad_report.items():
+                print(f" - {c} ({info['type']}): {info['count']}")
+                print(f"   sample: {info['sample']}")
+                print(f"   types: {info['types']}")
+            raise AirflowException("Ainda há valores inválidos em colunas Int/UInt (ver logs).")
+
+        return coerced, col_kinds
+
     def insert_df_in_batches_v4(
         self,
         db_name: str,
@@ -901,6 +1979,18 @@ class ClickhouseSync:
         datetime_strfmt: str = "%Y-%m-%d %H:%M:%S",
         debug_bad: bool = True,
         debug_bad_n: int = 20,
+        columnar: bool = False,
+        adaptive=False,
+        target_batch_bytes: int | None = 32 * 1024 * 1024,
+        target_batch_seconds: float | None = None,
+        min_batch_size: int = 1000,
+        max_batch_size: int = 1_000_000,
+        settings: dict | None = None,
+        retries: int = 0,
+        retry_backoff: float = 1.0,
+        retry_max_backoff: float = 60.0,
+        dedup_token=None,
+        start_batch: int = 1,
     ):
         """
         Insert super robusto:
@@ -910,12 +2000,28 @@ class ClickhouseSync:
         - Detecta Int/UInt mesmo que o type venha com wrappers residuais
         - Evita pd.NA e numpy scalars no payload final
         - (debug_bad) acusa e falha se ainda sobrar algo não-int em colunas Int/UInt
+        - (columnar) envia cada lote coluna a coluna (`columnar=True` do driver),
+          sem montar tuplas por linha; com `use_numpy` nos settings do Client,
+          colunas Int/Float sem nulos seguem como arrays NumPy tipados
+        - (adaptive) tamanho de lote adaptativo (ver clickhouse_batching): cada
+          lote mira `target_batch_bytes` (estimado a partir dos valores
+          convertidos) e/ou `target_batch_seconds` (pela vazão medida), entre
+          `min_batch_size` e `max_batch_size` linhas; `batch_size` vira o
+          tamanho inicial. Aceita também um AdaptiveBatchSizer pronto, para
+          manter o histórico entre chamadas.
+        - (settings) settings do ClickHouse repassados a cada INSERT
+        - (retries) cada lote que falha por rede/timeout/sobrecarga
+          (clickhouse_batching.is_retryable) é reenviado até `retries` vezes,
+          com espera `retry_backoff` * 2^k (até `retry_max_backoff` segundos)
+        - (dedup_token) cada lote leva um `insert_deduplication_token`
+          determinístico, então um lote reenviado que já tinha sido gravado é
+          descartado pelo servidor: None = automático quando há retries ou
+          start_batch; True = hash do conteúdo do lote; str = prefixo fixo
+          (ex.: id da execução) + faixa de linhas; False = desligado.
+          Tabelas não replicadas precisam de `non_replicated_deduplication_window`.
+        - (start_batch) retoma a partir do lote N (numeração dos prints,
+          começando em 1), com o mesmo batch_size; não vale com adaptive
         """
-        import re
-        import math
-        import datetime as _dt
-        from decimal import Decimal
-
         if not self.client:
             print("Cliente não conectado ao banco de dados.")
             return
@@ -924,287 +2030,842 @@ class ClickhouseSync:
             print("DataFrame vazio; nada a inserir.")
             return
 
-        # ---------- helpers ----------
-        def _strip_wrappers(tp: str) -> tuple[str, bool]:
-            """
-            Remove LowCardinality(...) e Nullable(...) em LOOP (pode vir aninhado).
-            Retorna (base_type, is_nullable).
-            Ex:
-            Nullable(Int32) -> ("Int32", True)
-            LowCardinality(Nullable(Int32)) -> ("Int32", True)
-            Nullable(LowCardinality(Int32)) -> ("Int32", True)
-            """
-            t = tp.strip()
-            nullable = False
+        if start_batch < 1:
+            raise ValueError("start_batch começa em 1.")
+        if start_batch > 1 and adaptive:
+            raise ValueError("start_batch exige batch_size fixo (adaptive=False).")
+        if dedup_token is None:
+            dedup_token = retries > 0 or start_batch > 1
+        token_prefix = dedup_token if isinstance(dedup_token, str) else None
+
+        sizer = None
+        if isinstance(adaptive, AdaptiveBatchSizer):
+            sizer = adaptive
+        elif adaptive:
+            sizer = AdaptiveBatchSizer(
+                target_bytes=target_batch_bytes,
+                target_seconds=target_batch_seconds,
+                min_rows=min_batch_size,
+                max_rows=max_batch_size,
+                initial_rows=batch_size,
+            )
 
-            while True:
-                m = re.match(r"LowCardinality\((.+)\)$", t)
-                if m:
-                    t = m.group(1).strip()
-                    continue
+        # ---------- schema ----------
+        column_types = self._column_types(db_name, table_name)
 
-                m = re.match(r"Nullable\((.+)\)$", t)
-                if m:
-                    nullable = True
-                    t = m.group(1).strip()
-                    continue
+        # drop extras
+        extra_cols = [c for c in df.columns if c not in column_types]
+        if extra_cols:
+            print(f"Colunas ignoradas (não existem em {db_name}.{table_name}): {extra_cols}")
+        cols = [c for c in df.columns if c in column_types]
 
-                break
+        if len(cols) == 0:
+            print("Nenhuma coluna compatível com o schema de destino; nada a inserir.")
+            return
 
-            return t, nullable
+        # ---------- per-column coercion (vetorizada, ver clickhouse_coercion) ----------
+        with self.instrumentation.phase("coercion"):
+            coerced, col_kinds = self._coerce_frame_for_insert(
+                df, cols, column_types, datetime_strfmt, debug_bad, debug_bad_n
+            )
 
-        _INT_RE = re.compile(r"^[-+]?\d+([.,]\d+)?$")
+        # ---------- insert batches ----------
+        columns_str = ", ".join(f"`{c}`" for c in cols)
+        query = f"INSERT INTO {db_name}.{table_name} ({columns_str}) VALUES"
+        n_rows = len(df)
 
-        def _int_bounds(base_type: str):
-            unsigned = base_type.startswith("UInt")
-            bits = int(re.findall(r"\d+", base_type)[0])
-            if unsigned:
-                return 0, (2**bits) - 1
-            return -(2 ** (bits - 1)), (2 ** (bits - 1)) - 1
+        if columnar:
+            use_numpy = _client_uses_numpy(self.client)
+            with self.instrumentation.phase("coercion"):
+                columns_data = [
+                    _column_payload(coerced[c], col_kinds[c], use_numpy) for c in cols
+                ]
 
-        def _coerce_int(v, base_type: str, nullable: bool):
-            unsigned = base_type.startswith("UInt")
-            default = 0 if unsigned else -1
+        token_frame = df[cols] if dedup_token and token_prefix is None else None
 
-            # None / NaN / pd.NA
-            if v is None:
-                return None if nullable else default
-            try:
-                if pd.isna(v):
-                    return None if nullable else default
-            except Exception:
-                pass
+        def _send(i, j, batch_no):
+            j = min(j, n_rows)
+            if columnar:
+                data = [values[i:j] for values in columns_data]
+            else:
+                with self.instrumentation.phase("coercion"):
+                    data = list(zip(*(coerced[c][i:j].tolist() for c in cols)))
+            batch_settings = dict(settings or {})
+            if dedup_token:
+                batch_settings["insert_deduplication_token"] = batch_dedup_token(token_frame, i, j, token_prefix)
+            attempt = 0
+            while True:
+                try:
+                    self.client.execute(query, data, columnar=columnar, settings=batch_settings or None)
+                    break
+                except Exception as e:
+                    attempt += 1
+                    if attempt > retries or not is_retryable(e):
+                        resume = f" Para retomar: start_batch={batch_no}." if sizer is None else ""
+                        print(f"Lote {batch_no} (linhas {i}-{j}) falhou: {e}.{resume}")
+                        raise
+                    delay = retry_delay(attempt, retry_backoff, retry_max_backoff)
+                    print(f"Lote {batch_no} falhou ({e}); tentativa {attempt}/{retries} em {delay:.1f}s.")
+                    time.sleep(delay)
+                finally:
+                    self._invalidate_cache(db_name, table_name)
+
+        if sizer is None:
+            for i in range((start_batch - 1) * batch_size, n_rows, batch_size):
+                _send(i, i + batch_size, i // batch_size + 1)
+                print(f"Lote {i // batch_size + 1} inserido com sucesso.")
+            return
 
-            # bool
-            if isinstance(v, bool):
-                iv = int(v)
+        # ---------- lotes adaptativos ----------
+        cum_bytes = _np.cumsum(
+            estimate_row_bytes(coerced, col_kinds, {c: column_types[c] for c in cols})
+        )
+        i, batch_no = 0, 0
+        while i < n_rows:
+            n = sizer.next_rows(cum_bytes, i)
+            nbytes = int(cum_bytes[i + n - 1] - (cum_bytes[i - 1] if i > 0 else 0))
+            batch_no += 1
+            t0 = time.perf_counter()
+            _send(i, i + n, batch_no)
+            elapsed = time.perf_counter() - t0
+            sizer.observe(n, nbytes, elapsed)
+            print(
+                f"Lote {batch_no} inserido com sucesso "
+                f"({n} linhas, ~{nbytes / 1024**2:.1f} MB, {elapsed:.2f}s)."
+            )
+            i += n
+        print(sizer.summary())
 
-            # python/numpy ints
-            elif isinstance(v, (int, _np.integer)):
-                iv = int(v)
+    def insert_df_in_batches_parallel(
+        self,
+        db_name: str,
+        table_name: str,
+        df: pd.DataFrame,
+        batch_size: int = 200000,
+        max_workers: int = 4,
+        max_in_flight: int | None = None,
+        datetime_strfmt: str = "%Y-%m-%d %H:%M:%S",
+        columnar: bool = True,
+        fail_fast: bool = True,
+    ):
+        """
+        Insert paralelo com as mesmas regras de coerção do v4.
+        Cada lote é convertido e enviado por uma thread do executor, com uma
+        conexão exclusiva do pool (`self.connection()`) durante o envio, então
+        coerção e rede de lotes diferentes se sobrepõem. `max_workers` é
+        limitado a `pool_max_size` (cada thread segura uma conexão).
 
-            # float / numpy float / Decimal
-            elif isinstance(v, (float, _np.floating, Decimal)):
-                fv = float(v)
-                if math.isnan(fv) or not fv.is_integer():
-                    return None if nullable else default
-                iv = int(fv)
+        Args
+        ----
+        batch_size : int
+            Linhas por lote.
+        max_workers : int
+            Número de threads (e de conexões simultâneas), até `pool_max_size`.
+        max_in_flight : int | None
+            Máximo de lotes submetidos e ainda não concluídos (limita memória).
+            Padrão: 2 * max_workers.
+        columnar : bool
+            Envia os lotes coluna a coluna (ver `insert_df_in_batches_v4`).
+        fail_fast : bool
+            Se True, para de submeter novos lotes após a primeira falha
+            (os que já estão em andamento terminam).
 
-            else:
-                s = str(v).strip()
-                if s == "" or s.lower() in ("nan", "none", "<na>", "null"):
-                    return None if nullable else default
-                s2 = s.replace(",", ".")
-                if not _INT_RE.match(s2):
-                    return None if nullable else default
-                try:
-                    fv = float(s2)
-                except Exception:
-                    return None if nullable else default
-                if not fv.is_integer():
-                    return None if nullable else default
-                iv = int(fv)
+        Returns
+        -------
+        int
+            Total de linhas inseridas.
 
-            if unsigned and iv < 0:
-                return None if nullable else default
+        Raises
+        ------
+        AirflowException
+            Se algum lote falhar; os erros são listados na ordem dos lotes.
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return 0
 
-            mn, mx = _int_bounds(base_type)
-            if iv < mn or iv > mx:
-                return None if nullable else default
+        if df is None or df.empty:
+            print("DataFrame vazio; nada a inserir.")
+            return 0
 
-            return iv  # PYTHON INT PURO
+        if max_workers < 1:
+            raise AirflowException("max_workers deve ser >= 1.")
+        max_workers = self._cap_workers(max_workers)
+        max_in_flight = max(max_in_flight or 2 * max_workers, 1)
 
-        def _coerce_float(v, nullable: bool):
-            if v is None:
-                return None
-            try:
-                if pd.isna(v):
-                    return None
-            except Exception:
-                pass
-            try:
-                return float(v)
-            except Exception:
-                return None
+        column_types = self._column_types(db_name, table_name)
 
-        def _coerce_datetime(v, nullable: bool):
-            if v is None:
-                return None
-            try:
-                if pd.isna(v):
-                    return None
-            except Exception:
-                pass
-            ts = pd.to_datetime(v, errors="coerce", utc=False)
-            if pd.isna(ts):
-                return None
-            if isinstance(ts, pd.Timestamp):
-                if ts.tzinfo is not None:
-                    ts = ts.tz_convert(None)
-                return ts.to_pydatetime()
-            if isinstance(ts, _dt.datetime):
-                return ts.replace(tzinfo=None)
-            return None
+        extra_cols = [c for c in df.columns if c not in column_types]
+        if extra_cols:
+            print(f"Colunas ignoradas (não existem em {db_name}.{table_name}): {extra_cols}")
+        cols = [c for c in df.columns if c in column_types]
 
-        def _coerce_date(v, nullable: bool):
-            dtv = _coerce_datetime(v, nullable)
-            if dtv is None:
-                return None
-            return dtv.date()
+        if len(cols) == 0:
+            print("Nenhuma coluna compatível com o schema de destino; nada a inserir.")
+            return 0
 
-        def _coerce_str(v, nullable: bool):
-            if v is None:
-                return None
-            try:
-                if pd.isna(v):
-                    return None
-            except Exception:
-                pass
-            if isinstance(v, (pd.Timestamp, _dt.datetime)):
-                return v.strftime(datetime_strfmt)
-            if isinstance(v, _dt.date):
-                return v.strftime("%Y-%m-%d")
-            return str(v)
-
-        def _coerce_decimal(v, nullable: bool):
-            if v is None:
-                return None
-            try:
-                if pd.isna(v):
-                    return None
-            except Exception:
-                pass
+        columns_str = ", ".join(f"`{c}`" for c in cols)
+        query = f"INSERT INTO {db_name}.{table_name} ({columns_str}) VALUES"
+
+        # sinalizado pelo primeiro lote que falhar (fail_fast)
+        failed = threading.Event()
+
+        # os lotes rodam nas threads do executor: bind mantém a instrumentação desta chamada
+        @self.instrumentation.bind
+        def _insert_batch(batch_df: pd.DataFrame) -> int:
             try:
-                return Decimal(str(v))
+                with self.instrumentation.phase("coercion"):
+                    coerced, col_kinds = self._coerce_frame_for_insert(
+                        batch_df, cols, column_types, datetime_strfmt
+                    )
+                # cada lote usa uma conexão exclusiva do pool durante o envio
+                with self.connection() as client:
+                    if columnar:
+                        use_numpy = _client_uses_numpy(client)
+                        data = [_column_payload(coerced[c], col_kinds[c], use_numpy) for c in cols]
+                        client.execute(query, data, columnar=True)
+                    else:
+                        data = list(zip(*(coerced[c].tolist() for c in cols)))
+                        client.execute(query, data)
             except Exception:
+                failed.set()
+                raise
+            self._invalidate_cache(db_name, table_name)
+            return len(batch_df)
+
+        in_flight = threading.BoundedSemaphore(max_in_flight)
+        futures = {}
+        errors = {}
+        inserted = 0
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch_no, i in enumerate(range(0, len(df), batch_size), start=1):
+                in_flight.acquire()
+                # checado após a espera por vaga, quando lotes anteriores já podem ter falhado
+                if fail_fast and failed.is_set():
+                    in_flight.release()
+                    break
+                future = executor.submit(_insert_batch, df.iloc[i:i + batch_size])
+                future.add_done_callback(lambda _f: in_flight.release())
+                futures[batch_no] = future
+
+            for batch_no, future in futures.items():
                 try:
-                    return float(v)
-                except Exception:
-                    return None
+                    inserted += future.result()
+                    print(f"Lote {batch_no} inserido com sucesso.")
+                except Exception as e:
+                    errors[batch_no] = e
+                    print(f"Erro no lote {batch_no}: {e}")
 
-        # ---------- schema ----------
-        schema = self.client.execute(f"DESCRIBE TABLE {db_name}.{table_name}")
-        column_types = {col[0]: col[1] for col in schema}
+        if errors:
+            raise AirflowException(
+                f"{len(errors)} lote(s) falharam em {db_name}.{table_name}: {sorted(errors)} "
+                f"(primeiro erro, lote {min(errors)}: {errors[min(errors)]})"
+            )
+        print(f"{inserted} registros inseridos em {len(futures)} lote(s) com {max_workers} workers.")
+        return inserted
 
-        dfx = df.copy()
+    def server_timezone(self):
+        """Fuso do servidor (usado para interpretar datetimes naive em DateTime)."""
+        if self._server_timezone is None:
+            self._server_timezone = self.client.execute("SELECT timezone()")[0][0]
+        return self._server_timezone
 
-        # drop extras
-        extra_cols = [c for c in dfx.columns if c not in column_types]
-        if extra_cols:
-            dfx = dfx.drop(columns=extra_cols)
-            print(f"Colunas ignoradas (não existem em {db_name}.{table_name}): {extra_cols}")
+    def insert_df_native(
+        self,
+        db_name: str,
+        table_name: str,
+        df: pd.DataFrame,
+        batch_size: int = 1_000_000,
+        datetime_strfmt: str = "%Y-%m-%d %H:%M:%S",
+        settings: dict | None = None,
+        timeout: float = 300.0,
+    ) -> int:
+        """
+        Insert em massa no formato Native pela interface HTTP (`http_port`).
+        Mesmas coerções do `insert_df_in_batches_v4`, mas cada coluna é codificada
+        direto em bytes com NumPy (ver clickhouse_native) e o lote vai como corpo
+        de `INSERT ... FORMAT Native`, sem tuplas nem serialização valor a valor.
 
-        if dfx.empty or len(dfx.columns) == 0:
-            print("Nenhuma coluna compatível com o schema de destino; nada a inserir.")
-            return
+        Colunas de tipos sem encoder (Array, Map, Enum, ...) geram erro; use o v4.
+        DateTime sem fuso é interpretado no fuso do servidor, como no driver.
 
-        # troca NaN/NaT por None logo
-        dfx = dfx.where(pd.notna(dfx), None)
+        Returns
+        -------
+        int
+            Total de linhas inseridas.
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return 0
 
-        # ---------- per-column coercion ----------
-        bad_report = {}
+        if df is None or df.empty:
+            print("DataFrame vazio; nada a inserir.")
+            return 0
 
-        for col in dfx.columns:
-            tp = column_types[col]
-            base_tp, nullable = _strip_wrappers(tp)
-            s = dfx[col].astype("object")
+        try:
+            column_types = self._column_types(db_name, table_name)
+            extra_cols = [c for c in df.columns if c not in column_types]
+            if extra_cols:
+                print(f"Colunas ignoradas (não existem em {db_name}.{table_name}): {extra_cols}")
+            cols = [c for c in df.columns if c in column_types]
+            if len(cols) == 0:
+                print("Nenhuma coluna compatível com o schema de destino; nada a inserir.")
+                return 0
 
-            # DateTime / Date
-            if base_tp.startswith("DateTime"):
-                out = s.map(lambda v: _coerce_datetime(v, nullable))
-            elif base_tp == "Date":
-                out = s.map(lambda v: _coerce_date(v, nullable))
+            tz = self.server_timezone()
+            types = {c: column_types[c] for c in cols}
+            columns_str = ", ".join(f"`{c}`" for c in cols)
+            query = f"INSERT INTO {db_name}.{table_name} ({columns_str}) FORMAT Native"
+            url = f"http://{self.host}:{self.http_port}"
 
-            # String / FixedString
-            elif "String" in base_tp or base_tp.startswith("FixedString"):
-                out = s.map(lambda v: _coerce_str(v, nullable))
+            inserted = 0
+            for i in range(0, len(df), batch_size):
+                batch_df = df.iloc[i:i + batch_size]
+                with self.instrumentation.phase("coercion"):
+                    body = encode_frame(batch_df, types, datetime_strfmt, tz)
+                # HTTP direto (fora do driver): rede e contadores registrados aqui
+                with self.instrumentation.phase("network"):
+                    http_insert(
+                        url, query, body,
+                        user=self.user, password=self.password, database=self.database,
+                        settings=settings, timeout=timeout,
+                    )
+                self.instrumentation.add(rows_sent=len(batch_df), bytes_sent=len(body), batches=1, queries=1)
+                self._invalidate_cache(db_name, table_name)
+                inserted += len(batch_df)
+                print(f"Lote {i // batch_size + 1} inserido com sucesso ({len(body) / 1024**2:.1f} MB Native).")
+            return inserted
+        except Exception as e:
+            print(f"Erro ao inserir dados (Native) na tabela '{table_name}': {e}")
+            raise AirflowException(e)
 
-            # Decimal
-            elif base_tp.startswith("Decimal"):
-                out = s.map(lambda v: _coerce_decimal(v, nullable))
+    def buffered_writer(self, db_name: str, table_name: str, **kwargs) -> BufferedWriter:
+        """
+        Writer que agrupa DataFrames pequenos e grava por limite de linhas,
+        bytes ou tempo, numa thread em background (ver clickhouse_buffer).
 
-            # UUID
-            elif base_tp == "UUID":
-                out = s.map(lambda v: None if v is None else str(v))
+        Exemplo
+        -------
+        with ch.buffered_writer("bi", "eventos", max_rows=50_000, max_delay=2,
+                                async_insert=True) as writer:
+            writer.write(df_pequeno)
+        """
+        return BufferedWriter(self, db_name, table_name, **kwargs)
 
-            # Int/UInt (ROBUSTO: acha Int32 mesmo se vier com wrappers residuais)
+    def replace_data_atomic(
+        self,
+        db_name: str,
+        table_name: str,
+        df: pd.DataFrame,
+        mode: str = "partition",
+        replace_where: str | None = None,
+        params: dict | None = None,
+        insert_method: str = "v4",
+        staging_engine: str | None = None,
+        **insert_kwargs,
+    ) -> list:
+        """
+        Recarga atômica: grava `df` numa tabela de staging com o schema do
+        destino e troca os dados de uma vez, sem mutação e sem expor dados
+        pela metade a quem lê.
+
+        - mode="partition": `ALTER TABLE ... REPLACE PARTITION ID ... FROM staging`
+          para cada partição presente no staging (MergeTree). Partições do
+          destino que casam com `replace_where` mas não vieram no `df` são
+          removidas com DROP PARTITION.
+        - mode="table": `EXCHANGE TABLES destino AND staging` (banco Atomic).
+
+        Sem `replace_where`, as partições (ou a tabela) são substituídas
+        inteiras. Com `replace_where`, só as linhas que casam são substituídas:
+        as demais linhas das partições afetadas (ou da tabela) são copiadas
+        para o staging antes da troca. Ex.: recarga diária numa tabela
+        particionada por mês, `replace_where="data = '2025-10-01'"`.
+
+        Inserts concorrentes no destino entre a cópia e a troca se perdem; a
+        tabela de staging é removida no fim, com ou sem erro.
+
+        Args
+        ----
+        replace_where : str | None
+            Condição SQL das linhas a substituir. Com `params`, use `%(nome)s`
+            e `%%` para um '%' literal; sem `params` o texto vai como está
+            (ex.: "loja LIKE 'L%'").
+        insert_method : str
+            "v4" (insert_df_in_batches_v4) ou "native" (insert_df_native).
+        staging_engine : str | None
+            Cláusula ENGINE completa para o staging (ex.: tabelas Replicated);
+            padrão: a mesma do destino (`CREATE TABLE ... AS destino`).
+        **insert_kwargs
+            Repassados ao método de insert (batch_size, columnar, ...).
+
+        Returns
+        -------
+        list
+            partition_id substituídos/removidos (mode="partition") ou [].
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return []
+        if mode not in ("partition", "table"):
+            raise ValueError("mode deve ser 'partition' ou 'table'.")
+        inserters = {"v4": self.insert_df_in_batches_v4, "native": self.insert_df_native}
+        if insert_method not in inserters:
+            raise ValueError(f"insert_method deve ser um de {sorted(inserters)}.")
+
+        target = f"{db_name}.{table_name}"
+        staging_name = f"{table_name}__staging_{uuid.uuid4().hex[:8]}"
+        staging = f"{db_name}.{staging_name}"
+        try:
+            engine = self.client.execute(
+                "SELECT engine FROM system.tables WHERE database = %(db)s AND name = %(table)s",
+                {"db": db_name, "table": table_name},
+            )
+            if not engine:
+                raise ValueError(f"Tabela {target} não encontrada.")
+            if mode == "partition" and "MergeTree" not in engine[0][0]:
+                raise ValueError(f"mode='partition' exige MergeTree; {target} é {engine[0][0]}.")
+
+            create = f"CREATE TABLE {staging} AS {target}"
+            if staging_engine:
+                create += f" ENGINE = {staging_engine}"
+            self.client.execute(create)
+
+            if df is not None and not df.empty:
+                inserters[insert_method](db_name, staging_name, df, **insert_kwargs)
+
+            if mode == "table":
+                if replace_where is not None:
+                    self.client.execute(
+                        f"INSERT INTO {staging} SELECT * FROM {target} WHERE NOT ({replace_where})",
+                        params,
+                    )
+                self.client.execute(f"EXCHANGE TABLES {target} AND {staging}")
+                print(f"Tabela {target} substituída atomicamente (EXCHANGE TABLES).")
+                return []
+
+            staged = self._active_partitions(db_name, staging_name)
+            affected = set(staged)
+            if replace_where is not None:
+                matched = self.client.execute(
+                    f"SELECT DISTINCT _partition_id FROM {target} WHERE {replace_where}", params
+                )
+                affected |= {row[0] for row in matched}
+                if affected:
+                    # preserva as linhas das partições afetadas fora de replace_where;
+                    # os ids vão como literal para não forçar `params` (um '%' em
+                    # replace_where sem params não pode passar pela substituição)
+                    pids = escape_param(tuple(sorted(affected)), None)
+                    self.client.execute(
+                        f"INSERT INTO {staging} SELECT * FROM {target} "
+                        f"WHERE _partition_id IN {pids} AND NOT ({replace_where})",
+                        params,
+                    )
+                    staged = self._active_partitions(db_name, staging_name)
+
+            for pid in sorted(affected):
+                if pid in staged:
+                    self.client.execute(
+                        f"ALTER TABLE {target} REPLACE PARTITION ID '{pid}' FROM {staging}"
+                    )
+                else:
+                    self.client.execute(f"ALTER TABLE {target} DROP PARTITION ID '{pid}'")
+            print(f"{len(affected)} partição(ões) de {target} substituída(s) atomicamente.")
+            return sorted(affected)
+        except Exception as e:
+            print(f"Erro na recarga atômica de {target}: {e}")
+            raise AirflowException(e)
+        finally:
+            try:
+                self.client.execute(f"DROP TABLE IF EXISTS {staging}")
+            finally:
+                self._invalidate_schema(db_name, staging_name)
+                self._invalidate_schema(db_name, table_name)
+                self._invalidate_cache(db_name, table_name)
+
+    def upsert_df(
+        self,
+        db_name: str,
+        table_name: str,
+        df: pd.DataFrame,
+        key_columns: list,
+        version_column: str = "_version",
+        deleted_column: str | None = None,
+        view_name: str | None = None,
+        create_kwargs: dict | None = None,
+        **insert_kwargs,
+    ):
+        """
+        Upsert sem mutações: insere numa `ReplacingMergeTree(versao)` ordenada
+        por `key_columns`; a linha de maior versão de cada chave prevalece
+        (ver clickhouse_upsert).
+
+        - se a tabela não existe, é criada pelo `create_table_from_df` (ORDER
+          BY = chaves, engine ReplacingMergeTree, versão UInt64); se existe,
+          engine, versão e ORDER BY são validados
+        - `version_column` ausente no df é preenchida com `time.time_ns()` da
+          carga (UInt64), então a carga mais recente vence
+        - `deleted_column` (0/1): linhas com 1 apagam a chave (ReplacingMergeTree
+          com is_deleted; exige ClickHouse 23.2+)
+        - cria, se não existir, a view `view_name` (padrão `<tabela>_latest`)
+          com a última versão de cada chave via argMax, para leituras
+          deduplicadas sem FINAL
+
+        Args
+        ----
+        key_columns : list
+            Colunas que identificam a linha (sem nulos).
+        create_kwargs : dict | None
+            Repassados ao create_table_from_df (partition_by, codecs, ...).
+        **insert_kwargs
+            Repassados ao insert_df_in_batches_v4 (batch_size, retries, ...).
+
+        Returns
+        -------
+        int
+            Linhas inseridas.
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return 0
+
+        key_columns = [key_columns] if isinstance(key_columns, str) else list(key_columns)
+        missing = [c for c in key_columns if c not in df.columns]
+        if missing:
+            raise AirflowException(f"Colunas-chave ausentes no DataFrame: {missing}")
+        if df[key_columns].isnull().any().any():
+            raise AirflowException(f"As colunas-chave {key_columns} não podem ter nulos.")
+
+        frame = df
+        if version_column not in df.columns:
+            frame = df.assign(**{version_column: _np.uint64(time.time_ns())})
+        if deleted_column is not None:
+            if deleted_column not in frame.columns:
+                frame = frame.assign(**{deleted_column: _np.uint8(0)})
+            else:
+                frame = frame.assign(**{deleted_column: frame[deleted_column].fillna(0).astype("uint8")})
+
+        try:
+            if not self.table_exists(db_name, table_name):
+                kwargs = dict(create_kwargs or {})
+                forced = {version_column: "UInt64"}
+                if deleted_column is not None:
+                    forced[deleted_column] = "UInt8"
+                kwargs["column_types"] = {**forced, **kwargs.get("column_types", {})}
+                self.create_table_from_df(
+                    db_name, table_name, frame,
+                    order_by=key_columns,
+                    engine=replacing_engine(version_column, deleted_column),
+                    **kwargs,
+                )
             else:
-                m_int = re.search(r"\bU?Int(8|16|32|64)\b", base_tp)
-                if m_int:
-                    int_tp = m_int.group(0)  # Int32 / UInt16 ...
-                    out = s.map(lambda v: _coerce_int(v, int_tp, nullable))
-                elif base_tp.startswith("Float"):
-                    out = s.map(lambda v: _coerce_float(v, nullable))
+                info = self.client.execute(
+                    "SELECT engine_full, sorting_key FROM system.tables "
+                    "WHERE database = %(db)s AND name = %(table)s",
+                    {"db": db_name, "table": table_name},
+                )
+                problems = check_replacing_table(
+                    info[0][0], info[0][1], key_columns, version_column, deleted_column
+                )
+                if problems:
+                    raise AirflowException(
+                        f"{db_name}.{table_name} não serve para upsert: " + "; ".join(problems)
+                    )
+
+            self.insert_df_in_batches_v4(db_name, table_name, frame, **insert_kwargs)
+            self.create_latest_view(
+                db_name, table_name, key_columns, version_column, deleted_column, view_name
+            )
+            print(f"Upsert de {len(frame)} linha(s) em {db_name}.{table_name} concluído.")
+            return len(frame)
+        except Exception as e:
+            print(f"Erro no upsert em {db_name}.{table_name}: {e}")
+            raise AirflowException(e)
+
+    def insert_changed_rows(
+        self,
+        db_name: str,
+        table_name: str,
+        df: pd.DataFrame,
+        key_columns: list,
+        hash_column: str = HASH_COLUMN,
+        hash_columns: list | None = None,
+        upsert: bool = True,
+        version_column: str = "_version",
+        deleted_column: str | None = None,
+        where: str | None = None,
+        **insert_kwargs,
+    ) -> pd.DataFrame:
+        """
+        Insere só as linhas novas ou alteradas de `df` (ver clickhouse_hashing).
+
+        1. calcula, vetorizado, o hash de cada linha (`hash_columns`, padrão:
+           todas menos hash/versão) e o hash das chaves
+        2. lê numa única query os pares (chave, hash) já gravados; com
+           `upsert` e `version_column` na tabela vale o hash da última versão,
+           sem `upsert` basta o par existir em alguma linha
+        3. insere só as linhas cuja chave não existe ou cujo hash mudou, com o
+           hash na coluna `hash_column` (UInt64; criada com ALTER ADD COLUMN se
+           a tabela ainda não tiver)
+
+        Com upsert=False, uma tabela com linhas e sem `hash_column` é recusada:
+        as linhas atuais não têm hash, então toda a carga seria inserida de
+        novo (duplicada). Recarregue-a com a coluna de hash (`row_hashes`) antes.
+
+        Args
+        ----
+        upsert : bool
+            True (padrão): grava pelo `upsert_df` (ReplacingMergeTree), e a
+            linha alterada substitui a anterior. False: insert simples pelo
+            v4, útil em tabelas append-only (linhas alteradas coexistem com
+            as antigas).
+        where : str | None
+            Filtro da leitura dos hashes gravados, quando o df cobre só parte
+            da tabela (ex.: "data >= '2025-10-01'").
+        **insert_kwargs
+            Repassados ao upsert_df / insert_df_in_batches_v4.
+
+        Returns
+        -------
+        pd.DataFrame
+            As linhas inseridas (com a coluna de hash).
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return None
+
+        key_columns = [key_columns] if isinstance(key_columns, str) else list(key_columns)
+        hash_columns = [
+            c for c in (hash_columns or df.columns) if c not in (hash_column, version_column)
+        ]
+        try:
+            hashes = row_hashes(df, hash_columns)
+            key_hashes = row_hashes(df, key_columns)
+            stored_keys = _np.empty(0, dtype=_np.uint64)
+            stored_hashes = _np.empty(0, dtype=_np.uint64)
+
+            exists = self.table_exists(db_name, table_name)
+            if exists:
+                types = self._column_types(db_name, table_name)
+                if hash_column not in types:
+                    if not upsert and self.client.execute(
+                        f"SELECT count() FROM {db_name}.{table_name}"
+                    )[0][0]:
+                        raise ValueError(
+                            f"{db_name}.{table_name} já tem linhas sem a coluna '{hash_column}': "
+                            f"com upsert=False todas seriam inseridas de novo (duplicadas). "
+                            f"Recarregue a tabela com o hash (row_hashes) ou use upsert=True."
+                        )
+                    self.client.execute(
+                        f"ALTER TABLE {db_name}.{table_name} "
+                        f"ADD COLUMN IF NOT EXISTS `{hash_column}` UInt64"
+                    )
+                    self._invalidate_schema(db_name, table_name)
+                    print(f"Coluna '{hash_column}' adicionada em {db_name}.{table_name}.")
                 else:
-                    # fallback: só garante None pra NA
-                    out = s.map(lambda v: None if v is None else v)
+                    keys_sql = ", ".join(f"`{k}`" for k in key_columns)
+                    stored_expr = f"`{hash_column}`"
+                    if deleted_column and deleted_column in types:
+                        # chave apagada conta como ausente: o hash 0 nunca casa
+                        stored_expr = f"if(`{deleted_column}` = 1, 0, `{hash_column}`)"
+                    if upsert and version_column in types:
+                        stored_expr = f"argMax({stored_expr}, `{version_column}`)"
+                        select_sql, group_sql = "SELECT", f" GROUP BY {keys_sql}"
+                    else:
+                        # append-only: todos os pares (chave, hash) gravados
+                        select_sql, group_sql = "SELECT DISTINCT", ""
+                    where_sql = f" WHERE {where}" if where else ""
+                    stored = self.execute_query_to_df(
+                        f"{select_sql} {keys_sql}, {stored_expr} AS `__stored_hash` "
+                        f"FROM {db_name}.{table_name}{where_sql}{group_sql}",
+                        columnar=True, use_cache=False,
+                    )
+                    stored_keys = row_hashes(stored, key_columns)
+                    stored_hashes = stored["__stored_hash"].to_numpy(dtype=_np.uint64)
 
-            # debug dos "ruins" para Int/UInt: valida o RESULTADO FINAL
-            if debug_bad:
-                m_chk = re.search(r"\bU?Int(8|16|32|64)\b", base_tp)
-                if m_chk:
-                    def _is_ok_int(v):
-                        if v is None:
-                            return True
-                        return isinstance(v, (int, _np.integer))  # python int ou numpy int
-
-                    bad_mask = out.map(lambda v: not _is_ok_int(v))
-                    if bool(bad_mask.any()):
-                        bad_report[col] = {
-                            "type": tp,
-                            "count": int(bad_mask.sum()),
-                            "sample": out[bad_mask].head(debug_bad_n).tolist(),
-                            "types": out[bad_mask].map(type).value_counts().head(5).to_dict(),
-                        }
+            new, changed = split_changes(
+                key_hashes, hashes, stored_keys, stored_hashes, latest_only=upsert
+            )
+            mask = new | changed
+            out = df[mask].assign(**{hash_column: hashes[mask]})
+            print(
+                f"[{db_name}.{table_name}] {int(new.sum())} linha(s) nova(s), "
+                f"{int(changed.sum())} alterada(s), {int((~mask).sum())} sem mudança "
+                f"de {len(df)}."
+            )
+            if out.empty:
+                return out
+
+            create_kwargs = {"column_types": {hash_column: "UInt64"}}
+            if upsert:
+                self.upsert_df(
+                    db_name, table_name, out, key_columns,
+                    version_column=version_column, deleted_column=deleted_column,
+                    create_kwargs=create_kwargs, **insert_kwargs,
+                )
+            else:
+                if not exists:
+                    self.create_table_from_df(
+                        db_name, table_name, out, order_by=key_columns, **create_kwargs
+                    )
+                self.insert_df_in_batches_v4(db_name, table_name, out, **insert_kwargs)
+            return out
+        except Exception as e:
+            print(f"Erro na carga incremental de {db_name}.{table_name}: {e}")
+            raise AirflowException(e)
+
+    def create_latest_view(
+        self,
+        db_name: str,
+        table_name: str,
+        key_columns: list,
+        version_column: str = "_version",
+        deleted_column: str | None = None,
+        view_name: str | None = None,
+        or_replace: bool = False,
+    ) -> str:
+        """
+        Cria (se não existir) a view com a última versão de cada chave de uma
+        ReplacingMergeTree (argMax por coluna, sem FINAL). Retorna o nome da view.
+        """
+        key_columns = [key_columns] if isinstance(key_columns, str) else list(key_columns)
+        view_name = view_name or f"{table_name}_latest"
+        columns = list(self.describe_table(db_name, table_name))
+        select_sql = latest_view_sql(
+            db_name, table_name, columns, key_columns, version_column, deleted_column
+        )
+        self.create_view_engine(
+            db_name, view_name, select_sql,
+            kind="view", if_not_exists=not or_replace, or_replace=or_replace,
+        )
+        return view_name
+
+    def _active_partitions(self, db_name, table_name):
+        """partition_id das partes ativas da tabela."""
+        return {
+            row[0] for row in self.client.execute(
+                "SELECT DISTINCT partition_id FROM system.parts "
+                "WHERE database = %(db)s AND table = %(table)s AND active",
+                {"db": db_name, "table": table_name},
+            )
+        }
 
-            dfx[col] = out.astype("object")
+    def load_csv_streaming(
+        self,
+        db_name: str,
+        table_name: str,
+        csv_path: str,
+        sep: str = ";",
+        encoding: str = "utf-8-sig",
+        chunk_rows: int = 100000,
+        sample_rows: int = 10000,
+        datetime_nullable_cols: list[str] | None = None,
+        create_table: bool = True,
+        prefetch_chunks: int = 2,
+        read_csv_kwargs: dict | None = None,
+        **insert_kwargs,
+    ) -> int:
+        """
+        Carrega um CSV em streaming: lê `chunk_rows` linhas por vez e insere cada
+        chunk com `insert_df_in_batches_v4`, sem carregar o arquivo inteiro.
+
+        - o schema é inferido de uma amostra (`sample_rows` linhas) e, se a tabela
+          ainda não existir, é criada com `create_table_from_df` e todas as
+          colunas viram Nullable (a amostra não garante ausência de nulos no resto)
+        - colunas só com nulos na amostra viram `Nullable(String)`: o tipo real é
+          desconhecido e String aceita qualquer valor que apareça depois
+        - uma thread lê/parseia o próximo chunk enquanto o atual é inserido; no
+          máximo `prefetch_chunks` chunks ficam em memória à espera
+        - `insert_kwargs` vai para o v4 (ex: columnar=True, adaptive=True)
 
-        if debug_bad and bad_report:
-            print("⚠️ Colunas Int/UInt ainda com valores inválidos após coerce:")
-            for c, info in bad_report.items():
-                print(f" - {c} ({info['type']}): {info['count']}")
-                print(f"   sample: {info['sample']}")
-                print(f"   types: {info['types']}")
-            raise AirflowException("Ainda há valores inválidos em colunas Int/UInt (ver logs).")
+        Returns
+        -------
+        int
+            Total de linhas inseridas.
+        """
+        if not self.client:
+            print("Cliente não conectado ao banco de dados.")
+            return 0
+        if chunk_rows < 1:
+            raise AirflowException("chunk_rows deve ser >= 1.")
 
-        # ---------- insert batches ----------
-        cols = list(dfx.columns)
-        columns_str = ", ".join(f"`{c}`" for c in cols)
-        query = f"INSERT INTO {db_name}.{table_name} ({columns_str}) VALUES"
+        read_kwargs = dict(read_csv_kwargs or {})
+        read_kwargs.setdefault("sep", sep)
+        read_kwargs.setdefault("encoding", encoding)
+        insert_kwargs.setdefault("batch_size", chunk_rows)
 
-        def _clean_cell(v):
-            # None / NaT / NA / NaN
-            if v is None or v is pd.NaT:
-                return None
-            try:
-                if pd.isna(v):
-                    return None
-            except Exception:
-                pass
+        try:
+            if create_table and not self.table_exists(db_name, table_name):
+                sample = pd.read_csv(csv_path, nrows=sample_rows, **read_kwargs)
+                all_null = [
+                    c for c in sample.columns
+                    if sample[c].isna().all() and c not in (datetime_nullable_cols or [])
+                ]
+                if all_null:
+                    print(
+                        f"[AVISO] Colunas sem valores na amostra ({sample_rows} linhas), "
+                        f"criadas como Nullable(String): {all_null}"
+                    )
+                self.create_table_from_df(
+                    db_name, table_name, sample, datetime_nullable_cols=datetime_nullable_cols,
+                    column_types={c: "Nullable(String)" for c in all_null},
+                )
+                self.ensure_all_columns_nullable(db_name, table_name)
+                del sample
+        except Exception as e:
+            print(f"Erro ao preparar a tabela '{table_name}' para o CSV: {e}")
+            raise AirflowException(e)
 
-            # numpy scalars -> python nativo (inclusive np.int64, np.float64)
-            if isinstance(v, _np.generic):
-                v = v.item()
+        chunks = queue.Queue(maxsize=max(prefetch_chunks, 1))
+        stop = threading.Event()
+        done = object()
 
-            # pandas Timestamp -> datetime python tz-naive
-            if isinstance(v, pd.Timestamp):
+        def _put(item):
+            while not stop.is_set():
                 try:
-                    if v.tzinfo is not None:
-                        v = v.tz_convert(None)
-                    return v.to_pydatetime()
-                except Exception:
-                    return None
+                    chunks.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
 
-            return v
+        def _reader():
+            try:
+                with pd.read_csv(csv_path, chunksize=chunk_rows, **read_kwargs) as reader:
+                    for chunk in reader:
+                        if stop.is_set():
+                            return
+                        _put(chunk)
+            except BaseException as e:
+                _put(e)
+            finally:
+                _put(done)
+
+        reader_thread = threading.Thread(target=_reader, name="csv-reader", daemon=True)
+        reader_thread.start()
+
+        total = 0
+        n_chunks = 0
+        try:
+            while True:
+                item = chunks.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                self.insert_df_in_batches_v4(db_name, table_name, item, **insert_kwargs)
+                n_chunks += 1
+                total += len(item)
+                print(f"Chunk {n_chunks}: {len(item)} linhas inseridas (total {total}).")
+        except Exception as e:
+            print(f"Erro ao carregar o CSV '{csv_path}' em '{db_name}.{table_name}': {e}")
+            raise AirflowException(e)
+        finally:
+            stop.set()
+            reader_thread.join()
+
+        print(f"{total} registros do CSV '{csv_path}' inseridos em {n_chunks} chunk(s).")
+        return total
 
-        for i in range(0, len(dfx), batch_size):
-            batch_df = dfx.iloc[i:i + batch_size]
-            data = [
-                tuple(_clean_cell(x) for x in row)
-                for row in batch_df.itertuples(index=False, name=None)
-            ]
-            self.client.execute(query, data)
-            print(f"Lote {i // batch_size + 1} inserido com sucesso.")
     def create_view_engine(
             self,
             db_name: str,
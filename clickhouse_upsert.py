@@ -0,0 +1,100 @@
+"""
+Upsert com ReplacingMergeTree para o ClickhouseSync.
+
+Em vez de `DELETE ... WHERE chave IN (...)` + INSERT (uma mutação por carga),
+cada carga só insere: a tabela é `ReplacingMergeTree(versao)` ordenada pelas
+colunas-chave, e entre linhas com a mesma chave vale a de maior versão. Os
+merges em background descartam as antigas; até lá, a leitura deduplicada sem
+FINAL é feita por uma view com argMax:
+
+    SELECT k, argMax(tuple(src.c), src.versao).1 AS c, ..., max(src.versao) AS versao
+    FROM db.tabela AS src GROUP BY k
+
+`argMax` ignora argumentos NULL: `argMax(src.c, ...)` devolveria o último
+valor não nulo de `c`, misturando versões. Dentro de uma tupla o NULL conta
+como valor e a linha inteira vem da versão mais recente. As colunas são
+qualificadas (`src.`) para o ClickHouse não confundir a coluna com o alias de
+mesmo nome do agregado.
+
+Exclusões também viram inserts: com `deleted_column` (UInt8) a engine é
+`ReplacingMergeTree(versao, deleted)` e a view filtra as chaves cuja última
+versão está marcada como apagada.
+"""
+import re
+
+
+def _ident(name: str) -> str:
+    return "`" + name.replace("`", "\\`") + "`"
+
+
+def replacing_engine(version_column: str, deleted_column: str | None = None) -> str:
+    """`ReplacingMergeTree(versao[, deleted])`."""
+    args = _ident(version_column)
+    if deleted_column:
+        args += f", {_ident(deleted_column)}"
+    return f"ReplacingMergeTree({args})"
+
+
+def _split_key(expr: str) -> list[str]:
+    return [part.strip().strip("`") for part in expr.split(",") if part.strip()]
+
+
+def check_replacing_table(
+    engine_full: str,
+    sorting_key: str,
+    key_columns: list,
+    version_column: str,
+    deleted_column: str | None = None,
+) -> list[str]:
+    """
+    Problemas que impedem o upsert numa tabela existente (lista vazia = ok).
+
+    `engine_full` e `sorting_key` vêm de system.tables.
+    """
+    problems = []
+    match = re.match(r"^(?:Shared|Replicated)?ReplacingMergeTree\((.*?)\)", engine_full or "")
+    if not match:
+        return [f"a engine deve ser ReplacingMergeTree (atual: {engine_full})"]
+    args = _split_key(match.group(1))
+    # Replicated: os dois primeiros argumentos são o caminho no Keeper e a réplica
+    if args and args[0].startswith("'"):
+        args = args[2:]
+    if not args or args[0] != version_column:
+        problems.append(f"a versão da engine deve ser '{version_column}' (atual: {args[:1] or 'nenhuma'})")
+    if deleted_column and args[1:2] != [deleted_column]:
+        problems.append(f"a engine deve usar '{deleted_column}' como coluna de exclusão")
+    if _split_key(sorting_key) != list(key_columns):
+        problems.append(
+            f"o ORDER BY deve ser exatamente as colunas-chave {list(key_columns)} (atual: {sorting_key})"
+        )
+    return problems
+
+
+def _latest(col: str, version_column: str) -> str:
+    # tupla: argMax ignora NULL, tuple(NULL) não
+    return f"argMax(tuple(src.{_ident(col)}), src.{_ident(version_column)}).1"
+
+
+def latest_view_sql(
+    db_name: str,
+    table_name: str,
+    columns: list,
+    key_columns: list,
+    version_column: str,
+    deleted_column: str | None = None,
+) -> str:
+    """SELECT deduplicado (última versão por chave) para `create_view_engine`."""
+    selects = [_ident(k) for k in key_columns]
+    for col in columns:
+        if col in key_columns or col == version_column:
+            continue
+        selects.append(f"{_latest(col, version_column)} AS {_ident(col)}")
+    selects.append(f"max(src.{_ident(version_column)}) AS {_ident(version_column)}")
+    sql = (
+        f"SELECT {', '.join(selects)} "
+        f"FROM {_ident(db_name)}.{_ident(table_name)} AS src "
+        f"GROUP BY {', '.join(_ident(k) for k in key_columns)}"
+    )
+    if deleted_column:
+        sql += f" HAVING {_latest(deleted_column, version_column)} = 0"
+    return sql
@@ -2,6 +2,7 @@
 """
 Carregamento de dados CSV para ClickHouse
 Este script lê um arquivo CSV com pandas, cria database e tabela, e insere os dados.
+A carga é feita em streaming (chunks), então o arquivo não precisa caber na memória.
 """
 
 import os
@@ -34,16 +35,16 @@ def main():
     print("-" * 50)
     
     try:
-        # 1. Carrega o CSV com pandas
-        print("1. Carregando arquivo CSV...")
+        # 1. Carrega uma amostra do CSV com pandas
+        print("1. Carregando amostra do arquivo CSV...")
         if not os.path.exists(csv_file):
             print(f"❌ Arquivo {csv_file} não encontrado!")
             print("Execute o script gerar_dados_exemplo.py primeiro.")
             return 1
         
-        # Lê o CSV (separado por ponto e vírgula conforme o arquivo de exemplo)
-        df = pd.read_csv(csv_file, sep=';', encoding='utf-8-sig')
-        print(f"✅ CSV carregado: {len(df)} registros, {len(df.columns)} colunas")
+        # Lê só o início do CSV (separado por ponto e vírgula conforme o arquivo de exemplo)
+        df = pd.read_csv(csv_file, sep=';', encoding='utf-8-sig', nrows=10000)
+        print(f"✅ Amostra carregada: {len(df)} registros, {len(df.columns)} colunas")
         print(f"Colunas: {list(df.columns)}")
         
         # Exibe informações sobre o DataFrame
@@ -71,33 +72,27 @@ def main():
         clickhouse.create_database_if_not_exists(db_name)
         print(f"✅ Database '{db_name}' criado ou já existe")
         
-        # 4. Cria a tabela a partir do DataFrame
-        print(f"\n4. Criando tabela '{table_name}' a partir do DataFrame...")
+        # 4. Cria a tabela (schema inferido de uma amostra) e insere em streaming
+        print(f"\n4. Criando tabela '{table_name}' e inserindo os registros em streaming...")
         
         # Define colunas de data que devem ser tratadas como DateTime nullable
         datetime_cols = ['data_nascimento', 'data_cadastro']
         
-        clickhouse.create_table_from_df(
+        total_inserted = clickhouse.load_csv_streaming(
             db_name=db_name,
             table_name=table_name,
-            df=df,
-            datetime_nullable_cols=datetime_cols
+            csv_path=csv_file,
+            sep=';',
+            encoding='utf-8-sig',
+            chunk_rows=100000,
+            datetime_nullable_cols=datetime_cols,
+            datetime_strfmt="%Y-%m-%d %H:%M:%S",
+            adaptive=True,  # Lotes dimensionados por bytes (~32 MB), não por linhas
         )
-        print(f"✅ Tabela '{table_name}' criada com sucesso!")
+        print(f"✅ {total_inserted} registros inseridos com sucesso!")
         
-        # 5. Insere os dados
-        print(f"\n5. Inserindo {len(df)} registros na tabela...")
-        clickhouse.insert_df_in_batches_v3(
-            db_name=db_name,
-            table_name=table_name,
-            df=df,
-            batch_size=1000,  # Processamento em lotes de 1000 registros
-            datetime_strfmt="%Y-%m-%d %H:%M:%S"
-        )
-        print(f"✅ {len(df)} registros inseridos com sucesso!")
-        
-        # 6. Verifica os dados inseridos
-        print(f"\n6. Verificando dados inseridos...")
+        # 5. Verifica os dados inseridos
+        print(f"\n5. Verificando dados inseridos...")
         count_query = f"SELECT COUNT(*) as total FROM {db_name}.{table_name}"
         df_count = clickhouse.execute_query_to_df(count_query)
         total_records = df_count.iloc[0]['total']
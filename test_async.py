@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Testes do AsyncClickhouseSync (clickhouse_async) sem servidor ClickHouse.
+Um `Client` falso atrás de um ClickhousePool/PooledClient reais: queries
+"SELECT block" só terminam quando a conexão é derrubada (`disconnect`).
+
+Execução: python -m pytest -q test_async.py (ou python test_async.py)
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from clickhouse_async import AsyncClickhouseSync
+from clickhouse_pool import ClickhousePool, PooledClient
+
+
+class FakeServer:
+    """Estado compartilhado pelos clientes falsos: queries executadas e pico de concorrência."""
+
+    def __init__(self, delays=None):
+        # query -> segundos de execução
+        self.delays = delays or {}
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.executed = []   # (query, thread ident)
+        self.clients = []
+        self.blocked = threading.Event()
+
+
+class FakeClient:
+    def __init__(self, server):
+        self.server = server
+        self.disconnected = threading.Event()
+        self.last_query = None
+        server.clients.append(self)
+
+    def execute(self, query, params=None, with_column_types=False, **kwargs):
+        server = self.server
+        with server.lock:
+            server.executed.append((query, threading.get_ident()))
+            server.running += 1
+            server.peak = max(server.peak, server.running)
+        try:
+            if query == "SELECT block":
+                server.blocked.set()
+                # como o driver: a query só é interrompida derrubando a conexão
+                if not self.disconnected.wait(5):
+                    raise AssertionError("query bloqueada não foi cancelada")
+                raise EOFError("Unexpected EOF while reading bytes")
+            time.sleep(server.delays.get(query, 0))
+        finally:
+            with server.lock:
+                server.running -= 1
+        rows = [(query,)]
+        return (rows, [("q", "String")]) if with_column_types else rows
+
+    def disconnect(self):
+        self.disconnected.set()
+
+
+def _async_client(server, max_concurrency):
+    ch = AsyncClickhouseSync("localhost", 9000, "u", "p", "db", max_concurrency=max_concurrency)
+    ch.sync.pool = ClickhousePool(lambda: FakeClient(server), min_size=0, max_size=max_concurrency)
+    ch.sync.client = PooledClient(ch.sync.pool)
+    return ch
+
+
+async def _wait_blocked(server):
+    loop = asyncio.get_running_loop()
+    assert await loop.run_in_executor(None, server.blocked.wait, 5)
+
+
+def test_max_concurrency_limita_execucoes_simultaneas():
+    server = FakeServer(delays={f"SELECT {i}": 0.05 for i in range(8)})
+
+    async def main():
+        ch = _async_client(server, max_concurrency=3)
+        await asyncio.gather(*(ch.execute_query_to_df(f"SELECT {i}") for i in range(8)))
+        await ch.close()
+
+    asyncio.run(main())
+    assert len(server.executed) == 8
+    assert server.peak == 3
+    assert len(server.clients) <= 3
+
+
+def test_execute_many_retorna_na_ordem_de_entrada():
+    # as primeiras queries terminam por último
+    queries = [f"SELECT {i}" for i in range(6)]
+    server = FakeServer(delays={q: 0.06 - 0.01 * i for i, q in enumerate(queries)})
+
+    async def main():
+        ch = _async_client(server, max_concurrency=6)
+        dfs = await ch.execute_many(queries)
+        await ch.close()
+        return dfs
+
+    dfs = asyncio.run(main())
+    assert [df["q"].iloc[0] for df in dfs] == queries
+    finished = [q for q, _ in server.executed]
+    assert sorted(finished) == queries
+
+
+async def _assert_conexao_descartada(pool, server):
+    assert server.clients[0].disconnected.is_set()
+    # a thread cancelada termina em seguida; a conexão derrubada não volta ao pool
+    deadline = time.monotonic() + 5
+    while pool.size and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    assert (pool.size, pool.idle_count) == (0, 0)
+
+
+def test_cancelar_task_derruba_a_conexao_e_descarta_do_pool():
+    server = FakeServer()
+
+    async def main():
+        ch = _async_client(server, max_concurrency=2)
+        task = asyncio.create_task(ch.execute_query_to_df("SELECT block"))
+        await _wait_blocked(server)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await _assert_conexao_descartada(ch.sync.pool, server)
+        await ch.close()
+
+    asyncio.run(main())
+
+
+def test_timeout_do_wait_for_derruba_a_conexao_e_descarta_do_pool():
+    server = FakeServer()
+
+    async def main():
+        ch = _async_client(server, max_concurrency=2)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(ch.execute_query_to_df("SELECT block"), timeout=0.1)
+        await _assert_conexao_descartada(ch.sync.pool, server)
+        await ch.close()
+
+    asyncio.run(main())
+
+
+def test_chamada_cancelada_antes_de_comecar_nao_executa():
+    server = FakeServer()
+
+    async def main():
+        ch = _async_client(server, max_concurrency=1)
+        first = asyncio.create_task(ch.execute_query_to_df("SELECT block"))
+        await _wait_blocked(server)
+        # aguarda o semáforo: cancelada antes de chegar ao executor
+        waiting = asyncio.create_task(ch.execute_query_to_df("SELECT nunca"))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        first.cancel()
+        await asyncio.gather(first, waiting, return_exceptions=True)
+        await ch.close()
+
+    asyncio.run(main())
+    assert [q for q, _ in server.executed] == ["SELECT block"]
+
+
+def test_chamada_cancelada_na_fila_do_executor_nao_executa():
+    calls = []
+    release = threading.Event()
+
+    async def main():
+        ch = AsyncClickhouseSync("localhost", 9000, "u", "p", "db", max_concurrency=2)
+        ch._ensure_executor()
+        # uma única thread: a segunda chamada fica na fila do executor
+        ch._executor.shutdown()
+        ch._executor = ThreadPoolExecutor(max_workers=1)
+        first = asyncio.create_task(ch._run(release.wait, 5))
+        queued = asyncio.create_task(ch._run(calls.append, "executou"))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        release.set()
+        assert await first
+        await ch.close()
+
+    asyncio.run(main())
+    assert calls == []
+
+
+def test_reset_cancel_libera_a_thread_para_a_proxima_chamada():
+    server = FakeServer()
+
+    async def main():
+        # uma thread só: a chamada seguinte reutiliza a thread cancelada
+        ch = _async_client(server, max_concurrency=1)
+        task = asyncio.create_task(ch.execute_query_to_df("SELECT block"))
+        await _wait_blocked(server)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        df = await ch.execute_query_to_df("SELECT 1")
+        await ch.close()
+        return df
+
+    df = asyncio.run(main())
+    assert df["q"].tolist() == ["SELECT 1"]
+    (_, blocked_thread), (_, next_thread) = server.executed
+    assert blocked_thread == next_thread
+    assert len(server.clients) == 2  # conexão nova no lugar da derrubada
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
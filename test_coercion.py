@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Equivalência da coerção vetorizada (clickhouse_coercion.coerce_series) com os
+conversores célula a célula do insert_df_in_batches_v4 original, sem servidor.
+
+Execução: python -m pytest -q test_coercion.py (ou python test_coercion.py)
+"""
+
+import datetime as _dt
+import math
+import re
+from decimal import Decimal
+
+import numpy as _np
+import pandas as pd
+import pytest
+
+from clickhouse_coercion import coerce_series, strip_wrappers
+
+# números como DateTime viram nanossegundos nos dois caminhos
+pytestmark = pytest.mark.filterwarnings("ignore:Discarding nonzero nanoseconds")
+
+
+# ---------- v4 original (célula a célula) ----------
+_INT_RE = re.compile(r"^[-+]?\d+([.,]\d+)?$")
+STRFMT = "%Y-%m-%d %H:%M:%S"
+
+
+def _int_bounds(base_type):
+    unsigned = base_type.startswith("UInt")
+    bits = int(re.findall(r"\d+", base_type)[0])
+    if unsigned:
+        return 0, (2**bits) - 1
+    return -(2 ** (bits - 1)), (2 ** (bits - 1)) - 1
+
+
+def _old_int(v, base_type, nullable):
+    unsigned = base_type.startswith("UInt")
+    default = 0 if unsigned else -1
+    if v is None:
+        return None if nullable else default
+    try:
+        if pd.isna(v):
+            return None if nullable else default
+    except Exception:
+        pass
+    if isinstance(v, bool):
+        iv = int(v)
+    elif isinstance(v, (int, _np.integer)):
+        iv = int(v)
+    elif isinstance(v, (float, _np.floating, Decimal)):
+        fv = float(v)
+        if math.isnan(fv) or not fv.is_integer():
+            return None if nullable else default
+        iv = int(fv)
+    else:
+        s = str(v).strip()
+        if s == "" or s.lower() in ("nan", "none", "<na>", "null"):
+            return None if nullable else default
+        s2 = s.replace(",", ".")
+        if not _INT_RE.match(s2):
+            return None if nullable else default
+        try:
+            fv = float(s2)
+        except Exception:
+            return None if nullable else default
+        if not fv.is_integer():
+            return None if nullable else default
+        iv = int(fv)
+    if unsigned and iv < 0:
+        return None if nullable else default
+    mn, mx = _int_bounds(base_type)
+    if iv < mn or iv > mx:
+        return None if nullable else default
+    return iv
+
+
+def _is_na(v):
+    if v is None:
+        return True
+    try:
+        return bool(pd.isna(v))
+    except Exception:
+        return False
+
+
+def _old_float(v):
+    if _is_na(v):
+        return None
+    try:
+        return float(v)
+    except Exception:
+        return None
+
+
+def _old_datetime(v):
+    if _is_na(v):
+        return None
+    ts = pd.to_datetime(v, errors="coerce", utc=False)
+    if pd.isna(ts):
+        return None
+    if isinstance(ts, pd.Timestamp):
+        if ts.tzinfo is not None:
+            ts = ts.tz_convert(None)
+        return ts.to_pydatetime()
+    if isinstance(ts, _dt.datetime):
+        return ts.replace(tzinfo=None)
+    return None
+
+
+def _old_date(v):
+    dtv = _old_datetime(v)
+    return None if dtv is None else dtv.date()
+
+
+def _old_str(v):
+    if _is_na(v):
+        return None
+    if isinstance(v, (pd.Timestamp, _dt.datetime)):
+        return v.strftime(STRFMT)
+    if isinstance(v, _dt.date):
+        return v.strftime("%Y-%m-%d")
+    return str(v)
+
+
+def _old_decimal(v):
+    if _is_na(v):
+        return None
+    try:
+        return Decimal(str(v))
+    except Exception:
+        try:
+            return float(v)
+        except Exception:
+            return None
+
+
+def _old_clean_cell(v):
+    if v is None or v is pd.NaT:
+        return None
+    try:
+        if pd.isna(v):
+            return None
+    except Exception:
+        pass
+    if isinstance(v, _np.generic):
+        v = v.item()
+    if isinstance(v, pd.Timestamp):
+        try:
+            if v.tzinfo is not None:
+                v = v.tz_convert(None)
+            return v.to_pydatetime()
+        except Exception:
+            return None
+    return v
+
+
+def old_v4(series, tp):
+    """
+    Pipeline do v4 original: nulos -> None, coluna como object, conversor por
+    célula e `_clean_cell`. Os resultados ficam numa lista (o `Series.map` do
+    original deixaria o pandas 3 reinferir [1, None] como float).
+    """
+    cells = [None if na else v for v, na in zip(series.astype(object), series.isna())]
+    base_tp, nullable = strip_wrappers(tp)
+    if base_tp.startswith("DateTime"):
+        convert = _old_datetime
+    elif base_tp == "Date":
+        convert = _old_date
+    elif "String" in base_tp or base_tp.startswith("FixedString"):
+        convert = _old_str
+    elif base_tp.startswith("Decimal"):
+        convert = _old_decimal
+    elif base_tp == "UUID":
+        convert = lambda v: None if v is None else str(v)  # noqa: E731
+    else:
+        m_int = re.search(r"\bU?Int(8|16|32|64)\b", base_tp)
+        if m_int:
+            convert = lambda v: _old_int(v, m_int.group(0), nullable)  # noqa: E731
+        elif base_tp.startswith("Float"):
+            convert = _old_float
+        else:
+            convert = lambda v: v  # noqa: E731
+    return [_old_clean_cell(convert(v)) for v in cells]
+
+
+# ---------- entradas ----------
+TZ_TIMES = pd.to_datetime(["2024-03-01 10:00", None, "2024-03-02 23:30"]).tz_localize("America/Sao_Paulo")
+
+INPUTS = {
+    "float_nan": pd.Series([1.0, _np.nan, 2.5, -3.0]),
+    "object_mixed_nulls": pd.Series([1, None, _np.nan, pd.NA, "7", 2.0], dtype=object),
+    "numpy_scalars": pd.Series([_np.int64(3), _np.float64(4.0), _np.int32(-2), None], dtype=object),
+    "nullable_int": pd.Series([1, None, -5, 2**31], dtype="Int64"),
+    "nullable_uint": pd.Series([1, None, 300], dtype="UInt16"),
+    "nullable_float": pd.Series([1.5, None, 2.0], dtype="Float64"),
+    "bool": pd.Series([True, False, True]),
+    "nullable_bool": pd.Series([True, None, False], dtype="boolean"),
+    "strings": pd.Series(["a", None, "10", "1,0", " 3 ", "null", ""], dtype=object),
+    "string_dtype": pd.Series(["x", None, "5"], dtype="string"),
+    "cat_int_nulls": pd.Series(pd.Categorical([1, 2, None])),
+    "cat_str_nulls": pd.Series(pd.Categorical(["a", None, "b"])),
+    "cat_float": pd.Series(pd.Categorical([1.5, None, 2.0])),
+    "datetime_naive": pd.Series(pd.to_datetime(["2024-01-01 08:00", None, "2024-12-31 00:00"])),
+    "datetime_tz": pd.Series(TZ_TIMES),
+    "dates_object": pd.Series([_dt.date(2024, 1, 2), None, _dt.date(2023, 5, 6)], dtype=object),
+    "datetime_strings": pd.Series(["2024-01-01 10:00:00", "lixo", None], dtype=object),
+    "decimals": pd.Series([Decimal("1.25"), None, Decimal("-3")], dtype=object),
+}
+
+TYPES = [
+    "Int32", "Nullable(Int32)", "UInt8", "Nullable(UInt64)", "Int64",
+    "Float64", "Nullable(Float32)",
+    "String", "Nullable(String)", "LowCardinality(String)", "LowCardinality(Nullable(String))",
+    "DateTime", "Nullable(DateTime)", "Date", "Nullable(Date)",
+    "Decimal(18, 4)", "UUID",
+]
+
+
+def _same(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    return type(a) is type(b) and a == b
+
+
+@pytest.mark.parametrize("tp", TYPES)
+@pytest.mark.parametrize("name", sorted(INPUTS))
+def test_coerce_series_igual_ao_v4_original(name, tp):
+    series = INPUTS[name]
+    expected = old_v4(series, tp)
+    got = coerce_series(series, tp, STRFMT).tolist()
+    diffs = [(i, e, g) for i, (e, g) in enumerate(zip(expected, got)) if not _same(e, g)]
+    assert not diffs, diffs
+
+
+def test_categorico_inteiro_com_nulos_vira_texto_sem_casas_decimais():
+    s = pd.Series(pd.Categorical([1, 2, None]))
+    for tp in ("String", "Nullable(String)", "LowCardinality(String)"):
+        assert coerce_series(s, tp).tolist() == ["1", "2", None]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Testes do planejador de exclusões (clickhouse_deletes.build_delete_plan) com
+estatísticas montadas à mão, sem servidor ClickHouse.
+
+Execução: python -m pytest -q test_deletes.py (ou python test_deletes.py)
+"""
+
+import pytest
+
+from clickhouse_deletes import build_delete_plan
+
+# {partition_id: (linhas, partes ativas)}
+PARTITIONS = {"202401": (1000, 3), "202402": (1000, 2), "202403": (1000, 4)}
+TOTAL = 3000
+WHERE = "data < '2024-03-01'"
+
+
+def _plan(where, matches, engine="MergeTree", partitions=PARTITIONS, **kwargs):
+    total = sum(r for r, _ in partitions.values())
+    return build_delete_plan("db", "vendas", where, engine, total, partitions, matches, **kwargs)
+
+
+def test_nenhuma_linha_casa():
+    plan = _plan(WHERE, {})
+    assert (plan.strategy, plan.statements, plan.rows) == ("noop", [], 0)
+    assert _plan(WHERE, {"202401": (0, 0)}).strategy == "noop"
+
+
+@pytest.mark.parametrize("allow_drop_partition", [True, False])
+def test_sem_condicao_usa_truncate(allow_drop_partition):
+    plan = _plan(None, {}, allow_drop_partition=allow_drop_partition)
+    assert plan.strategy == "truncate"
+    assert plan.statements == ["TRUNCATE TABLE db.vendas"]
+    assert (plan.rows, plan.parts) == (TOTAL, 9)
+
+
+def test_condicao_que_casa_com_tudo_vira_truncate_com_allow_drop_partition():
+    matches = {pid: (rows, parts) for pid, (rows, parts) in PARTITIONS.items()}
+    plan = _plan(WHERE, matches, allow_drop_partition=True)
+    assert plan.statements == ["TRUNCATE TABLE db.vendas"]
+
+
+def test_condicao_que_casa_com_tudo_sem_allow_drop_partition_nao_trunca_nem_dropa():
+    matches = {pid: (rows, parts) for pid, (rows, parts) in PARTITIONS.items()}
+    plan = _plan(WHERE, matches, allow_drop_partition=False)
+    assert plan.strategy == "alter_delete"
+    assert plan.statements == [f"ALTER TABLE db.vendas DELETE WHERE {WHERE}"]
+    assert plan.partitions == []
+    assert not any("TRUNCATE" in s or "DROP PARTITION" in s for s in plan.statements)
+
+
+def test_particao_inteira_vira_drop_partition():
+    matches = {"202401": (1000, 3), "202402": (50, 1)}
+    plan = _plan(WHERE, matches, allow_drop_partition=True)
+    assert plan.strategy == "drop_partition+lightweight_delete"
+    assert plan.statements == [
+        "ALTER TABLE db.vendas DROP PARTITION ID '202401'",
+        f"DELETE FROM db.vendas WHERE {WHERE}",
+    ]
+    assert plan.partitions == ["202401"]
+    assert (plan.rows, plan.parts, plan.fraction) == (1050, 4, 0.05)
+
+
+def test_so_particoes_inteiras():
+    matches = {"202401": (1000, 3), "202402": (1000, 2)}
+    plan = _plan(WHERE, matches, allow_drop_partition=True)
+    assert plan.strategy == "drop_partition"
+    assert plan.partitions == ["202401", "202402"]
+    assert len(plan.statements) == 2
+
+
+def test_particao_inteira_sem_allow_drop_partition_vira_delete():
+    plan = _plan(WHERE, {"202401": (1000, 3)}, allow_drop_partition=False)
+    assert plan.partitions == []
+    assert plan.strategy == "alter_delete"  # 100% da partição afetada
+
+
+@pytest.mark.parametrize("rows, strategy, statement", [
+    (100, "lightweight_delete", f"DELETE FROM db.vendas WHERE {WHERE}"),
+    (299, "lightweight_delete", f"DELETE FROM db.vendas WHERE {WHERE}"),
+    (300, "alter_delete", f"ALTER TABLE db.vendas DELETE WHERE {WHERE}"),
+    (900, "alter_delete", f"ALTER TABLE db.vendas DELETE WHERE {WHERE}"),
+])
+def test_lightweight_ou_alter_delete_pelo_heavy_fraction(rows, strategy, statement):
+    plan = _plan(WHERE, {"202401": (rows, 2)}, heavy_fraction=0.3)
+    assert plan.strategy == strategy
+    assert plan.statements == [statement]
+    assert plan.fraction == rows / 1000
+
+
+def test_fracao_considera_so_as_particoes_afetadas():
+    # 200 de 3000 linhas na tabela, mas 200 de 500 nas partições afetadas
+    partitions = {"a": (250, 1), "b": (250, 1), "c": (2500, 5)}
+    plan = _plan(WHERE, {"a": (100, 1), "b": (100, 1)}, partitions=partitions, heavy_fraction=0.3)
+    assert plan.fraction == 0.4
+    assert plan.strategy == "alter_delete"
+
+
+def test_engine_fora_de_mergetree():
+    plan = _plan(WHERE, {"all": (10, 1)}, engine="Memory", partitions={"all": (100, 1)})
+    assert plan.strategy == "alter_delete"
+    plan = _plan(WHERE, {"all": (100, 1)}, engine="Memory", partitions={"all": (100, 1)})
+    assert plan.strategy == "truncate"
+    plan = _plan(WHERE, {"all": (100, 1)}, engine="Memory", partitions={"all": (100, 1)},
+                 allow_drop_partition=False)
+    assert plan.strategy == "alter_delete"
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
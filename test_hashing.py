@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Testes do hash de linhas (clickhouse_hashing) sem servidor ClickHouse.
+
+Execução: python -m pytest -q test_hashing.py (ou python test_hashing.py)
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from clickhouse_hashing import row_hashes, split_changes
+
+KEYS = [-(2**31), -1, 0, 1, 2**31 - 1]
+
+
+@pytest.mark.parametrize("dtype", ["int8", "int16", "int32", "Int8", "Int16", "Int32", "Int64"])
+def test_inteiros_com_sinal_tem_o_mesmo_hash_em_qualquer_largura(dtype):
+    keys = [k for k in KEYS if np.iinfo(dtype.lower()).min <= k <= np.iinfo(dtype.lower()).max]
+    expected = row_hashes(pd.DataFrame({"k": pd.Series(keys, dtype="int64")}))
+    got = row_hashes(pd.DataFrame({"k": pd.Series(keys, dtype=dtype)}))
+    assert (got == expected).all()
+
+
+@pytest.mark.parametrize("dtype", ["uint8", "uint16", "uint32", "uint64", "UInt32", "UInt64"])
+def test_inteiros_sem_sinal_tem_o_mesmo_hash_que_int64(dtype):
+    keys = [0, 1, 200]
+    expected = row_hashes(pd.DataFrame({"k": pd.Series(keys, dtype="int64")}))
+    got = row_hashes(pd.DataFrame({"k": pd.Series(keys, dtype=dtype)}))
+    assert (got == expected).all()
+
+
+def test_nulos_em_inteiros_nullable():
+    a = row_hashes(pd.DataFrame({"k": pd.Series([-1, None, 3], dtype="Int32")}))
+    b = row_hashes(pd.DataFrame({"k": pd.Series([-1, None, 3], dtype="Int64")}))
+    assert (a == b).all()
+
+
+def test_chaves_negativas_gravadas_como_int32_nao_parecem_novas():
+    # carga com int64 (pandas); leitura columnar de uma coluna Int32 devolve int32
+    df = pd.DataFrame({"id": np.array([-5, -1, 0, 7], dtype=np.int64), "v": ["a", "b", "c", "d"]})
+    stored = pd.DataFrame({"id": df["id"].astype(np.int32)})
+    hashes = row_hashes(df, ["id", "v"])
+    stored_hashes = hashes.copy()
+    stored_hashes[1] = 0  # id -1 alterado
+
+    new, changed = split_changes(
+        row_hashes(df, ["id"]), hashes, row_hashes(stored, ["id"]), stored_hashes
+    )
+    assert not new.any()
+    assert changed.tolist() == [False, True, False, False]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
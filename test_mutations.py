@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Testes do MutationHandle (clickhouse_mutations) sem servidor ClickHouse.
+Um `execute` falso responde às consultas em system.mutations e system.merges.
+
+Execução: python -m pytest -q test_mutations.py (ou python test_mutations.py)
+"""
+
+import pytest
+
+from clickhouse_mutations import MutationFailedError, MutationHandle, MutationTimeoutError
+
+
+class FakeSystem:
+    """system.mutations/system.merges em memória; `tick` roda a cada consulta de mutações."""
+
+    def __init__(self, mutations=None, merges=None, tick=None):
+        # mutation_id -> [is_done, parts_to_do, latest_fail_reason]
+        self.mutations = mutations or {}
+        # (is_mutation, source_part_names, total_size_bytes_compressed, progress)
+        self.merges = merges or []
+        self.tick = tick
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+        if "FROM system.mutations" in query:
+            if self.tick is not None:
+                self.tick(self)
+            return [
+                (mid, is_done, parts, reason)
+                for mid, (is_done, parts, reason) in self.mutations.items()
+                if mid in params["ids"]
+            ]
+        if "FROM system.merges" in query:
+            rows = [
+                m for m in self.merges
+                if m[0] == params["mutation"]
+                and ("parts" not in params or set(m[1]) & set(params["parts"]))
+            ]
+            return [(
+                len(rows),
+                sum(m[2] for m in rows),
+                sum(m[2] * m[3] for m in rows),
+            )]
+        raise AssertionError(f"consulta inesperada: {query}")
+
+
+def _handle(system, **kwargs):
+    return MutationHandle(system.execute, "db", "vendas", **kwargs)
+
+
+def test_status_pendente_e_concluida():
+    system = FakeSystem(
+        mutations={"m1": [0, 3, ""], "m2": [1, 0, ""]},
+        merges=[(1, ["p1"], 1000, 0.25)],
+    )
+    handle = _handle(system, mutation_ids=["m1", "m2"])
+
+    progress = handle.status()
+    assert not progress.done
+    assert (progress.mutations_left, progress.parts_to_do, progress.merges) == (1, 3, 1)
+    assert (progress.bytes_total, progress.bytes_done) == (1000, 250)
+
+    system.mutations["m1"] = [1, 0, ""]
+    system.merges.clear()
+    assert handle.status().done
+
+    # concluído fica em cache: não consulta de novo
+    n_queries = len(system.queries)
+    assert handle.done()
+    assert len(system.queries) == n_queries
+
+
+def test_mutacao_removida_conta_como_concluida():
+    system = FakeSystem(mutations={})
+    assert _handle(system, mutation_ids=["m1"]).status().done
+
+
+def test_wait_ate_concluir():
+    def tick(system):
+        is_done, parts, reason = system.mutations["m1"]
+        system.mutations["m1"] = [int(parts <= 1), parts - 1, reason]
+
+    system = FakeSystem(mutations={"m1": [0, 3, ""]}, tick=tick)
+    seen = []
+    progress = _handle(system, mutation_ids=["m1"]).wait(
+        timeout=5, poll_interval=0.001, on_progress=seen.append,
+    )
+    assert progress.done
+    assert [p.parts_to_do for p in seen] == [2, 1, 0]
+
+
+def test_wait_timeout():
+    system = FakeSystem(mutations={"m1": [0, 5, ""]})
+    with pytest.raises(MutationTimeoutError):
+        _handle(system, mutation_ids=["m1"]).wait(timeout=0.05, poll_interval=0.01)
+
+
+def test_wait_fail_reason():
+    system = FakeSystem(mutations={"m1": [0, 5, "Code: 341. Cannot parse"]})
+    handle = _handle(system, mutation_ids=["m1"])
+    assert handle.status().fail_reason == "Code: 341. Cannot parse"
+    with pytest.raises(MutationFailedError, match="Cannot parse"):
+        handle.wait(timeout=5, poll_interval=0.001)
+
+
+def test_optimize_ignora_merges_de_outras_partes():
+    system = FakeSystem(merges=[
+        (0, ["all_1_1_0", "all_2_2_0"], 800, 0.5),
+        (0, ["all_3_3_0", "all_4_4_0"], 500, 0.5),  # merge de fundo de partes novas
+    ])
+    handle = _handle(system, merges=True, parts=["all_1_1_0", "all_2_2_0"])
+    progress = handle.status()
+    assert not progress.done
+    assert (progress.merges, progress.bytes_total) == (1, 800)
+
+    del system.merges[0]
+    assert handle.status().done
+
+
+def test_optimize_sem_partes_nao_consulta_merges():
+    system = FakeSystem(merges=[(0, ["outra"], 500, 0.5)])
+    assert _handle(system, merges=True, parts=[]).status().done
+    assert system.queries == []
+
+
+def test_optimize_sem_filtro_de_partes():
+    system = FakeSystem(merges=[(0, ["qualquer"], 500, 0.5)])
+    assert not _handle(system, merges=True).status().done
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Testes do encoder Native (clickhouse_native) sem servidor ClickHouse: o bloco
+do `encode_frame` é comparado byte a byte com o que o próprio clickhouse_driver
+serializa (BlockOutputStream, como no benchmark_clickhouse.py).
+
+Execução: python -m pytest -q test_native.py (ou python test_native.py)
+"""
+
+import datetime as _dt
+import uuid
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+from clickhouse_driver import Client, defines
+from clickhouse_driver.block import ColumnOrientedBlock
+from clickhouse_driver.bufferedwriter import BufferedSocketWriter
+from clickhouse_driver.connection import ServerInfo
+from clickhouse_driver.context import Context
+from clickhouse_driver.streams.native import BlockOutputStream
+
+from clickhouse_native import UnsupportedNativeType, encode_column, encode_frame
+
+SERVER_TZ = "UTC"
+
+
+class _MemorySocket:
+    def __init__(self):
+        self.out = bytearray()
+
+    def sendall(self, data):
+        self.out += data
+
+
+def driver_block(columns_with_types, columns) -> bytes:
+    """
+    Bloco Native serializado pelo driver. A revisão anterior ao BlockInfo deixa
+    o bloco no mesmo layout do `FORMAT Native` via HTTP (sem cabeçalho de bloco
+    nem flag de serialização por coluna). As colunas são copiadas: o driver
+    converte os itens no lugar.
+    """
+    context = Context()
+    revision = defines.DBMS_MIN_REVISION_WITH_BLOCK_INFO - 1
+    context.server_info = ServerInfo("ClickHouse", 24, 8, 0, revision, SERVER_TZ, "teste", revision)
+    context.settings = {}
+    context.client_settings = Client("localhost").client_settings
+    sock = _MemorySocket()
+    fout = BufferedSocketWriter(sock, defines.BUFFER_SIZE)
+    BlockOutputStream(fout, context).write(ColumnOrientedBlock(columns_with_types, [list(c) for c in columns]))
+    fout.flush()
+    return bytes(sock.out)
+
+
+D = _dt.datetime
+CASES = {
+    "Int8": [-128, 0, 127],
+    "Int16": [-32768, 5, 32767],
+    "Int32": [-(2**31), 0, 2**31 - 1],
+    "Int64": [-(2**63), -1, 2**63 - 1],
+    "UInt8": [0, 1, 255],
+    "UInt16": [0, 300, 65535],
+    "UInt32": [0, 70000, 2**32 - 1],
+    "UInt64": [0, 2**40, 2**63 - 1],
+    "Float32": [1.5, -0.25, 3.0e38],
+    "Float64": [0.1, -1e300, 123456789.125],
+    "Bool": [True, False, True],
+    "String": ["", "abc", "ação", "x" * 200],
+    "FixedString(4)": ["", "ab", "abcd", "é"],
+    "Nullable(Int32)": [1, None, -3],
+    "Nullable(String)": ["a", None, ""],
+    "Nullable(Float64)": [None, 2.5, None],
+    "Date": [_dt.date(1970, 1, 1), _dt.date(2024, 2, 29), _dt.date(2149, 6, 6)],
+    "Date32": [_dt.date(1900, 1, 1), _dt.date(1969, 12, 31), _dt.date(2200, 12, 31)],
+    "DateTime": [D(1970, 1, 1), D(2024, 3, 10, 23, 59, 59)],
+    "DateTime('America/Sao_Paulo')": [D(2024, 1, 1, 10, 0), D(2015, 10, 18, 0, 30), D(2019, 2, 16, 23, 30)],
+    "Nullable(DateTime('Asia/Tokyo'))": [D(2024, 6, 1, 8, 0), None],
+    "DateTime64(3)": [D(2024, 1, 1, 10, 0, 0, 123000), D(1970, 1, 1)],
+    "DateTime64(6, 'Europe/Berlin')": [D(2024, 7, 1, 12, 0, 0, 654321), D(2000, 1, 1)],
+    # Decimal32 / Decimal64 / Decimal128 (o DESCRIBE devolve sempre Decimal(P, S))
+    "Decimal(9, 2)": [Decimal("1.25"), Decimal("-3.5"), Decimal("9999999.99")],
+    "Decimal(9, 4)": [Decimal("0.0001"), Decimal("-12345.6789")],
+    "Decimal(18, 6)": [Decimal("123456789.123456"), Decimal("-0.000001")],
+    "Decimal(38, 10)": [Decimal("1234567890123456789.0123456789"), Decimal("-1")],
+    "Decimal(38, 2)": [Decimal("-999999999999999999999999999999999999.99"), Decimal("0")],
+    "UUID": [uuid.UUID("12345678-1234-5678-1234-567812345678"), uuid.UUID(int=0), uuid.UUID(int=2**128 - 1)],
+}
+
+
+@pytest.mark.parametrize("ch_type", list(CASES))
+def test_bloco_igual_ao_do_driver(ch_type):
+    values = CASES[ch_type]
+    df = pd.DataFrame({"c": pd.Series(values, dtype=object)})
+    expected = driver_block([("c", ch_type)], [values])
+    assert encode_frame(df, {"c": ch_type}, tz=SERVER_TZ) == expected
+
+
+@pytest.mark.parametrize("alias, ch_type", [
+    ("Decimal32(2)", "Decimal(9, 2)"),
+    ("Decimal64(6)", "Decimal(18, 6)"),
+    ("Decimal128(10)", "Decimal(38, 10)"),
+])
+def test_decimal_nn_igual_ao_decimal_p_s(alias, ch_type):
+    values = np.array(CASES[ch_type], dtype=object)
+    assert encode_column(values, alias) == encode_column(values, ch_type)
+
+
+def test_datetime_em_horario_inexistente_e_ambiguo():
+    # início (sem 00:00-00:59) e fim (23:00-23:59 duas vezes) do horário de verão
+    values = [D(2015, 10, 18, 0, 0), D(2015, 10, 18, 0, 59, 59), D(2016, 2, 20, 23, 30)]
+    for ch_type in ("DateTime('America/Sao_Paulo')", "DateTime64(3, 'America/Sao_Paulo')"):
+        df = pd.DataFrame({"c": pd.Series(values, dtype=object)})
+        assert encode_frame(df, {"c": ch_type}) == driver_block([("c", ch_type)], [values])
+
+
+def test_bloco_com_varias_colunas_e_dtypes_pandas():
+    df = pd.DataFrame({
+        "id": np.array([1, 2, 3], dtype=np.int64),
+        "valor": [1.5, np.nan, 3.0],
+        "nome": ["a", None, "c"],
+        "quando": pd.to_datetime(["2024-01-01 10:00", None, "2024-01-02 00:00"]),
+    })
+    types = {"id": "UInt32", "valor": "Nullable(Float64)", "nome": "Nullable(String)",
+             "quando": "Nullable(DateTime)"}
+    expected = driver_block(
+        list(types.items()),
+        [[1, 2, 3], [1.5, None, 3.0], ["a", None, "c"], [D(2024, 1, 1, 10), None, D(2024, 1, 2)]],
+    )
+    assert encode_frame(df, types, tz=SERVER_TZ) == expected
+
+
+def test_low_cardinality_vai_como_tipo_base():
+    df = pd.DataFrame({"uf": ["SP", None, "RJ"]})
+    expected = driver_block([("uf", "Nullable(String)")], [["SP", None, "RJ"]])
+    assert encode_frame(df, {"uf": "LowCardinality(Nullable(String))"}, tz=SERVER_TZ) == expected
+
+
+def test_bloco_vazio():
+    df = pd.DataFrame({"c": pd.Series([], dtype=object)})
+    for ch_type in ("Int32", "String", "FixedString(3)", "Nullable(Decimal(18, 4))", "UUID"):
+        assert encode_frame(df, {"c": ch_type}) == driver_block([("c", ch_type)], [[]])
+
+
+def test_fixed_string_longa_demais_falha():
+    values = np.array(["abc", "abcde"], dtype=object)
+    with pytest.raises(ValueError, match="FixedString\\(4\\)"):
+        encode_column(values, "FixedString(4)")
+    # 2 caracteres, 3 bytes em UTF-8
+    with pytest.raises(ValueError):
+        encode_column(np.array(["ãb"], dtype=object), "FixedString(2)")
+
+
+def test_nulo_em_coluna_nao_nullable_falha():
+    with pytest.raises(ValueError):
+        encode_column(np.array([1, None], dtype=object), "Int32")
+
+
+@pytest.mark.parametrize("ch_type", ["Array(Int32)", "Map(String, UInt64)", "Nullable(Array(String))"])
+def test_tipos_sem_encoder(ch_type):
+    with pytest.raises(UnsupportedNativeType):
+        encode_column(np.array([[1], [2]], dtype=object), ch_type)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main(["-q", __file__]))